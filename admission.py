@@ -0,0 +1,72 @@
+# Controllo di ammissione dei packet-in: un token bucket per datapath e uno per
+# (datapath, in_port). Un port bucket vuoto scarta solo quella porta, senza
+# consumare i token dello switch.
+
+ADMIT = 0
+DROP_PORT = 1
+DROP_DATAPATH = 2
+
+
+class TokenBucket(object):
+    __slots__ = ('rate', 'burst', 'tokens', 'stamp')
+
+    def __init__(self, rate, burst, now):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now):
+        tokens = self.tokens + (now - self.stamp) * self.rate
+        self.tokens = tokens if tokens < self.burst else self.burst
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class PacketInAdmission(object):
+    def __init__(self, datapath_rate=2000, datapath_burst=4000, port_rate=200, port_burst=400):
+        self.datapath_rate = datapath_rate
+        self.datapath_burst = datapath_burst
+        self.port_rate = port_rate
+        self.port_burst = port_burst
+
+        self.datapath_buckets = {}
+        self.port_buckets = {}
+        self.admitted = {}      # dpid -> packet-in ammessi
+        self.dropped = {}       # dpid -> packet-in scartati
+        self.port_dropped = {}  # (dpid, in_port) -> packet-in scartati
+
+    def admit(self, dpid, in_port, now):
+        key = (dpid, in_port)
+        port_bucket = self.port_buckets.get(key)
+        if port_bucket is None:
+            port_bucket = self.port_buckets[key] = TokenBucket(self.port_rate, self.port_burst, now)
+        if not port_bucket.take(now):
+            self.dropped[dpid] = self.dropped.get(dpid, 0) + 1
+            self.port_dropped[key] = self.port_dropped.get(key, 0) + 1
+            return DROP_PORT
+
+        datapath_bucket = self.datapath_buckets.get(dpid)
+        if datapath_bucket is None:
+            datapath_bucket = self.datapath_buckets[dpid] = TokenBucket(self.datapath_rate, self.datapath_burst, now)
+        if not datapath_bucket.take(now):
+            self.dropped[dpid] = self.dropped.get(dpid, 0) + 1
+            return DROP_DATAPATH
+
+        self.admitted[dpid] = self.admitted.get(dpid, 0) + 1
+        return ADMIT
+
+    def stats(self):
+        return {
+            'admitted': dict(self.admitted),
+            'dropped': dict(self.dropped),
+            'port_dropped': dict(self.port_dropped),
+        }
+
+    def forget(self, dpid):
+        self.datapath_buckets.pop(dpid, None)
+        for key in [k for k in self.port_buckets if k[0] == dpid]:
+            del self.port_buckets[key]
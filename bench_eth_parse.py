@@ -0,0 +1,47 @@
+#!/usr/bin/python
+# Microbenchmark del parsing dei packet-in: ryu.lib.packet.packet.Packet contro la
+# lettura diretta dell'header Ethernet di fastpath.parse_eth.
+#   python bench_eth_parse.py [iterazioni]
+import struct
+import sys
+import timeit
+
+from fastpath import parse_eth
+
+
+def sample_frame():
+    # Frame UDP/IPv4 come quelli generati dagli host di topology.py
+    eth = bytes.fromhex('000000000002' '000000000001') + struct.pack('!H', 0x0800)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + 8 + 18, 1, 0, 64, 17, 0,
+                     bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2]))
+    udp = struct.pack('!HHHH', 5001, 5001, 8 + 18, 0)
+    return eth + ip + udp + b'x' * 18
+
+
+def ryu_parse(data):
+    from ryu.lib.packet import packet, ethernet
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocols(ethernet.ethernet)[0]
+    return eth.dst, eth.src, eth.ethertype
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    data = sample_frame()
+
+    results = {}
+    results['fastpath'] = timeit.timeit(lambda: parse_eth(data), number=iterations)
+    try:
+        assert ryu_parse(data) == parse_eth(data)
+        results['ryu packet.Packet'] = timeit.timeit(lambda: ryu_parse(data), number=iterations)
+    except ImportError:
+        print('ryu non installato: solo fastpath')
+
+    for name, elapsed in results.items():
+        print('%-20s %12.0f pkt/s  (%.2f us/pkt)' % (name, iterations / elapsed, elapsed / iterations * 1e6))
+    if len(results) == 2:
+        print('speedup: %.1fx' % (results['ryu packet.Packet'] / results['fastpath']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+#!/usr/bin/python
+# Latenza end-to-end della mitigazione: dall'inizio di un flood alla conferma (barrier
+# reply) della regola di mitigazione (drop o meter) sullo switch, divisa per fasi.
+# Gli switch sono quelli di dp_simulator.py (messaggi OpenFlow veri, contatori sintetici),
+# il controller è la logica di PortMonitorMixin e MitigationMixin con lo StatsPollScheduler
+# e il FlowProgrammer del controller, tutto su un orologio virtuale e senza ryu: i messaggi
+# verso gli switch li costruisce un parser con l'interfaccia di ryu (solo quello che serve
+# alla mitigazione). Il controller è un thread solo: le reply
+# aspettano che finisca quella precedente e ogni handler fa avanzare l'orologio del suo
+# tempo di esecuzione reale; i collegamenti aggiungono --link-delay per direzione.
+#
+#   python bench_mitigation.py --switches 1 16 64 --intervals 0.5 1 2 --trials 50 --output mitigation.json
+#   python bench_mitigation.py --switches 16 --intervals 1 --mitigation meter
+#
+# Fasi (secondi dall'inizio del flood):
+#   request/reply        richiesta di port stats e arrivo della reply che mostra il flood
+#   crossing             il rilevatore segnala la porta
+#   monitoring           la porta entra in monitoring_list
+#   block_request/_reply richiesta e reply del poll successivo, che conferma la soglia
+#   block_port           chiamata di _block_port (meter-mod, flow-mod e barrier verso lo switch)
+#   confirmed            barrier reply elaborata dal FlowProgrammer (_mitigation_done)
+import argparse
+import heapq
+import itertools
+import json
+import logging
+import random
+import struct
+import time
+
+import numpy as np
+
+from detectors import make_detector
+from event_log import EventLog
+from dp_simulator import (SimulatedSwitch, message, encode_match, HEADER, MULTIPART, PORT_STATS, FLOW_MOD,
+                          OFPT_MULTIPART_REQUEST, OFPT_MULTIPART_REPLY, OFPT_FLOW_MOD, OFPT_BARRIER_REQUEST,
+                          OFPT_BARRIER_REPLY, OFPT_METER_MOD, OFPT_ERROR, OFPMP_PORT_STATS, OFPMPF_REPLY_MORE,
+                          OFPFC_ADD, OFPFC_DELETE, OFPFC_DELETE_STRICT, OFP_NO_BUFFER, OFPP_ANY, OFPTT_ALL,
+                          OFPIT_GOTO_TABLE, OFPIT_APPLY_ACTIONS, OXM_IN_PORT, OXM_ETH_DST, OXM_ETH_SRC, _percentile)
+from flow_programmer import FlowProgrammer
+from port_monitor import PortMonitorMixin, MitigationMixin
+from replay import PortStat
+from stats_scheduler import StatsPollScheduler, ALL_PORTS
+from stats_store import PortStatsStore
+from timers import ExpiryTimers, OffenderHistory
+
+STAGES = ['request', 'reply', 'crossing', 'monitoring', 'block_request', 'block_reply', 'block_port', 'confirmed']
+
+
+class _Ofproto(object):
+    # Costanti di ofproto_v1_3 usate da MitigationMixin e FlowProgrammer
+    OFPP_ANY = OFPP_ANY
+    OFPG_ANY = 0xffffffff
+    OFPTT_ALL = OFPTT_ALL
+    OFP_NO_BUFFER = OFP_NO_BUFFER
+    OFPFC_ADD = OFPFC_ADD
+    OFPFC_DELETE = OFPFC_DELETE
+    OFPFC_DELETE_STRICT = OFPFC_DELETE_STRICT
+    OFPIT_APPLY_ACTIONS = OFPIT_APPLY_ACTIONS
+    OFPIT_METER = 6
+    OFPMC_ADD = 0
+    OFPMC_MODIFY = 1
+    OFPMC_DELETE = 2
+    OFPMF_KBPS = 1
+    OFPMF_BURST = 4
+
+
+class _Match(object):
+    OXM = {'in_port': OXM_IN_PORT, 'eth_dst': OXM_ETH_DST, 'eth_src': OXM_ETH_SRC}
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def __getitem__(self, name):
+        return self.fields[name]
+
+    def serialize(self):
+        encoded = {}
+        for name, value in self.fields.items():
+            if name == 'in_port':
+                encoded[self.OXM[name]] = struct.pack('!I', value)
+            else:
+                encoded[self.OXM[name]] = bytes.fromhex(value.replace(':', ''))
+        return encode_match(encoded)
+
+
+class _Message(object):
+    msg_type = None
+
+    def __init__(self, datapath):
+        self.datapath = datapath
+        self.xid = None
+
+    def serialize(self):
+        return message(self.msg_type, self.xid, self.body())
+
+    def body(self):
+        return b''
+
+
+class _FlowMod(_Message):
+    msg_type = OFPT_FLOW_MOD
+
+    def __init__(self, datapath, cookie=0, cookie_mask=0, table_id=0, command=OFPFC_ADD, idle_timeout=0,
+                 hard_timeout=0, priority=0, buffer_id=OFP_NO_BUFFER, out_port=OFPP_ANY,
+                 out_group=_Ofproto.OFPG_ANY, flags=0, match=None, instructions=None):
+        super(_FlowMod, self).__init__(datapath)
+        self.fields = (cookie, cookie_mask, table_id, command, idle_timeout, hard_timeout, priority,
+                       buffer_id, out_port, out_group, flags)
+        self.match = match or _Match()
+        self.instructions = instructions or []
+
+    def body(self):
+        return (FLOW_MOD.pack(*self.fields) + self.match.serialize() +
+                b''.join(inst.serialize() for inst in self.instructions))
+
+
+class _InstructionActions(object):
+    # Solo liste di azioni vuote: le regole di mitigazione sono drop o goto
+    def __init__(self, type_, actions):
+        assert not actions
+        self.type = type_
+
+    def serialize(self):
+        return struct.pack('!HH4x', self.type, 8)
+
+
+class _InstructionMeter(object):
+    def __init__(self, meter_id, type_=_Ofproto.OFPIT_METER):
+        self.meter_id = meter_id
+        self.type = type_
+
+    def serialize(self):
+        return struct.pack('!HHI', self.type, 8, self.meter_id)
+
+
+class _InstructionGotoTable(object):
+    def __init__(self, table_id):
+        self.table_id = table_id
+
+    def serialize(self):
+        return struct.pack('!HHB3x', OFPIT_GOTO_TABLE, 8, self.table_id)
+
+
+class _MeterBandDrop(object):
+    def __init__(self, rate, burst_size):
+        self.rate = rate
+        self.burst_size = burst_size
+
+    def serialize(self):
+        return struct.pack('!HHII4x', 1, 16, self.rate, self.burst_size)
+
+
+class _MeterMod(_Message):
+    msg_type = OFPT_METER_MOD
+
+    def __init__(self, datapath, command, flags, meter_id, bands):
+        super(_MeterMod, self).__init__(datapath)
+        self.fields = (command, flags, meter_id)
+        self.bands = bands
+
+    def body(self):
+        return struct.pack('!HHI', *self.fields) + b''.join(band.serialize() for band in self.bands)
+
+
+class _BarrierRequest(_Message):
+    msg_type = OFPT_BARRIER_REQUEST
+
+
+class _Parser(object):
+    # Il sottoinsieme di ofproto_v1_3_parser usato dalla mitigazione, serializzato per dp_simulator
+    OFPMatch = _Match
+    OFPFlowMod = _FlowMod
+    OFPInstructionActions = _InstructionActions
+    OFPInstructionMeter = _InstructionMeter
+    OFPInstructionGotoTable = _InstructionGotoTable
+    OFPMeterMod = _MeterMod
+    OFPMeterBandDrop = _MeterBandDrop
+    OFPBarrierRequest = _BarrierRequest
+
+
+class _Datapath(object):
+    # Quello che lo scheduler, MitigationMixin e FlowProgrammer usano del datapath di ryu
+    ofproto = _Ofproto
+    ofproto_parser = _Parser
+
+    def __init__(self, switch, bench):
+        self.id = switch.dpid
+        self.switch = switch
+        self.bench = bench
+
+    def set_xid(self, msg):
+        msg.xid = next(self.bench._xid)
+
+    def send_msg(self, msg):
+        self.bench._send(self, msg.serialize())
+
+
+class _StageDetector(object):
+    # Il rilevatore delle porte, con l'istante in cui segnala la porta sotto attacco
+    def __init__(self, detector, bench):
+        self.detector = detector
+        self.bench = bench
+
+    def __getattr__(self, name):
+        return getattr(self.detector, name)
+
+    def update(self, rows, values):
+        anomalous = self.detector.update(rows, values)
+        row = self.bench.port_stats.row(*self.bench.attack)
+        if row is not None and anomalous[np.flatnonzero(rows == row)].any():
+            self.bench._mark('crossing')
+        return anomalous
+
+
+class MitigationBench(MitigationMixin, PortMonitorMixin):
+    def __init__(self, switches, attack, interval, link_delay, threshold, block_duration=30, detector='threshold',
+                 mitigation='drop'):
+        self.logger = logging.getLogger('bench_mitigation')
+        self.clock = 0.0
+        self._handler_started = None
+        self._busy_until = 0.0
+        self._next_poll = None
+        self._events = []
+        self._seq = itertools.count()
+        self._xid = itertools.count(1)
+        self.link_delay = link_delay
+        self.attack = attack
+        self.stages = {}
+        self._reply = None  # (invio della richiesta, arrivo della reply) in elaborazione
+
+        # Stato del controller, con gli stessi valori di controller_withmitigation.py
+        self.threshold = threshold
+        self.lower_threshold = 0.02 * threshold
+        if detector == 'threshold':
+            self.port_detector = _StageDetector(make_detector('threshold', threshold=threshold), self)
+        else:
+            self.port_detector = _StageDetector(make_detector(detector, floor=self.lower_threshold), self)
+        self.port_stats = PortStatsStore()
+        self.host_info = dict(((s.dpid, port), 'h%d-%d' % (s.dpid, port))
+                              for s in switches for port in range(1, s.n_ports + 1))
+        self.detection_mode = 'port'
+        self.monitoring_list = []
+        self.blocked_ports = {}
+        self.blocked_flows = {}
+        self.mitigated_ports = {}
+        self.block_top_sources = False
+        self.mitigation_mode = mitigation
+        self.meter_step_seconds = block_duration
+        self.meter_rate_kbps = int(threshold * 8 / 1000 / 4)
+        self.meter_step_factor = 2
+        self.meter_max_rate_kbps = int(threshold * 8 / 1000)
+        self.rate_limits = {}
+        self.meter_ids = {}
+        # Senza start(): i batch partono solo con il flush di _confirm_mitigation
+        self.flow_programmer = FlowProgrammer(batch_size=64, flush_interval=0.005, use_bundles=False,
+                                              logger=self.logger)
+        self.offenders = OffenderHistory(base_duration=block_duration)
+        self.block_timers = ExpiryTimers(self._block_expired, logger=self.logger)
+        self.stats_poller = StatsPollScheduler(self._request_stats, interval=interval, min_interval=interval / 4,
+                                               max_interval=interval * 4, jitter=0.1, logger=self.logger,
+                                               clock=self._now)
+        self.event_log = EventLog(self.logger, clock=self._now)
+
+        # Gli switch leggono l'orologio del banco (creati con l'orologio fermo a 0)
+        for switch in switches:
+            switch.clock = self._now
+        self.datapaths = dict((s.dpid, _Datapath(s, self)) for s in switches)
+        for datapath in self.datapaths.values():
+            self.stats_poller.add(datapath)
+
+    def _now(self):
+        # Dentro un handler l'orologio avanza con il tempo di esecuzione reale
+        if self._handler_started is None:
+            return self.clock
+        return self.clock + time.perf_counter() - self._handler_started
+
+    def _mark(self, stage, at=None):
+        self.stages.setdefault(stage, self._now() if at is None else at)
+
+    # Eventi: messaggi in viaggio e lavoro del thread del controller
+
+    def _push(self, at, handler, *args):
+        heapq.heappush(self._events, (at, next(self._seq), handler, args))
+
+    def _send(self, datapath, data):
+        self._push(self._now() + self.link_delay, self._switch_receive, datapath, data)
+
+    def _switch_receive(self, datapath, data):
+        for reply in datapath.switch.handle(data):
+            self._push(self.clock + self.link_delay, self._controller, self._dispatch, datapath, reply, self.clock + self.link_delay)
+
+    def _controller(self, handler, *args):
+        # Il thread del controller è occupato fino a _busy_until
+        if self.clock < self._busy_until:
+            self._push(self._busy_until, self._controller, handler, *args)
+            return
+        self._handler_started = time.perf_counter()
+        try:
+            handler(*args)
+        finally:
+            self.clock = self._now()
+            self._handler_started = None
+            self._busy_until = self.clock
+
+    def run(self, until):
+        self._wakeup_poller()
+        while self._events and 'confirmed' not in self.stages:
+            at, _, handler, args = heapq.heappop(self._events)
+            if at > until:
+                break
+            self.clock = max(self.clock, at)
+            handler(*args)
+        return self.stages
+
+    def _wakeup_poller(self):
+        # Come il _wakeup dello scheduler: una scadenza più vicina anticipa il prossimo poll
+        due = self.stats_poller.next_due()
+        if due is not None and (self._next_poll is None or due < self._next_poll):
+            self._next_poll = due
+            self._push(due, self._controller, self._poll, due)
+
+    def _poll(self, due):
+        if due != self._next_poll:
+            return
+        self._next_poll = None
+        self.stats_poller.poll_due(self._now())
+        self._wakeup_poller()
+
+    # Handler del controller
+
+    def _request_stats(self, datapath, port_no=None):
+        xid = next(self._xid)
+        body = MULTIPART.pack(OFPMP_PORT_STATS, 0) + struct.pack('!I4x', OFPP_ANY if port_no is ALL_PORTS else port_no)
+        self._send(datapath, message(OFPT_MULTIPART_REQUEST, xid, body))
+        return xid
+
+    def _dispatch(self, datapath, data, arrived):
+        msg_type, _, xid = HEADER.unpack_from(data, 0)[1:]
+        if msg_type == OFPT_MULTIPART_REPLY:
+            self._port_stats_reply_handler(datapath, data, xid, arrived)
+        elif msg_type == OFPT_BARRIER_REPLY:
+            self.flow_programmer.barrier_reply(datapath.id, xid)
+        elif msg_type == OFPT_ERROR:
+            self.flow_programmer.error(datapath, xid, struct.unpack_from('!HH', data, HEADER.size))
+
+    def _port_stats_reply_handler(self, datapath, data, xid, arrived):
+        _, flags = MULTIPART.unpack_from(data, HEADER.size)
+        sent = self.stats_poller.outstanding.get(datapath.id, {}).get(xid)
+        self.stats_poller.reply(datapath.id, xid, flags & OFPMPF_REPLY_MORE)
+        body = []
+        for offset in range(HEADER.size + MULTIPART.size, len(data), PORT_STATS.size):
+            fields = PORT_STATS.unpack_from(data, offset)
+            body.append(PortStat(fields[0], fields[3], fields[4]))
+
+        self._reply = (sent, arrived)
+        rows = self._update_port_stats(datapath.id, body)
+        if rows is None:
+            return
+        self._monitor_port(datapath.id, rows)
+        self._update_poll_intervals(datapath.id, rows)
+        self._wakeup_poller()
+
+    def _start_mirror(self, dpid, port_no):
+        # Chiamata quando la porta entra in monitoring_list
+        if (dpid, port_no) == self.attack:
+            self._mark('request', self._reply[0])
+            self._mark('reply', self._reply[1])
+            self._mark('monitoring')
+
+    def _stop_mirror(self, dpid, port_no):
+        pass
+
+    def _block_port(self, dpid, port_no):
+        if (dpid, port_no) == self.attack:
+            self._mark('block_request', self._reply[0])
+            self._mark('block_reply', self._reply[1])
+            self._mark('block_port')
+        super(MitigationBench, self)._block_port(dpid, port_no)
+
+    def _mitigation_done(self, key, batch):
+        if key == self.attack and not batch.failed():
+            self._mark('confirmed')
+        super(MitigationBench, self)._mitigation_done(key, batch)
+
+
+def run_trial(n_switches, interval, seed, args):
+    # Un flood su una porta a caso, in un istante a caso dopo il riscaldamento
+    rng = random.Random(seed)
+    random.seed(seed)  # jitter dello scheduler
+    attack = (rng.randint(1, n_switches), rng.randint(1, args.ports))
+    flood_start = args.warmup + rng.uniform(0, interval)
+    switches = [SimulatedSwitch(dpid, n_ports=args.ports, port_rate=args.port_rate,
+                                attack_ports=(attack[1],) if dpid == attack[0] else (),
+                                attack_rate=args.attack_rate, clock=lambda: 0.0, attack_start=flood_start)
+                for dpid in range(1, n_switches + 1)]
+    bench = MitigationBench(switches, attack, interval, args.link_delay, args.threshold, detector=args.detector,
+                            mitigation=args.mitigation)
+    stages = bench.run(flood_start + args.timeout)
+    return dict((stage, stages[stage] - flood_start if stage in stages else None) for stage in STAGES)
+
+
+def _distribution(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return {
+        'p50': _percentile(values, 0.5),
+        'p90': _percentile(values, 0.9),
+        'p99': _percentile(values, 0.99),
+        'max': max(values),
+        'mean': sum(values) / len(values),
+    }
+
+
+def summarize(trials):
+    # Distribuzione dell'istante di ogni fase e della durata tra una fase e la precedente
+    result = {'trials': len(trials), 'missed': sum(1 for t in trials if t['confirmed'] is None)}
+    result['stages'] = dict((stage, _distribution([t[stage] for t in trials])) for stage in STAGES)
+    deltas = {}
+    previous = None
+    for stage in STAGES:
+        deltas[stage] = _distribution([t[stage] - (t[previous] if previous else 0.0)
+                                       for t in trials if t[stage] is not None and (previous is None or t[previous] is not None)])
+        previous = stage
+    result['deltas'] = deltas
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Flood-to-confirmed-mitigation latency, by stage')
+    parser.add_argument('--switches', nargs='+', type=int, default=[1, 16, 64])
+    parser.add_argument('--intervals', nargs='+', type=float, default=[0.5, 1, 2],
+                        help='base stats polling interval (min = interval/4, max = interval*4, as in the controller)')
+    parser.add_argument('--trials', type=int, default=30)
+    parser.add_argument('--ports', type=int, default=4)
+    parser.add_argument('--port-rate', type=float, default=1e4, help='background rx bytes/s per port')
+    parser.add_argument('--attack-rate', type=float, default=1e6, help='rx bytes/s of the flooded port')
+    parser.add_argument('--threshold', type=float, default=300000)
+    parser.add_argument('--detector', default='threshold')
+    parser.add_argument('--mitigation', choices=['drop', 'meter'], default='drop',
+                        help="'drop' flow or 'meter' rate limit, as the controller's mitigation_mode")
+    parser.add_argument('--link-delay', type=float, default=0.0005, help='one-way controller-switch delay (s)')
+    parser.add_argument('--warmup', type=float, default=10)
+    parser.add_argument('--timeout', type=float, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+    logging.getLogger('bench_mitigation').setLevel(logging.ERROR)
+
+    results = []
+    for n_switches in args.switches:
+        for interval in args.intervals:
+            trials = [run_trial(n_switches, interval, args.seed * 100003 + i, args) for i in range(args.trials)]
+            result = summarize(trials)
+            result.update(switches=n_switches, interval=interval)
+            results.append(result)
+            total = result['stages']['confirmed']
+            print('switches=%-4d interval=%-5g confirmed p50=%s p90=%s p99=%s missed=%d  %s' % (
+                n_switches, interval,
+                *('%.3fs' % total[q] if total else '-' for q in ('p50', 'p90', 'p99')),
+                result['missed'],
+                ' '.join('%s=%.4f' % (stage, result['deltas'][stage]['p50'])
+                         for stage in STAGES if result['deltas'][stage] is not None)), flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'params': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
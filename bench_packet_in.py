@@ -0,0 +1,343 @@
+#!/usr/bin/python
+# Benchmark del percorso dei packet-in (_packet_in_handler/add_flow) in stile cbench,
+# con gli switch simulati di dp_simulator.py al posto di quelli veri.
+#   throughput: packet-in senza limite, si contano le risposte (packet-out e flow-mod) al secondo
+#   latency:    un solo packet-in in sospeso per switch, si misura il tempo di risposta
+# Ogni controller gira in un ryu-manager separato (TCP su localhost) in una directory
+# temporanea con una copia di topology.json; con --in-process gli handler dell'app
+# vengono chiamati direttamente, senza socket (l'hub riceve il controllo una volta per
+# giro di packet-in, così i thread di flush e di polling dell'app girano).
+# Il controllo di ammissione dei packet-in e lo shedding delle porte di
+# controller_withmitigation.py limiterebbero il throughput al budget configurato
+# (2000 packet-in/s per switch) invece di misurare l'handler: vengono disattivati, a meno
+# di --admission (in-process si riportano allora ammessi e scartati).
+#
+#   python bench_packet_in.py --switches 1 16 --macs 100 1000 --duration 10 --output bench.json
+#   python bench_packet_in.py --baseline bench.json      # confronto e exit code 1 se peggiora
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from dp_simulator import SimulatedSwitch, InProcessDatapath, run_tcp_switch, _percentile, _proc_usage
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CONTROLLERS = ['controller.py', 'controller1_6.py', 'controller_withmitigation.py']
+MODES = ['throughput', 'latency']
+
+# App per ryu-manager che sostituisce il controller con una sottoclasse senza limiti sui packet-in
+UNTHROTTLED_APP = '''import importlib
+import inspect
+import sys
+
+sys.path.insert(0, %(here)r)
+from ryu.base import app_manager
+from bench_packet_in import unthrottle
+
+_module = importlib.import_module(%(module)r)
+for _name, _cls in inspect.getmembers(_module, inspect.isclass):
+    if issubclass(_cls, app_manager.RyuApp) and _cls.__module__ == _module.__name__:
+        break
+
+
+def _init(self, *args, **kwargs):
+    _cls.__init__(self, *args, **kwargs)
+    unthrottle(self)
+
+
+BenchApp = type('BenchApp', (_cls,), {'__init__': _init, '__module__': __name__})
+'''
+
+
+def unthrottle(app):
+    # Budget dei packet-in praticamente illimitato (il costo del controllo resta nell'handler)
+    # e niente drop temporanei delle porte
+    if hasattr(app, 'admission'):
+        from admission import PacketInAdmission
+        app.admission = PacketInAdmission(datapath_rate=1e12, datapath_burst=1e12, port_rate=1e12, port_burst=1e12)
+    if hasattr(app, 'packet_in_shed_seconds'):
+        app.packet_in_shed_seconds = 0
+
+
+def _make_switches(mode, switches, macs, ports, rate):
+    # Throughput: ogni pacchetto è un packet-in (come cbench, i flussi installati non
+    # assorbono il traffico), rate packet-in/s per switch oltre i quali il controller
+    # è saturo (packet_ins_per_sec > responses_per_sec); latency: un packet-in alla
+    # volta per switch, il successivo appena arriva la risposta
+    hosts_per_port = max(1, macs // ports)
+    return [SimulatedSwitch(dpid, n_ports=ports, hosts_per_port=hosts_per_port, port_rate=1e3,
+                            packet_rate=rate if mode == 'throughput' else 1e6,
+                            table_hits=False, max_outstanding=1 if mode == 'latency' else None, seed=dpid)
+            for dpid in range(1, switches + 1)]
+
+
+def _summary(switches, elapsed, start_counts):
+    packet_ins = sum(s.packet_ins for s in switches) - start_counts[0]
+    packet_outs = sum(s.packet_outs for s in switches) - start_counts[1]
+    flow_mods = sum(s.flow_mods for s in switches) - start_counts[2]
+    latencies = [lat for s in switches for lat in s.latencies]
+    return {
+        'elapsed': elapsed,
+        'packet_ins': packet_ins,
+        'packet_outs': packet_outs,
+        'flow_mods': flow_mods,
+        'packet_ins_per_sec': packet_ins / elapsed,
+        'responses_per_sec': (packet_outs + flow_mods) / elapsed,
+        'latency_ms': {
+            'p50': _lat_ms(_percentile(latencies, 0.5)),
+            'p90': _lat_ms(_percentile(latencies, 0.9)),
+            'p99': _lat_ms(_percentile(latencies, 0.99)),
+            'mean': _lat_ms(sum(latencies) / len(latencies) if latencies else None),
+        },
+    }
+
+
+def _lat_ms(value):
+    return value * 1000 if value is not None else None
+
+
+def _counts(switches):
+    return (sum(s.packet_ins for s in switches), sum(s.packet_outs for s in switches),
+            sum(s.flow_mods for s in switches))
+
+
+# ryu-manager su TCP
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _wait_listening(port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except (IOError, OSError):
+            time.sleep(0.1)
+    return False
+
+
+def _start_controller(controller, workdir, port, admission):
+    shutil.copy(os.path.join(HERE, 'topology.json'), workdir)
+    app = os.path.join(HERE, controller)
+    if not admission:
+        app = os.path.join(workdir, 'bench_app.py')
+        with open(app, 'w') as f:
+            f.write(UNTHROTTLED_APP % {'here': HERE, 'module': os.path.splitext(controller)[0]})
+    log = open(os.path.join(workdir, 'ryu-manager.log'), 'w')
+    proc = subprocess.Popen(['ryu-manager', '--ofp-tcp-listen-port', str(port), app],
+                            cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    if not _wait_listening(port, 30):
+        proc.kill()
+        raise RuntimeError('%s did not start, see %s' % (controller, log.name))
+    return proc
+
+
+async def _drive_tcp(switches, port, warmup, duration, pid):
+    stop = asyncio.Event()
+    tasks = [asyncio.ensure_future(run_tcp_switch(s, '127.0.0.1', port, 0.001, stop)) for s in switches]
+    await asyncio.sleep(warmup)
+    start_counts = _counts(switches)
+    for s in switches:
+        s.latencies.clear()
+    usage = _proc_usage(pid)
+    started = time.time()
+    await asyncio.sleep(duration)
+    elapsed = time.time() - started
+    result = _summary(switches, elapsed, start_counts)
+    end_usage = _proc_usage(pid)
+    if usage is not None and end_usage is not None:
+        result['controller_cpu'] = (end_usage[0] - usage[0]) / elapsed
+        result['controller_rss'] = end_usage[1]
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return result
+
+
+def run_tcp(controller, mode, n_switches, macs, ports, rate, warmup, duration, admission=False):
+    workdir = tempfile.mkdtemp(prefix='bench_packet_in-')
+    port = _free_port()
+    proc = _start_controller(controller, workdir, port, admission)
+    try:
+        switches = _make_switches(mode, n_switches, macs, ports, rate)
+        return asyncio.run(_drive_tcp(switches, port, warmup, duration, proc.pid))
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# Handler chiamati nello stesso processo
+
+def _load_app(controller):
+    from ryu.base import app_manager
+    spec = importlib.util.spec_from_file_location(os.path.splitext(controller)[0], os.path.join(HERE, controller))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if issubclass(cls, app_manager.RyuApp) and cls.__module__ == module.__name__:
+            return cls()
+    raise RuntimeError('no RyuApp in %s' % controller)
+
+
+def run_in_process(controller, mode, n_switches, macs, ports, rate, warmup, duration, admission=False):
+    from ryu.lib import hub
+    workdir = tempfile.mkdtemp(prefix='bench_packet_in-')
+    shutil.copy(os.path.join(HERE, 'topology.json'), workdir)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    sys.path.insert(0, HERE)
+    try:
+        app = _load_app(controller)
+        # Un'app per configurazione nello stesso processo: l'endpoint delle metriche resta
+        # spento anche se attivato nel controller
+        app.metrics_port = None
+        if not admission:
+            unthrottle(app)
+        switches = _make_switches(mode, n_switches, macs, ports, rate)
+        datapaths = [InProcessDatapath(app, s) for s in switches]
+        for dp in datapaths:
+            dp.connect()
+
+        def loop(seconds):
+            # Un pacchetto per switch a turno; in latency ogni risposta arriva prima del
+            # pacchetto successivo, quindi la latenza è il tempo dell'handler. A ogni giro
+            # l'hub esegue i green thread dell'app (flush di FlowProgrammer, polling, ...)
+            end = time.time() + seconds
+            while time.time() < end:
+                for dp in datapaths:
+                    dp.packet_in()
+                hub.sleep(0)
+
+        def admission_counts():
+            stats = app.admission.stats() if hasattr(app, 'admission') else None
+            if stats is None:
+                return None
+            return sum(stats['admitted'].values()), sum(stats['dropped'].values())
+
+        loop(warmup)
+        start_counts = _counts(switches)
+        start_admission = admission_counts()
+        for s in switches:
+            s.latencies.clear()
+        started = time.time()
+        loop(duration)
+        result = _summary(switches, time.time() - started, start_counts)
+        end_admission = admission_counts()
+        if end_admission is not None:
+            result['packet_ins_admitted'] = end_admission[0] - start_admission[0]
+            result['packet_ins_dropped'] = end_admission[1] - start_admission[1]
+        return result
+    finally:
+        os.chdir(cwd)
+        sys.path.remove(HERE)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    # Regressioni: stesso controller/modo/switch/MAC con meno risposte al secondo
+    # (throughput) o latenza p50 più alta (latency) oltre la tolleranza
+    previous = dict((_key(r), r) for r in baseline['results'])
+    regressions = []
+    for result in results:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        if result['mode'] == 'throughput':
+            before, after = old['responses_per_sec'], result['responses_per_sec']
+            worse = after < before * (1 - tolerance)
+        else:
+            before, after = old['latency_ms']['p50'], result['latency_ms']['p50']
+            worse = before is not None and after is not None and after > before * (1 + tolerance)
+        result['baseline'] = before
+        if worse:
+            regressions.append((_key(result), before, after))
+    return regressions
+
+
+def _key(result):
+    return (result['controller'], result['transport'], result['mode'], result['switches'], result['macs'],
+            result.get('admission', False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='cbench-style packet-in benchmark for the controllers')
+    parser.add_argument('--controllers', nargs='+', default=CONTROLLERS)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--switches', nargs='+', type=int, default=[1, 16])
+    parser.add_argument('--macs', nargs='+', type=int, default=[100, 1000], help='host MACs per switch')
+    parser.add_argument('--ports', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=20000, help='packet-ins/s per switch in throughput mode')
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--in-process', action='store_true', help='call the app handlers directly instead of ryu-manager')
+    parser.add_argument('--admission', action='store_true',
+                        help="keep the controller's packet-in admission limits and port shedding")
+    parser.add_argument('--output', default='bench_packet_in.json')
+    parser.add_argument('--baseline', help='previous output to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.in_process:
+        run = run_in_process
+        try:
+            import ryu  # noqa: F401
+        except ImportError:
+            sys.exit('ryu non installato: --in-process non disponibile')
+    else:
+        run = run_tcp
+        if shutil.which('ryu-manager') is None:
+            sys.exit('ryu-manager non trovato nel PATH')
+    results = []
+    for controller in args.controllers:
+        for mode in args.modes:
+            for n_switches in args.switches:
+                for macs in args.macs:
+                    result = run(controller, mode, n_switches, macs, args.ports, args.rate,
+                                 args.warmup, args.duration, args.admission)
+                    result.update(controller=controller, transport='in-process' if args.in_process else 'tcp',
+                                  mode=mode, switches=n_switches, macs=macs, admission=args.admission)
+                    results.append(result)
+                    dropped = ''
+                    if 'packet_ins_dropped' in result:
+                        dropped = ' admitted=%d dropped=%d' % (result['packet_ins_admitted'], result['packet_ins_dropped'])
+                    print('%-30s %-10s switches=%-4d macs=%-6d responses/s=%10.0f p50=%s ms%s' % (
+                        controller, mode, n_switches, macs, result['responses_per_sec'],
+                        '%.3f' % result['latency_ms']['p50'] if result['latency_ms']['p50'] is not None else '-',
+                        dropped), flush=True)
+
+    output = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        output['regressions'] = [list(key) + [before, after] for key, before, after in regressions]
+        for key, before, after in regressions:
+            print('REGRESSION %s: %s -> %s' % (' '.join(map(str, key)), before, after))
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
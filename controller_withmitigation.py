@@ -1,38 +1,171 @@
 from ryu.base import app_manager
 from ryu.controller import ofp_event
-from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER
+from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
 from ryu.ofproto import ofproto_v1_3
 from ryu.lib.packet import packet
 from ryu.lib.packet import ethernet
-from ryu.lib.packet import ether_types
-import threading
+from ryu.lib import hub
 import time
-import csv
-import os
 import json
-
-class SimpleSwitch13(app_manager.RyuApp):
+import signal
+import numpy as np
+from stats_store import PortStatsStore, FlowStatsStore
+from port_monitor import (PortMonitorMixin, MitigationMixin, ACL_TABLE, FORWARDING_TABLE, COOKIE_MASK,
+                          COOKIE_PROACTIVE, COOKIE_LEARNING, COOKIE_MITIGATION, COOKIE_MIRROR)
+from stats_writer import StatsWriter
+from port_history import PortHistoryWriter
+from stats_scheduler import StatsPollScheduler
+from flow_programmer import FlowProgrammer
+from fastpath import parse_eth, parse_ipv4_src, ETH_TYPE_LLDP
+from admission import PacketInAdmission, ADMIT, DROP_PORT
+from mac_table import MacTable
+from timers import ExpiryTimers, OffenderHistory
+from detectors import make_detector
+from sketches import HeavyHitters, CardinalityMonitor
+from metrics import MetricsRegistry, MetricsServer
+from profiling import HandlerProfiler
+from event_log import EventLog, EventWriter, to_json
+
+class SimpleSwitch13(MitigationMixin, PortMonitorMixin, app_manager.RyuApp):
     OFP_VERSIONS = [ofproto_v1_3.OFP_VERSION]
     def __init__(self, *args, **kwargs):
         super(SimpleSwitch13, self).__init__(*args, **kwargs)
-        self.mac_to_port = {}
-
-        self.num_active_ports = 0
-        self.active_ports = []
+        # Tabella MAC limitata per switch; i flussi appresi scadono con gli stessi timeout
+        self.mac_idle_timeout = 300
+        self.mac_hard_timeout = 1800
+        self.mac_to_port = MacTable(max_entries=4096, idle_timeout=self.mac_idle_timeout,
+                                    hard_timeout=self.mac_hard_timeout)
 
         self.datapaths = {}
-        self.port_stats = {}
+        self.port_stats = PortStatsStore()
         self.threshold = 300000 # soglia di throughput (bit/secondo)
         self.lower_threshold = 0.02 * self.threshold
+        # Rilevatore delle porte anomale: 'threshold' (soglia fissa), 'ewma', 'cusum' o 'zscore'.
+        # Quelli statistici imparano la baseline di ogni porta e ignorano le porte sotto
+        # lower_threshold; detector_params ne regola i parametri (vedi detectors.py)
+        self.detector = 'threshold'
+        self.detector_params = {}
+        if self.detector == 'threshold':
+            self.port_detector = make_detector('threshold', threshold=self.threshold, **self.detector_params)
+        else:
+            self.port_detector = make_detector(self.detector, floor=self.lower_threshold, **self.detector_params)
         self.monitoring_list = []   
         self.blocked_ports = {}
+        # Porte con le sorgenti dominanti bloccate (block_top_sources): fuori dal rilevamento
+        # finché i blocchi durano, bloccate intere solo se il traffico non scartato resta
+        # sopra soglia. (dpid, port_no) -> [byte scartati, istante della lettura, byte/s scartati]
+        self.mitigated_ports = {}
+        self.mitigation_stats_xids = {}  # (dpid, xid) -> {port_no: byte scartati} delle reply in arrivo
+        # Modalità di rilevamento: 'port' blocca l'intera porta, 'flow' solo la coppia eth_src/eth_dst
+        self.detection_mode = 'port'
+        self.flow_stats = FlowStatsStore()
+        self.flow_monitoring_list = []
+        self.blocked_flows = {}
+        # Sblocco alla scadenza esatta di ogni blocco (porte e flussi). La durata parte da
+        # block_duration e raddoppia per chi viene bloccato di nuovo; la storia dei recidivi
+        # si dimezza ogni ora. Con i meter ogni gradino dura meter_step_seconds
+        self.block_duration = 30
+        self.meter_step_seconds = 30
+        self.offenders = OffenderHistory(base_duration=self.block_duration, factor=2,
+                                         max_duration=3600, half_life=3600)
+        self.block_timers = ExpiryTimers(self._block_expired, logger=self.logger)
+        self.block_timers.start()
+        # Mitigazione: 'drop' installa un flusso di drop, 'meter' limita la banda con un meter
+        # OpenFlow partendo da meter_rate_kbps e moltiplicando per meter_step_factor a ogni gradino
+        # fino a meter_max_rate_kbps, oltre il quale il limite viene rimosso
+        self.mitigation_mode = 'drop'
+        self.meter_rate_kbps = int(self.threshold * 8 / 1000 / 4)
+        self.meter_step_factor = 2
+        self.meter_max_rate_kbps = int(self.threshold * 8 / 1000)
+        self.rate_limits = {}     # porta o flusso limitato -> (meter_id, rate_kbps)
+        self.meter_ids = {}       # dpid -> meter_id liberi e prossimo id
+        # Flow-mod e meter-mod inviati a blocchi per datapath, ognuno chiuso da una barrier
+        # (use_bundles=True per usare i bundle ONF sugli switch che li supportano)
+        self.flow_programmer = FlowProgrammer(batch_size=64, flush_interval=0.005, use_bundles=False, logger=self.logger)
+        self.flow_programmer.start()
+        # Packet-in: di default si legge solo l'header Ethernet; full_packet_parse=True per
+        # le funzionalità che hanno bisogno dei livelli superiori
+        self.full_packet_parse = False
+        # Con miss_send_len lo switch bufferizza il pacchetto e manda al controller solo i
+        # primi miss_send_len byte; flow-mod e packet-out lo richiamano con il buffer_id.
+        # None: frame intero (OFPCML_NO_BUFFER). Gli switch che rispondono con buffer_id
+        # non validi tornano da soli al frame intero
+        self.miss_send_len = None
+        self.no_buffer_dps = set()
+        # Controllo di ammissione dei packet-in (pacchetti/secondo per switch e per porta).
+        # Una porta di host che esaurisce i suoi token viene messa a tacere per packet_in_shed_seconds
+        # con un drop temporaneo (sulle porte tra switch l'eccesso si scarta solo nel controller,
+        # un drop fermerebbe anche il traffico inoltrato); con packet_in_meter_pps il table-miss passa da un meter
+        # e l'eccesso di packet-in viene scartato direttamente dallo switch
+        self.admission = PacketInAdmission(datapath_rate=2000, datapath_burst=4000, port_rate=200, port_burst=400)
+        self.packet_in_shed_seconds = 5
+        self.packet_in_meter_pps = None
+        self.packet_in_meter_id = 0xffff
+        self.shed_ports = {}  # (dpid, in_port) -> fine del drop temporaneo
+        # Sorgenti dominanti (eth_src, ipv4_src) per porta, stimate con un count-min sketch sui
+        # packet-in campionati. Con mirror_monitored_ports le porte in monitoring_list vengono
+        # anche copiate al controller (troncate a mirror_max_len byte, al più mirror_meter_pps
+        # pacchetti/s per switch). Con block_top_sources una porta da bloccare blocca invece
+        # le sorgenti con almeno top_source_share del suo traffico
+        self.heavy_hitters = HeavyHitters(width=2048, depth=4, k=16, window=10, decay=0.5, sample_rate=0.1)
+        self.mirror_monitored_ports = False
+        self.mirror_max_len = 64
+        self.mirror_meter_pps = 1000
+        self.mirror_meter_id = 0xfffe
+        self.block_top_sources = False
+        self.top_source_share = 0.5
+        # Sorgenti distinte per porta ogni 10 s (HyperLogLog su ogni packet-in ammesso): un
+        # salto rispetto alla baseline indica un flood di sorgenti false e blocca la porta
+        # (con cardinality_blocking); il totale della rete viene solo segnalato
+        self.cardinality = CardinalityMonitor(precision=10, window=10, jump_factor=4, min_distinct=64, max_distinct=1024)
+        self.cardinality_blocking = True
         self.host_info={} #dizionario per tenere traccia degli host e delle loro porte e switch
 
         self.get_host_info("topology.json")
-        self.thread_monitoring_mitigation = threading.Thread(target=self._monitor_and_mitigate) #unico thread che fa sia monitoring che mitigation
-        self.thread_monitoring_mitigation.daemon = True
-        self.thread_monitoring_mitigation.start()
+        # Eventi di decisione (soglie, blocchi, sblocchi, ...): gli ultimi 4096 in memoria
+        # (kill -USR2 li scrive in events-<istante>.jsonl, o GET /events sull'endpoint delle
+        # metriche), nel log al più 3 volte ogni 10 s per tipo e porta, e in event_log_path
+        # (JSON-lines, None per non scriverlo) da un thread dedicato
+        self.event_log_path = 'events.jsonl'
+        self.event_writer = None
+        if self.event_log_path is not None:
+            self.event_writer = EventWriter(self.event_log_path, logger=self.logger)
+            self.event_writer.start()
+        self.event_log = EventLog(self.logger, capacity=4096, burst=3, interval=10, writer=self.event_writer)
+        signal.signal(signal.SIGUSR2, lambda signum, frame: self._dump_events())
+        # Scrittura di port_stats.csv in un thread dedicato, ruotato ogni 64 MB o 1 ora
+        self.stats_writer = StatsWriter('port_stats.csv', compression='gzip', logger=self.logger)
+        self.stats_writer.start()
+        # Storico binario dei contatori, un segmento per ora (lettura con port_history.PortHistoryReader)
+        self.port_history = PortHistoryWriter('port_history', segment_seconds=3600, logger=self.logger)
+        self.port_history.start()
+        # Richieste di statistiche sfasate, con intervallo per porta: 0.5s vicino alla soglia,
+        # 2s per le porte attive, fino a 8s per quelle a riposo (jitter del 10%)
+        self.stats_poller = StatsPollScheduler(self._request_stats, interval=2, min_interval=0.5,
+                                               max_interval=8, jitter=0.1, logger=self.logger)
+        self.stats_poller.start()
+        # In modalità 'flow' si interrogano anche le flow stats dei flussi L2, ogni 2 secondi
+        self.flow_stats_poller = StatsPollScheduler(self._request_flow_stats, interval=2, min_interval=2,
+                                                    max_interval=2, jitter=0.1, logger=self.logger)
+        if self.detection_mode == 'flow':
+            self.flow_stats_poller.start()
+        # Metriche in formato Prometheus su http://127.0.0.1:metrics_port/metrics, es. 9105
+        # (None: disattivate). L'endpoint parte in start(), quando ryu-manager avvia l'app.
+        # Nel percorso caldo solo tre istogrammi; il resto si legge dallo stato del controller allo scrape
+        self.metrics_port = None
+        self.metrics = MetricsRegistry(prefix='ddos_controller_', logger=self.logger)
+        self._register_metrics()
+        self.metrics_server = None
+        # Profilazione opzionale degli handler e del loop di monitoraggio: tempi per handler,
+        # attesa in coda, e stack campionati in profiles/ (kill -USR1 o handler oltre profiling_budget s)
+        self.profiling = False
+        self.profiling_budget = 0.05
+        if self.profiling:
+            self.profiler = HandlerProfiler(self, budget=self.profiling_budget, output_dir='profiles', logger=self.logger)
+            self.profiler.install(extra=['_monitor_step', '_stats_csv', '_stats_history'])
+            self.profiler.register_metrics(self.metrics)
+        self.thread_monitoring_mitigation = hub.spawn(self._monitor_and_mitigate)
 
      
     def get_host_info(self,filepath):
@@ -43,190 +176,402 @@ class SimpleSwitch13(app_manager.RyuApp):
             print(self.host_info)
 
     
+    def start(self):
+        if self.metrics_port is not None:
+            self.metrics_server = MetricsServer(self.metrics, port=self.metrics_port, logger=self.logger)
+            self.metrics_server.add_route('/events', lambda: ('application/x-ndjson', ''.join(
+                to_json(record) + '\n' for record in self.event_log.recent())))
+            # Porta occupata: il controller continua senza metriche (l'errore è nel log)
+            self.metrics_server.start()
+        return super(SimpleSwitch13, self).start()
+
+    def stop(self):
+        # Svuotamento delle code dei writer e chiusura dei file
+        self.stats_writer.stop()
+        self.port_history.stop()
+        if self.event_writer is not None:
+            self.event_writer.stop()
+        super(SimpleSwitch13, self).stop()
+
+    def _register_metrics(self):
+        metrics = self.metrics
+        self.packet_in_seconds = metrics.histogram('packet_in_handler_seconds', 'Packet-in handler run time')
+        self.stats_rtt_seconds = metrics.histogram('port_stats_rtt_seconds', 'Port stats request-to-reply time')
+        self.monitor_loop_seconds = metrics.histogram('monitor_loop_seconds', 'Run time of one monitor and mitigate iteration')
+
+        admission = self.admission
+        metrics.callback('packet_ins_total', 'Packet-ins per datapath and admission verdict',
+                         lambda: [((dpid, 'admitted'), n) for dpid, n in admission.admitted.items()] +
+                                 [((dpid, 'dropped'), n) for dpid, n in admission.dropped.items()],
+                         kind='counter', labelnames=('dpid', 'verdict'))
+        programmer = self.flow_programmer
+        metrics.callback('flow_programmer_messages_total', 'Flow-mods and meter-mods sent',
+                         lambda: programmer.messages, kind='counter')
+        metrics.callback('flow_programmer_batches_total', 'Batches sent, each closed by a barrier',
+                         lambda: programmer.batches, kind='counter')
+        metrics.callback('flow_programmer_inflight', 'Batches waiting for their barrier reply',
+                         lambda: len(programmer.inflight))
+        metrics.callback('flow_programmer_barrier_timeouts_total', 'Batches failed without a barrier reply',
+                         lambda: programmer.timeouts, kind='counter')
+
+        metrics.callback('datapaths', 'Connected datapaths', lambda: len(self.datapaths))
+        metrics.callback('blocked_ports', 'Entries in blocked_ports', lambda: len(self.blocked_ports))
+        metrics.callback('blocked_flows', 'Entries in blocked_flows', lambda: len(self.blocked_flows))
+        metrics.callback('mitigated_ports', 'Ports with their top sources blocked', lambda: len(self.mitigated_ports))
+        metrics.callback('monitoring_list', 'Entries in monitoring_list', lambda: len(self.monitoring_list))
+        metrics.callback('flow_monitoring_list', 'Entries in flow_monitoring_list', lambda: len(self.flow_monitoring_list))
+        metrics.callback('mac_to_port_entries', 'Learned MAC addresses per datapath',
+                         lambda: [((dpid,), len(table)) for dpid, table in self.mac_to_port.tables.items()],
+                         labelnames=('dpid',))
+        metrics.callback('stats_requests_total', 'Port stats requests sent',
+                         lambda: self.stats_poller.requests, kind='counter')
+        metrics.callback('stats_timeouts_total', 'Port stats requests without a reply',
+                         lambda: self.stats_poller.timeouts, kind='counter')
+        metrics.callback('stats_writer_errors_total', 'Failed writes of port_stats.csv',
+                         lambda: self.stats_writer.errors, kind='counter')
+        metrics.callback('stats_writer_dropped_total', 'Stats batches dropped on a full writer queue',
+                         lambda: self.stats_writer.dropped, kind='counter')
+        metrics.callback('port_history_errors_total', 'Failed writes of the binary port history',
+                         lambda: self.port_history.errors, kind='counter')
+        metrics.callback('port_history_dropped_total', 'Port history batches dropped on a full writer queue',
+                         lambda: self.port_history.dropped, kind='counter')
+
+        metrics.callback('port_rx_bytes_per_second', 'Last measured rx rate per port',
+                         lambda: self._port_rates(self.port_stats.rx_throughput), labelnames=('dpid', 'port'))
+        metrics.callback('port_tx_bytes_per_second', 'Last measured tx rate per port',
+                         lambda: self._port_rates(self.port_stats.tx_throughput), labelnames=('dpid', 'port'))
+
+    def _port_rates(self, column):
+        stats = self.port_stats
+        size = stats.size
+        dpids = stats.dpid[:size].tolist()
+        port_nos = stats.port_no[:size].tolist()
+        values = column[:size].tolist()
+        return [((dpid, port_no), value) for dpid, port_no, value in zip(dpids, port_nos, values)
+                if dpid in self.datapaths]
+
     def _monitor_and_mitigate(self):
         self.logger.info("Monitor and Mitigate thread started")
-        if os.path.exists('port_stats.csv'):
-            os.remove('port_stats.csv')
         while True:
-          #Sezione di monitoraggio
-            for dp in self.datapaths.values():
-                self._request_stats(dp)
-            self._stats_csv() 
-
-          #Sezione di mitigazione
-            for (dpid, port_no), block_time in list(self.blocked_ports.items()):
-              if (time.time() - block_time) > 30:
-                self._unblock_port(dpid, port_no)
-                del self.blocked_ports[(dpid, port_no)]
-            self.logger.info(f"\n____PORTE ATTUALMENTE BLOCCATE: {list(self.blocked_ports.keys())}____")
-         
-            
-            time.sleep(2)
-
-
-
-
-    def _block_port(self, dpid, port_no):
-        self.monitoring_list.remove((dpid, port_no))
-
-        datapath = self.datapaths[dpid]
+            started = time.perf_counter()
+            self._monitor_step()
+            self.monitor_loop_seconds.observe(time.perf_counter() - started)
+            hub.sleep(2)
+
+    def _monitor_step(self):
+        #Le richieste di statistiche le invia self.stats_poller, gli sblocchi self.block_timers
+        # Solo i conteggi: porte e flussi bloccati sono negli eventi di blocco e sblocco
+        if self.blocked_ports or self.blocked_flows or self.monitoring_list or self.admission.dropped:
+            self.event_log.event('status', blocked_ports=len(self.blocked_ports), blocked_flows=len(self.blocked_flows),
+                                 monitoring=len(self.monitoring_list), admitted=sum(self.admission.admitted.values()),
+                                 dropped=sum(self.admission.dropped.values()))
+        self.mac_to_port.expire(time.time())
+        self.offenders.prune(time.time())
+        self.event_log.prune()
+        self.heavy_hitters.tick(time.time())
+        for alarm in self.cardinality.tick(time.time()):
+            self._cardinality_alarm(*alarm)
+
+    def _dump_events(self):
+        path = 'events-%s.jsonl' % time.strftime('%Y%m%d-%H%M%S')
+        count = self.event_log.dump(path)
+        self.logger.info('%d events written to %s', count, path)
+
+    def _add_learned_flow(self, datapath, match, actions, buffer_id=None):
+        # Con OFPFF_SEND_FLOW_REM la scadenza del flusso sullo switch arriva come FlowRemoved
+        # e fa invecchiare la voce MAC (il traffico del flusso non genera packet-in)
+        self.mac_to_port.flow_added(datapath.id, match['eth_src'], match['in_port'], match['eth_dst'])
+        return self.add_flow(datapath, 1, match, actions, buffer_id,
+                             idle_timeout=self.mac_idle_timeout, hard_timeout=self.mac_hard_timeout,
+                             table_id=FORWARDING_TABLE, cookie=COOKIE_LEARNING,
+                             flags=datapath.ofproto.OFPFF_SEND_FLOW_REM)
+
+    def _request_stats(self, datapath, port_no=None):
+        self.logger.debug('send stats request: %016x', datapath.id)
+        ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        # Create a match for incoming traffic on the port
-        match = parser.OFPMatch(in_port=port_no)
-
-        # Create an action to drop packets
-        actions = []
-
-        self.add_flow(datapath, 2, match, actions)
-
-        out = parser.OFPPacketOut(datapath=datapath, buffer_id=0, in_port=port_no, actions=actions, data=None)
-        datapath.send_msg(out)
-
-        self.logger.info(f'\n\n*************PORTA {(dpid, port_no)} RIMOSSA DALLA monitoring_list E BLOCCATA*************')
-
-    def _unblock_port(self, dpid, port_no):
-        self.logger.info(f'\n\n*************PORTA {(dpid, port_no)} SBLOCCATA*************')
-
-        # Remove the flow entry that drops packets
-        datapath = self.datapaths[dpid]
-        parser = datapath.ofproto_parser
-        match = parser.OFPMatch(in_port=port_no)
-        self.remove_flow(datapath, match)
+        if port_no is None:
+            port_no = ofproto.OFPP_ANY
+        req = parser.OFPPortStatsRequest(datapath, 0, port_no)
+        datapath.set_xid(req)
+        datapath.send_msg(req)
+        if any(key[0] == datapath.id for key in self.mitigated_ports):
+            self._request_mitigation_stats(datapath)
+        return req.xid
 
-    def remove_flow(self, datapath, match):
+    def _request_mitigation_stats(self, datapath):
+        # Byte scartati dai drop delle sorgenti dominanti: tabella ACL, cookie di mitigazione
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
+        req = parser.OFPFlowStatsRequest(datapath, 0, ACL_TABLE, ofproto.OFPP_ANY, ofproto.OFPG_ANY,
+                                         COOKIE_MITIGATION, COOKIE_MASK, parser.OFPMatch())
+        datapath.set_xid(req)
+        datapath.send_msg(req)
+        self.mitigation_stats_xids[(datapath.id, req.xid)] = {}
 
-        mod = parser.OFPFlowMod(
-            datapath=datapath,
-            command=ofproto.OFPFC_DELETE,
-            out_port=ofproto.OFPP_ANY,
-            out_group=ofproto.OFPG_ANY,
-            match=match
-        )
-        datapath.send_msg(mod)
-
-    def _request_stats(self, datapath):
-        self.logger.debug('send stats request: %016x', datapath.id)
+    def _request_flow_stats(self, datapath, port_no=None):
+        self.logger.debug('send flow stats request: %016x', datapath.id)
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        req = parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY)
+        # Solo i flussi appresi: tabella di forwarding e cookie del learning switch
+        match = parser.OFPMatch() if port_no is None else parser.OFPMatch(in_port=port_no)
+        req = parser.OFPFlowStatsRequest(datapath, 0, FORWARDING_TABLE, ofproto.OFPP_ANY,
+                                         ofproto.OFPG_ANY, COOKIE_LEARNING, COOKIE_MASK, match)
+        datapath.set_xid(req)
         datapath.send_msg(req)
+        return req.xid
 
-    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, CONFIG_DISPATCHER])
+    @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
     def _state_change_handler(self, ev):
         datapath = ev.datapath
         if ev.state == MAIN_DISPATCHER:
             if datapath.id not in self.datapaths:
                 self.logger.info('Register datapath: %016x', datapath.id)
                 self.datapaths[datapath.id] = datapath
-        elif ev.state == 'DEAD_DISPATCHER':
+                self.stats_poller.add(datapath)
+                self.flow_stats_poller.add(datapath)
+        elif ev.state == DEAD_DISPATCHER:
             if datapath.id in self.datapaths:
                 self.logger.info('Unregister datapath: %016x', datapath.id)
                 del self.datapaths[datapath.id]
+                self.stats_poller.remove(datapath.id)
+                self.flow_stats_poller.remove(datapath.id)
+                self.flow_stats.remove_switch(datapath.id)
+                self.flow_programmer.remove(datapath.id)
+                self._forget_datapath(datapath.id)
+
+    def _forget_datapath(self, dpid):
+        # Lo stato di mitigazione di uno switch disconnesso non si può più applicare
+        # La storia dei recidivi resta: decade da sola e vale anche dopo una riconnessione
+        for key in [k for k in self.blocked_ports if k[0] == dpid]:
+            del self.blocked_ports[key]
+            self.block_timers.cancel(key)
+        for key in [k for k in self.blocked_flows if k[0] == dpid]:
+            del self.blocked_flows[key]
+            self.block_timers.cancel(key)
+        for key in [k for k in self.rate_limits if k[0] == dpid]:
+            del self.rate_limits[key]
+        for key in [k for k in self.mitigated_ports if k[0] == dpid]:
+            del self.mitigated_ports[key]
+        for key in [k for k in self.mitigation_stats_xids if k[0] == dpid]:
+            del self.mitigation_stats_xids[key]
+        self.monitoring_list = [k for k in self.monitoring_list if k[0] != dpid]
+        self.flow_monitoring_list = [k for k in self.flow_monitoring_list if k[0] != dpid]
+        self.meter_ids.pop(dpid, None)
+        self.port_detector.reset(self.port_stats.switch_rows(dpid))
+        self.port_stats.forget_switch(dpid)
+        self.heavy_hitters.forget(dpid)
+        self.cardinality.forget(dpid)
+        self.mac_to_port.forget(dpid)
+        self.admission.forget(dpid)
+        for key in [k for k in self.shed_ports if k[0] == dpid]:
+            del self.shed_ports[key]
 
     @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
     def _port_stats_reply_handler(self, ev):
         body = ev.msg.body
         datapath = ev.msg.datapath
         dpid = datapath.id
-    
-        self.port_stats.setdefault(dpid, {})
-    
+
+        rtt = self.stats_poller.reply(dpid, ev.msg.xid, ev.msg.flags & datapath.ofproto.OFPMPF_REPLY_MORE,
+                                      (stat.port_no for stat in body))
+        if rtt is not None:
+            self.stats_rtt_seconds.observe(rtt)
+            self.logger.debug('port stats reply from %016x: rtt %.3f ms', dpid, rtt * 1000)
+
+        # Chiama la funzione per aggiornare le statistiche delle porte
+        rows = self._update_port_stats(dpid, body)
+        if rows is None:
+            return
+
+        # Chiama la funzione per monitorare le porte
+        self._monitor_port(dpid, rows)
+
+        # Prossimo poll di ogni porta in base alla distanza dalla soglia
+        self._update_poll_intervals(dpid, rows)
+
+        # Solo le porte di questa reply vanno nel CSV e nello storico
+        self._stats_csv(dpid, rows)
+        self._stats_history(dpid, rows)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatus, MAIN_DISPATCHER)
+    def _port_status_handler(self, ev):
+        msg = ev.msg
+        if msg.reason == msg.datapath.ofproto.OFPPR_DELETE:
+            self.stats_poller.remove_port(msg.datapath.id, msg.desc.port_no)
+            self.flow_stats_poller.remove_port(msg.datapath.id, msg.desc.port_no)
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def _flow_stats_reply_handler(self, ev):
+        msg = ev.msg
+        dpid = msg.datapath.id
+        more = msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE
+        if (dpid, msg.xid) in self.mitigation_stats_xids:
+            self._update_mitigation_stats(dpid, msg.xid, msg.body, not more)
+            return
+        self.flow_stats_poller.reply(dpid, msg.xid, more)
+
+        rows = self._update_flow_stats(dpid, msg.body, not more)
+        if rows is not None:
+            self._monitor_flow(dpid, rows)
+
+    def _update_mitigation_stats(self, dpid, xid, body, final):
+        dropped = self.mitigation_stats_xids[(dpid, xid)]
         for stat in body:
-            port_no = stat.port_no
-    
-            # Skip special port numbers
-            if port_no >= ofproto_v1_3.OFPP_MAX:
+            # Solo i drop per sorgente (eth_src senza eth_dst) installati da _block_top_sources
+            if stat.match.get('eth_src') is None or stat.match.get('eth_dst') is not None:
                 continue
-    
-            # Chiama la funzione per aggiornare le statistiche della porta
-            self._update_port_stats(dpid, port_no, stat)
-    
-            # Chiama la funzione per monitorare la porta
-            self._monitor_port(dpid, port_no)
-    
-    def _update_port_stats(self, dpid, port_no, stat):
-        curr_time = time.time()
-    
-        # Inizializza le statistiche se la porta non è presente
-        if port_no not in self.port_stats[dpid]:
-            self.port_stats[dpid][port_no] = {
-                'rx_bytes': stat.rx_bytes,
-                'tx_bytes': stat.tx_bytes,
-                'timestamp': curr_time
-            }
-        else:
-            prev_stats = self.port_stats[dpid][port_no]
-            time_diff = curr_time - prev_stats['timestamp']
-    
-            # Calcolo del throughput
-            rx_throughput = (stat.rx_bytes - prev_stats['rx_bytes']) / time_diff
-            tx_throughput = (stat.tx_bytes - prev_stats['tx_bytes']) / time_diff
-    
-            # Aggiornamento delle statistiche
-            self.port_stats[dpid][port_no]['rx_bytes'] = stat.rx_bytes
-            self.port_stats[dpid][port_no]['tx_bytes'] = stat.tx_bytes
-            self.port_stats[dpid][port_no]['timestamp'] = curr_time
-            self.port_stats[dpid][port_no]['rx_throughput'] = rx_throughput
-            self.port_stats[dpid][port_no]['tx_throughput'] = tx_throughput
-    
-    def _monitor_port(self, dpid, port_no):
-        rx_throughput = self.port_stats[dpid][port_no].get('rx_throughput', 0)
-    
-        self.active_ports = [p for p in self.port_stats[dpid] if self.port_stats[dpid][p].get('rx_throughput', 0) > self.lower_threshold]
-        self.num_active_ports = len(self.active_ports) - len(self.blocked_ports)
-    
-            # Monitoraggio delle porte in base al throughput
-        if rx_throughput > self.threshold:
-            if ((dpid, port_no) not in self.monitoring_list and (dpid, port_no) not in self.blocked_ports):
-                
-                self.logger.warning(f'\n*************LA PORTA {(dpid, port_no)} HA SUPERATO LA SOGLIA CON RX=%f*************', rx_throughput)
-                if (dpid,port_no) in self.host_info:
-                    self.monitoring_list.append((dpid, port_no))
-                    self.logger.info(f'\n*************PORTA {(dpid, port_no)} AGGIUNTA ALLA monitoring_list: {self.monitoring_list}*************')
-                else:
-                    self.logger.info(f'\nLA PORTA {(dpid, port_no)} È ATTRAVERSATA DA TRAFFICO INTERMEDIO -> NON AGGIUNTA ALLA monitoring_list')
-            elif (dpid, port_no) in self.monitoring_list and (dpid, port_no) not in self.blocked_ports and (dpid,port_no) in self.host_info:
-                self.logger.warning(f'\n*************LA PORTA {(dpid, port_no)} HA SUPERATO LA SOGLIA CON RX=%f*************', rx_throughput)
-                self.blocked_ports[(dpid, port_no)] = time.time()
-                self._block_port(dpid, port_no)
-    
-        elif rx_throughput < self.threshold:
-            if (dpid, port_no) in self.monitoring_list:
-                self.monitoring_list.remove((dpid, port_no))
-                self.logger.info(f'\n\n*************PORTA {(dpid, port_no)} RIMOSSA DALLA monitoring_list -> monitoring_list attuale: {self.monitoring_list}*************')
-  
+            port_no = stat.match['in_port']
+            dropped[port_no] = dropped.get(port_no, 0) + stat.byte_count
+        if not final:
+            return
+        del self.mitigation_stats_xids[(dpid, xid)]
+        now = time.time()
+        for (mdpid, port_no), entry in self.mitigated_ports.items():
+            if mdpid != dpid:
+                continue
+            total = dropped.get(port_no, 0)
+            # Un drop scaduto fa scendere il totale: la lettura fa solo da nuova base
+            if entry[1] is not None and total >= entry[0] and now > entry[1]:
+                entry[2] = (total - entry[0]) / (now - entry[1])
+            entry[0] = total
+            entry[1] = now
+
+    def _update_flow_stats(self, dpid, body, final):
+        # Si tengono solo i flussi L2 installati da _packet_in_handler (cookie del learning)
+        keys = []
+        byte_counts = []
+        packet_counts = []
+        durations = []
+        for stat in body:
+            if stat.cookie & COOKIE_MASK != COOKIE_LEARNING:
+                continue
+            match = stat.match
+            keys.append((dpid, match['in_port'], match['eth_src'], match['eth_dst']))
+            byte_counts.append(stat.byte_count)
+            packet_counts.append(stat.packet_count)
+            durations.append(stat.duration_sec + stat.duration_nsec * 1e-9)
+
+        rows = self.flow_stats.update(dpid, keys, byte_counts, packet_counts, durations, time.time(), final)
+        return rows if len(rows) else None
+
+    def _monitor_flow(self, dpid, rows):
+        flows = self.flow_stats
+        byte_rate = flows.byte_rate[rows]
+
+        # Solo i flussi sopra soglia generano oggetti Python
+        for i in np.flatnonzero(byte_rate > self.threshold):
+            key = flows.keys[rows[i]]
+            if key not in self.flow_monitoring_list and key not in self.blocked_flows:
+                self.event_log.event('flow_threshold', key, flow=key, rate=float(byte_rate[i]))
+                if key[:2] in self.host_info:
+                    self.flow_monitoring_list.append(key)
+                    self.event_log.event('flow_monitoring_add', key, flow=key, monitoring=len(self.flow_monitoring_list))
+            elif key in self.flow_monitoring_list and key not in self.blocked_flows:
+                self.event_log.event('flow_threshold', key, flow=key, rate=float(byte_rate[i]))
+                self.blocked_flows[key] = time.time()
+                self._block_flow(*key)
+                self._schedule_unblock(key)
+
+        # Flussi in flow_monitoring_list di questo switch tornati sotto soglia (o scaduti)
+        for key in list(self.flow_monitoring_list):
+            if key[0] != dpid:
+                continue
+            row = flows.index.get(key)
+            if row is None or flows.byte_rate[row] < self.threshold:
+                self.flow_monitoring_list.remove(key)
+                self.event_log.event('flow_monitoring_remove', key, flow=key, monitoring=len(self.flow_monitoring_list))
+
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         datapath = ev.msg.datapath
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
+        # Tabella ACL: senza una regola di mitigazione il traffico prosegue al forwarding
         match = parser.OFPMatch()
-        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER,
-                                          ofproto.OFPCML_NO_BUFFER)]
-        self.add_flow(datapath, 0, match, actions)
-
-    def add_flow(self, datapath, priority, match, actions, buffer_id=None):
+        self.add_flow(datapath, 0, match, [], table_id=ACL_TABLE,
+                      cookie=COOKIE_PROACTIVE, goto=FORWARDING_TABLE)
+
+        if self.packet_in_meter_pps:
+            band = parser.OFPMeterBandDrop(rate=self.packet_in_meter_pps, burst_size=self.packet_in_meter_pps)
+            self.flow_programmer.send(datapath, parser.OFPMeterMod(
+                datapath=datapath, command=ofproto.OFPMC_ADD,
+                flags=ofproto.OFPMF_PKTPS | ofproto.OFPMF_BURST,
+                meter_id=self.packet_in_meter_id, bands=[band]))
+        if self.mirror_monitored_ports:
+            band = parser.OFPMeterBandDrop(rate=self.mirror_meter_pps, burst_size=self.mirror_meter_pps)
+            self.flow_programmer.send(datapath, parser.OFPMeterMod(
+                datapath=datapath, command=ofproto.OFPMC_ADD,
+                flags=ofproto.OFPMF_PKTPS | ofproto.OFPMF_BURST,
+                meter_id=self.mirror_meter_id, bands=[band]))
+        self._install_table_miss(datapath)
+
+    def _miss_send_len(self, datapath):
+        if self.miss_send_len is None or datapath.id in self.no_buffer_dps:
+            return datapath.ofproto.OFPCML_NO_BUFFER
+        return self.miss_send_len
+
+    def _install_table_miss(self, datapath):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
-                                             actions)]
-        if buffer_id:
-            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
-                                    priority=priority, match=match,
-                                    instructions=inst)
-        else:
-            mod = parser.OFPFlowMod(datapath=datapath, priority=priority,
-                                    match=match, instructions=inst)
-        datapath.send_msg(mod)
+        # Tabella di forwarding: table-miss verso il controller
+        miss_send_len = self._miss_send_len(datapath)
+        datapath.send_msg(parser.OFPSetConfig(datapath, ofproto.OFPC_FRAG_NORMAL, miss_send_len))
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, miss_send_len)]
+        meter_id = self.packet_in_meter_id if self.packet_in_meter_pps else None
+        # Stessa match e priorità: su una reinstallazione lo switch sostituisce la regola
+        self.add_flow(datapath, 0, parser.OFPMatch(), actions, meter_id=meter_id,
+                      table_id=FORWARDING_TABLE, cookie=COOKIE_PROACTIVE)
+
+    def _disable_buffering(self, datapath, reason):
+        if datapath.id in self.no_buffer_dps:
+            return
+        # Il ricordo sopravvive alle riconnessioni: lo switch non cambia comportamento
+        self.no_buffer_dps.add(datapath.id)
+        self.logger.warning('switch %016x: %s, packet-in buffering disabled', datapath.id, reason)
+        self._install_table_miss(datapath)
+        self.flow_programmer.flush(datapath)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def _flow_removed_handler(self, ev):
+        msg = ev.msg
+        if msg.cookie & COOKIE_MASK != COOKIE_LEARNING:
+            return
+        match = msg.match
+        idle_timeout = msg.idle_timeout if msg.reason == msg.datapath.ofproto.OFPRR_IDLE_TIMEOUT else None
+        self.mac_to_port.flow_removed(msg.datapath.id, match['eth_src'], match['in_port'], match['eth_dst'],
+                                      time.time(), idle_timeout)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _barrier_reply_handler(self, ev):
+        self.flow_programmer.barrier_reply(ev.msg.datapath.id, ev.msg.xid)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, [CONFIG_DISPATCHER, MAIN_DISPATCHER])
+    def _error_msg_handler(self, ev):
+        msg = ev.msg
+        self.logger.debug('error from %016x: xid=%d type=0x%02x code=0x%02x', msg.datapath.id, msg.xid, msg.type, msg.code)
+        self.flow_programmer.error(msg.datapath, msg.xid, (msg.type, msg.code))
+        # Una richiesta di statistiche rifiutata (es. porta sparita) non deve fermare il polling
+        self.stats_poller.error(msg.datapath.id, msg.xid)
+        self.flow_stats_poller.error(msg.datapath.id, msg.xid)
+        self.mitigation_stats_xids.pop((msg.datapath.id, msg.xid), None)
+        ofproto = msg.datapath.ofproto
+        # Errori sui buffer solo se il controller li sta usando: senza buffering non sono suoi
+        if (msg.type == ofproto.OFPET_BAD_REQUEST and msg.code in (ofproto.OFPBRC_BUFFER_UNKNOWN, ofproto.OFPBRC_BUFFER_EMPTY)
+                and self._miss_send_len(msg.datapath) != ofproto.OFPCML_NO_BUFFER):
+            self._disable_buffering(msg.datapath, 'invalid buffer_id')
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
     def _packet_in_handler(self, ev):
+        started = time.perf_counter()
+        self._handle_packet_in(ev)
+        self.packet_in_seconds.observe(time.perf_counter() - started)
+
+    def _handle_packet_in(self, ev):
         if ev.msg.msg_len < ev.msg.total_len:
             self.logger.debug("packet truncated: only %s of %s bytes",
                               ev.msg.msg_len, ev.msg.total_len)
@@ -235,25 +580,54 @@ class SimpleSwitch13(app_manager.RyuApp):
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
         in_port = msg.match['in_port']
+        dpid = datapath.id
 
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocols(ethernet.ethernet)[0]
+        # Copie del mirror delle porte monitorate: solo campionamento, niente learning.
+        # Il loro volume lo limita già il meter del mirror sullo switch
+        if msg.cookie & COOKIE_MASK == COOKIE_MIRROR:
+            self._sample_mirrored(msg, dpid, in_port)
+            return
 
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+        # Prima di qualsiasi parsing: oltre il budget il packet-in viene scartato
+        verdict = self.admission.admit(dpid, in_port, time.time())
+        if verdict != ADMIT:
+            if verdict == DROP_PORT:
+                self._shed_port(datapath, in_port)
             return
-        dst = eth.dst
-        src = eth.src
 
-        dpid = datapath.id
-        self.mac_to_port.setdefault(dpid, {})
+        if msg.buffer_id == ofproto.OFP_NO_BUFFER and len(msg.data) < msg.total_len:
+            # Frame troncato ma non bufferizzato: non si può più inoltrare
+            self._disable_buffering(datapath, 'truncated packet-in without buffer')
+            return
+
+        if self.full_packet_parse:
+            pkt = packet.Packet(msg.data)
+            eth = pkt.get_protocols(ethernet.ethernet)[0]
+            dst, src, ethertype = eth.dst, eth.src, eth.ethertype
+        else:
+            eth = parse_eth(msg.data)
+            if eth is None:
+                return
+            dst, src, ethertype = eth
+
+        if ethertype == ETH_TYPE_LLDP:
+            return
 
         #self.logger.info("packet in %s %s %s %s", dpid, src, dst, in_port)
 
-        self.mac_to_port[dpid][src] = in_port
+        ipv4_src = parse_ipv4_src(msg.data, ethertype)
+        self.cardinality.add(dpid, in_port, src, ipv4_src)
+        heavy_hitters = self.heavy_hitters
+        if heavy_hitters.sampled():
+            heavy_hitters.add(dpid, in_port, msg.total_len / heavy_hitters.sample_rate, src, ipv4_src)
 
-        if dst in self.mac_to_port[dpid]:
-            out_port = self.mac_to_port[dpid][dst]
-        else:
+        now = time.time()
+        old_port = self.mac_to_port.learn(dpid, src, in_port, now)
+        if old_port is not None:
+            self._mac_moved(datapath, src, old_port, in_port)
+
+        out_port = self.mac_to_port.lookup(dpid, dst, now)
+        if out_port is None:
             out_port = ofproto.OFPP_FLOOD
 
         actions = [parser.OFPActionOutput(out_port)]
@@ -261,10 +635,10 @@ class SimpleSwitch13(app_manager.RyuApp):
         if out_port != ofproto.OFPP_FLOOD:
             match = parser.OFPMatch(in_port=in_port, eth_dst=dst, eth_src=src)
             if msg.buffer_id != ofproto.OFP_NO_BUFFER:
-                self.add_flow(datapath, 1, match, actions, msg.buffer_id)
+                self._add_learned_flow(datapath, match, actions, msg.buffer_id)
                 return
             else:
-                self.add_flow(datapath, 1, match, actions)
+                self._add_learned_flow(datapath, match, actions)
         data = None
         if msg.buffer_id == ofproto.OFP_NO_BUFFER:
             data = msg.data
@@ -273,27 +647,113 @@ class SimpleSwitch13(app_manager.RyuApp):
                                   in_port=in_port, actions=actions, data=data)
         datapath.send_msg(out)
 
-    def _stats_csv(self):
-        file_exists = os.path.isfile('port_stats.csv')
-        with open('port_stats.csv', mode='a') as csv_file:
-            fieldnames = ['timestamp', 'dpid', 'port_no', 'rx_bytes', 'tx_bytes', 'rx_throughput', 'tx_throughput', 'num_active_ports', 'active_ports', 'blocked_ports']
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-
-            if not file_exists:
-                writer.writeheader()
-
-            for dpid, ports in self.port_stats.items():
-                for port_no, stats in ports.items():
-                    human_readable_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stats['timestamp']))
-                    writer.writerow({
-                        'timestamp': human_readable_timestamp,
-                        'dpid': dpid,
-                        'port_no': port_no,
-                        'rx_bytes': stats['rx_bytes'],
-                        'tx_bytes': stats['tx_bytes'],
-                        'rx_throughput': stats.get('rx_throughput', 0),
-                        'tx_throughput': stats.get('tx_throughput', 0),
-                        'num_active_ports': self.num_active_ports,
-                        'active_ports': self.active_ports,
-                        'blocked_ports': self.blocked_ports
-                    })
+    def _mac_moved(self, datapath, mac, old_port, new_port):
+        # L'host si è spostato: via i flussi che lo raggiungono dalla vecchia porta e
+        # quelli appresi con lui come sorgente sulla vecchia porta
+        self.event_log.event('mac_moved', (datapath.id, mac), mac=mac, old_port=(datapath.id, old_port),
+                             new_port=(datapath.id, new_port))
+        parser = datapath.ofproto_parser
+        # Solo flussi appresi: le regole di mitigazione della tabella ACL restano
+        self.remove_flow(datapath, parser.OFPMatch(eth_dst=mac), table_id=FORWARDING_TABLE,
+                         cookie=COOKIE_LEARNING, cookie_mask=COOKIE_MASK)
+        self.remove_flow(datapath, parser.OFPMatch(in_port=old_port, eth_src=mac), table_id=FORWARDING_TABLE,
+                         cookie=COOKIE_LEARNING, cookie_mask=COOKIE_MASK)
+
+    def _cardinality_alarm(self, dpid, port_no, kind, estimate, baseline):
+        if dpid is None:
+            self.event_log.event('network_cardinality', kind, kind=kind, estimate=estimate, baseline=baseline)
+            return
+        key = (dpid, port_no)
+        self.event_log.event('cardinality', (key, kind), port=key, kind=kind, estimate=estimate, baseline=baseline)
+        if not self.cardinality_blocking or key in self.blocked_ports or dpid not in self.datapaths:
+            return
+        if key not in self.host_info:
+            self.event_log.event('transit_port', key, port=key, action='BLOCCATA')
+            return
+        # Sorgenti false: un blocco per sorgente non servirebbe, si blocca la porta
+        self._block_whole_port(dpid, port_no)
+
+    def _sample_mirrored(self, msg, dpid, in_port):
+        eth = parse_eth(msg.data)
+        if eth is None:
+            return
+        self.heavy_hitters.add(dpid, in_port, msg.total_len, eth[1], parse_ipv4_src(msg.data, eth[2]))
+
+    def _start_mirror(self, dpid, port_no):
+        # Copia (troncata) al controller di tutto il traffico della porta, che prosegue
+        # comunque verso il forwarding; priorità 1, sotto le regole di mitigazione
+        if not self.mirror_monitored_ports or dpid not in self.datapaths:
+            return
+        datapath = self.datapaths[dpid]
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        actions = [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, self.mirror_max_len)]
+        self.add_flow(datapath, 1, parser.OFPMatch(in_port=port_no), actions, meter_id=self.mirror_meter_id,
+                      table_id=ACL_TABLE, cookie=COOKIE_MIRROR | port_no, goto=FORWARDING_TABLE)
+
+    def _stop_mirror(self, dpid, port_no):
+        if not self.mirror_monitored_ports or dpid not in self.datapaths:
+            return
+        datapath = self.datapaths[dpid]
+        self.remove_flow(datapath, datapath.ofproto_parser.OFPMatch(in_port=port_no), priority=1,
+                         table_id=ACL_TABLE, cookie=COOKIE_MIRROR | port_no, cookie_mask=COOKIE_MASK)
+
+    def _block_top_sources(self, dpid, port_no):
+        # Blocco mirato delle sorgenti dominanti della porta al posto della porta intera.
+        # False se non ce ne sono (o sono già bloccate): allora si blocca la porta
+        sources = [src for src, share in self.heavy_hitters.top(dpid, port_no, 'eth_src', n=3,
+                                                                min_share=self.top_source_share)
+                   if (dpid, port_no, src, None) not in self.blocked_flows]
+        if not sources:
+            return False
+        self.monitoring_list.remove((dpid, port_no))
+        self._stop_mirror(dpid, port_no)
+        self.mitigated_ports[(dpid, port_no)] = [0, None, None]
+        for src in sources:
+            key = (dpid, port_no, src, None)
+            self.blocked_flows[key] = time.time()
+            self._block_flow(*key)
+            self._schedule_unblock(key)
+        self.event_log.event('top_sources_blocked', (dpid, port_no), port=(dpid, port_no), sources=sources)
+        return True
+
+    def _shed_port(self, datapath, in_port):
+        # Drop temporaneo (hard_timeout) del traffico della porta che sommerge il controller
+        if not self.packet_in_shed_seconds:
+            return
+        key = (datapath.id, in_port)
+        # Solo porte di host: su quelle tra switch (o di transito) il drop bloccherebbe tutto
+        # il traffico inoltrato, per esempio dopo un flush delle tabelle MAC
+        if key not in self.host_info:
+            return
+        now = time.time()
+        # Una porta già bloccata ha già il suo drop, da non sostituire con uno a tempo
+        if self.shed_ports.get(key, 0) > now or key in self.blocked_ports:
+            return
+        self.shed_ports[key] = now + self.packet_in_shed_seconds
+        parser = datapath.ofproto_parser
+        self._add_mitigation_flow(datapath, parser.OFPMatch(in_port=in_port), in_port,
+                                  hard_timeout=self.packet_in_shed_seconds)
+        self.flow_programmer.flush(datapath)
+        self.event_log.event('packet_in_shed', key, port=key, seconds=self.packet_in_shed_seconds)
+
+    def _stats_history(self, dpid, rows):
+        stats = self.port_stats
+        self.port_history.append(float(stats.timestamp[rows[0]]), dpid, stats.port_no[rows],
+                                 stats.rx_bytes[rows], stats.tx_bytes[rows],
+                                 stats.rx_throughput[rows], stats.tx_throughput[rows])
+
+    def _stats_csv(self, dpid, rows):
+        stats = self.port_stats
+        self.stats_writer.submit((
+            float(stats.timestamp[rows[0]]),
+            dpid,
+            stats.port_no[rows].tolist(),
+            stats.rx_bytes[rows].tolist(),
+            stats.tx_bytes[rows].tolist(),
+            stats.rx_throughput[rows].tolist(),
+            stats.tx_throughput[rows].tolist(),
+            stats.num_active_ports(dpid),
+            stats.active_ports(dpid),
+            list(self.blocked_ports)
+        ))
@@ -0,0 +1,197 @@
+import numpy as np
+
+from stats_store import _ColumnStore
+
+
+class Detector(_ColumnStore):
+    # Rilevatore di anomalie sul throughput delle porte. Lo stato è in colonne numpy
+    # indicizzate con le righe di PortStatsStore; update() elabora tutte le porte di una
+    # reply in un colpo e restituisce un array booleano parallelo a rows.
+    # Con i campioni anomali la baseline si sposta solo lentamente: un attacco non diventa
+    # subito il nuovo normale, ma un aumento legittimo e duraturo del traffico smette di
+    # essere un allarme dopo qualche minuto invece di far bloccare la porta all'infinito.
+    # La deviazione standard ha un minimo relativo alla media (rel_std), altrimenti una
+    # porta quasi ferma (varianza ~0) va in allarme per ogni variazione.
+    # floor: sotto questo valore una porta non è mai anomala.
+    FIELDS = (
+        ('alarm', np.bool_),
+    )
+
+    def __init__(self, floor=0.0, capacity=256):
+        self.floor = floor
+        super(Detector, self).__init__(capacity)
+
+    def _ensure(self, rows):
+        needed = int(rows.max()) + 1 if len(rows) else 0
+        if needed > self.capacity:
+            self._grow(max(needed, 2 * self.capacity))
+        self.size = max(self.size, needed)
+
+    def update(self, rows, values):
+        rows = np.asarray(rows, dtype=np.intp)
+        values = np.asarray(values, dtype=np.float64)
+        self._ensure(rows)
+        alarm = self._update(rows, values) & (values > self.floor)
+        self.alarm[rows] = alarm
+        return alarm
+
+    def _update(self, rows, values):
+        raise NotImplementedError
+
+    def reset(self, rows):
+        # Porte sparite o switch disconnesso: si riparte da zero
+        rows = np.asarray(rows, dtype=np.intp)
+        rows = rows[rows < self.capacity]
+        for name, _ in self.FIELDS:
+            getattr(self, name)[rows] = 0
+
+
+class ThresholdDetector(Detector):
+    # Soglia fissa, il comportamento originale
+    def __init__(self, threshold, floor=0.0, capacity=256):
+        self.threshold = threshold
+        super(ThresholdDetector, self).__init__(floor, capacity)
+
+    def _update(self, rows, values):
+        return values > self.threshold
+
+
+class EwmaDetector(Detector):
+    # Media e varianza a media mobile esponenziale: anomalo oltre mean + k * std,
+    # dopo almeno warmup campioni. Durante un allarme la media segue i campioni con
+    # alarm_alpha (la varianza resta ferma): con i valori predefiniti un gradino
+    # legittimo viene assorbito in circa 125 campioni
+    FIELDS = Detector.FIELDS + (
+        ('mean', np.float64),
+        ('var', np.float64),
+        ('samples', np.uint32),
+    )
+
+    def __init__(self, alpha=0.05, k=4.0, warmup=30, min_std=1.0, rel_std=0.1, alarm_alpha=0.01,
+                 floor=0.0, capacity=256):
+        self.alpha = alpha
+        self.k = k
+        self.warmup = warmup
+        self.min_std = min_std
+        self.rel_std = rel_std
+        self.alarm_alpha = alarm_alpha
+        super(EwmaDetector, self).__init__(floor, capacity)
+
+    def _std(self, rows):
+        return np.maximum(np.sqrt(self.var[rows]), np.maximum(self.min_std, self.rel_std * self.mean[rows]))
+
+    def _baseline(self, rows, values, normal):
+        # Righe normali: media e varianza con alpha; anomale: solo la media, con alarm_alpha.
+        # Il primo campione inizializza la baseline
+        first = self.samples[rows] == 0
+        mean = self.mean[rows]
+        diff = values - mean
+        alpha = np.where(normal, self.alpha, self.alarm_alpha)
+        new_mean = np.where(first, values, mean + alpha * diff)
+        new_var = np.where(first, 0.0, np.where(normal, (1 - alpha) * (self.var[rows] + alpha * diff * diff),
+                                                self.var[rows]))
+        self.mean[rows] = new_mean
+        self.var[rows] = new_var
+        self.samples[rows[normal | first]] += 1
+
+    def _update(self, rows, values):
+        warm = self.samples[rows] >= self.warmup
+        alarm = warm & (values > self.mean[rows] + self.k * self._std(rows))
+        self._baseline(rows, values, ~alarm)
+        return alarm
+
+
+class CusumDetector(EwmaDetector):
+    # CUSUM unilaterale sugli scarti standardizzati dalla baseline EWMA:
+    # S = max(0, S + (x - mean) / std - drift), anomalo quando S supera h. S è limitato
+    # a 2 * h, così l'allarme finisce poco dopo che la baseline ha raggiunto il nuovo livello
+    # (che per S deve arrivare entro drift deviazioni, da cui l'alarm_alpha più alto)
+    FIELDS = EwmaDetector.FIELDS + (
+        ('cusum', np.float64),
+    )
+
+    def __init__(self, alpha=0.05, drift=1.0, h=8.0, warmup=30, min_std=1.0, rel_std=0.1, alarm_alpha=0.02,
+                 floor=0.0, capacity=256):
+        self.drift = drift
+        self.h = h
+        super(CusumDetector, self).__init__(alpha, 0.0, warmup, min_std, rel_std, alarm_alpha, floor, capacity)
+
+    def _update(self, rows, values):
+        warm = self.samples[rows] >= self.warmup
+        z = (values - self.mean[rows]) / self._std(rows)
+        cusum = np.where(warm, np.clip(self.cusum[rows] + z - self.drift, 0.0, 2 * self.h), 0.0)
+        self.cusum[rows] = cusum
+        alarm = cusum > self.h
+        # La baseline segue solo i campioni vicini alla media (durante il warmup tutti)
+        self._baseline(rows, values, ~warm | (~alarm & (z < self.h)))
+        return alarm
+
+
+class ZScoreDetector(Detector):
+    # z-score sugli ultimi window campioni normali di ogni porta (buffer circolare 2D).
+    # Durante un allarme entra nella finestra un campione ogni alarm_every: un livello
+    # nuovo e duraturo finisce per far parte della baseline
+    FIELDS = Detector.FIELDS + (
+        ('pos', np.uint32),
+        ('samples', np.uint32),
+        ('alarm_run', np.uint32),
+    )
+
+    def __init__(self, window=30, z=4.0, warmup=20, min_std=1.0, rel_std=0.1, alarm_every=30,
+                 floor=0.0, capacity=256):
+        self.window = window
+        self.z = z
+        self.warmup = min(warmup, window)
+        self.min_std = min_std
+        self.rel_std = rel_std
+        self.alarm_every = alarm_every
+        self.history = np.zeros((0, window))
+        super(ZScoreDetector, self).__init__(floor, capacity)
+
+    def _grow(self, capacity):
+        history = np.zeros((capacity, self.window))
+        history[:len(self.history)] = self.history
+        self.history = history
+        super(ZScoreDetector, self)._grow(capacity)
+
+    def _update(self, rows, values):
+        count = np.minimum(self.samples[rows], self.window)
+        history = self.history[rows]
+        # Le celle non ancora scritte valgono 0 e vanno escluse dalla media
+        filled = np.arange(self.window) < count[:, None]
+        n = np.maximum(count, 1)
+        mean = np.where(filled, history, 0.0).sum(axis=1) / n
+        var = np.where(filled, (history - mean[:, None]) ** 2, 0.0).sum(axis=1) / n
+        std = np.maximum(np.sqrt(var), np.maximum(self.min_std, self.rel_std * mean))
+        alarm = (count >= self.warmup) & ((values - mean) / std > self.z)
+
+        run = np.where(alarm, self.alarm_run[rows] + 1, 0)
+        self.alarm_run[rows] = run
+        keep = ~alarm | (run % self.alarm_every == 0)
+        normal = rows[keep]
+        pos = self.pos[normal]
+        self.history[normal, pos] = values[keep]
+        self.pos[normal] = (pos + 1) % self.window
+        self.samples[normal] += 1
+        return alarm
+
+    def reset(self, rows):
+        super(ZScoreDetector, self).reset(rows)
+        rows = np.asarray(rows, dtype=np.intp)
+        self.history[rows[rows < self.capacity]] = 0
+
+
+DETECTORS = {
+    'threshold': ThresholdDetector,
+    'ewma': EwmaDetector,
+    'cusum': CusumDetector,
+    'zscore': ZScoreDetector,
+}
+
+
+def make_detector(name, **kwargs):
+    try:
+        cls = DETECTORS[name]
+    except KeyError:
+        raise ValueError('unknown detector %r (one of %s)' % (name, ', '.join(sorted(DETECTORS))))
+    return cls(**kwargs)
@@ -0,0 +1,689 @@
+# Datapath OpenFlow 1.3 simulati per i test di scala del controller senza Mininet/OVS.
+#
+# SimulatedSwitch è il modello di uno switch: tabelle dei flussi, contatori sintetici
+# delle porte e generazione dei packet-in; parla OF1.3 a livello di byte (struct), così
+# migliaia di switch stanno in un processo. Due modi di usarlo:
+#   - TCP: ogni switch apre una connessione al controller (ryu-manager) su localhost
+#       python dp_simulator.py --switches 1000 --ports 8 --packet-in-rate 50 --duration 60
+#   - in-process: InProcessDatapath consegna i messaggi direttamente agli handler di
+#     un'app ryu istanziata nello stesso processo (vedi bench_packet_in.py)
+#
+# Semplificazioni: nessun buffer (i packet-in sono sempre OFP_NO_BUFFER, troncati a
+# max_len se il controller lo chiede), i meter vengono accettati ma non applicati,
+# i bundle ONF vengono rifiutati con un errore.
+
+import argparse
+import asyncio
+import collections
+import random
+import struct
+import time
+
+OFP_VERSION = 0x04
+
+OFPT_HELLO = 0
+OFPT_ERROR = 1
+OFPT_ECHO_REQUEST = 2
+OFPT_ECHO_REPLY = 3
+OFPT_EXPERIMENTER = 4
+OFPT_FEATURES_REQUEST = 5
+OFPT_FEATURES_REPLY = 6
+OFPT_GET_CONFIG_REQUEST = 7
+OFPT_GET_CONFIG_REPLY = 8
+OFPT_SET_CONFIG = 9
+OFPT_PACKET_IN = 10
+OFPT_PACKET_OUT = 13
+OFPT_FLOW_MOD = 14
+OFPT_MULTIPART_REQUEST = 18
+OFPT_MULTIPART_REPLY = 19
+OFPT_BARRIER_REQUEST = 20
+OFPT_BARRIER_REPLY = 21
+OFPT_ROLE_REQUEST = 24
+OFPT_ROLE_REPLY = 25
+OFPT_METER_MOD = 29
+
+OFPMP_DESC = 0
+OFPMP_FLOW = 1
+OFPMP_PORT_STATS = 4
+OFPMP_PORT_DESC = 13
+OFPMPF_REPLY_MORE = 1
+
+OFPET_BAD_REQUEST = 1
+OFPBRC_BAD_TYPE = 1
+OFPBRC_BAD_MULTIPART = 2
+OFPBRC_BAD_EXPERIMENTER = 3
+OFPBRC_BUFFER_UNKNOWN = 8
+
+OFPFC_ADD = 0
+OFPFC_MODIFY = 1
+OFPFC_MODIFY_STRICT = 2
+OFPFC_DELETE = 3
+OFPFC_DELETE_STRICT = 4
+
+OFPR_NO_MATCH = 0
+OFPR_ACTION = 1
+
+OFPIT_GOTO_TABLE = 1
+OFPIT_APPLY_ACTIONS = 4
+OFPAT_OUTPUT = 0
+
+OFP_NO_BUFFER = 0xffffffff
+OFPP_MAX = 0xffffff00
+OFPP_CONTROLLER = 0xfffffffd
+OFPP_ANY = 0xffffffff
+OFPCML_NO_BUFFER = 0xffff
+OFPTT_ALL = 0xff
+
+OXM_IN_PORT = 0
+OXM_ETH_DST = 3
+OXM_ETH_SRC = 4
+OXM_ETH_TYPE = 5
+
+HEADER = struct.Struct('!BBHI')
+FEATURES = struct.Struct('!QIBB2xII')
+MULTIPART = struct.Struct('!HH4x')
+PORT_STATS = struct.Struct('!I4xQQQQQQQQQQQQII')
+PORT_DESC = struct.Struct('!I4x6s2x16sIIIIIIII')
+FLOW_MOD = struct.Struct('!QQBBHHHIIIH2x')
+FLOW_STATS_REQUEST = struct.Struct('!B3xII4xQQ')
+FLOW_STATS = struct.Struct('!HBxIIHHHH4xQQQ')
+PACKET_IN = struct.Struct('!IHBBQ')
+PACKET_OUT = struct.Struct('!IIH6x')
+OXM = struct.Struct('!I')
+SEQ = struct.Struct('!Q')
+
+# Dimensione massima del corpo di una multipart reply prima di spezzarla con REPLY_MORE
+MULTIPART_CHUNK = 60000
+
+
+def message(msg_type, xid, body=b''):
+    return HEADER.pack(OFP_VERSION, msg_type, HEADER.size + len(body), xid) + body
+
+
+def error(xid, err_type, code, offending=b''):
+    return message(OFPT_ERROR, xid, struct.pack('!HH', err_type, code) + offending[:64])
+
+
+def _oxm(field, value):
+    return OXM.pack((0x8000 << 16) | (field << 9) | len(value)) + value
+
+
+def encode_match(fields):
+    # fields: {campo OXM: valore in byte}
+    tlvs = b''.join(_oxm(field, value) for field, value in sorted(fields.items()))
+    length = 4 + len(tlvs)
+    return struct.pack('!HH', 1, length) + tlvs + b'\0' * ((length + 7) // 8 * 8 - length)
+
+
+def decode_match(buf, offset):
+    _, length = struct.unpack_from('!HH', buf, offset)
+    fields = {}
+    pos = offset + 4
+    end = offset + length
+    while pos + 4 <= end:
+        header, = OXM.unpack_from(buf, pos)
+        field = (header >> 9) & 0x7f
+        size = header & 0xff
+        value = bytes(buf[pos + 4:pos + 4 + size])
+        if header & 0x100:
+            # Campo con maschera: si tiene solo il valore
+            value = value[:size // 2]
+        fields[field] = value
+        pos += 4 + size
+    return fields, offset + (length + 7) // 8 * 8
+
+
+def decode_instructions(buf, offset, end):
+    # (tabella del goto o None, [(porta, max_len)] delle apply-actions)
+    goto = None
+    outputs = []
+    while offset + 4 <= end:
+        inst_type, length = struct.unpack_from('!HH', buf, offset)
+        if length < 4:
+            break
+        if inst_type == OFPIT_GOTO_TABLE:
+            goto = buf[offset + 4]
+        elif inst_type == OFPIT_APPLY_ACTIONS:
+            pos = offset + 8
+            while pos + 4 <= offset + length:
+                action_type, action_len = struct.unpack_from('!HH', buf, pos)
+                if action_len < 4:
+                    break
+                if action_type == OFPAT_OUTPUT:
+                    outputs.append(struct.unpack_from('!IH', buf, pos + 4))
+                pos += action_len
+        offset += length
+    return goto, outputs
+
+
+class FlowEntry(object):
+    __slots__ = ('table_id', 'priority', 'match', 'cookie', 'idle_timeout', 'hard_timeout', 'flags',
+                 'instructions', 'goto', 'outputs', 'created', 'last_hit', 'packets', 'bytes')
+
+    def __init__(self, table_id, priority, match, cookie, idle_timeout, hard_timeout, flags, instructions, now):
+        self.table_id = table_id
+        self.priority = priority
+        self.match = match
+        self.cookie = cookie
+        self.idle_timeout = idle_timeout
+        self.hard_timeout = hard_timeout
+        self.flags = flags
+        self.instructions = instructions
+        self.goto, self.outputs = decode_instructions(instructions, 0, len(instructions))
+        self.created = now
+        self.last_hit = now
+        self.packets = 0
+        self.bytes = 0
+
+    def exact_key(self):
+        # Le regole del learning switch (in_port, eth_src, eth_dst) vanno in un dizionario
+        if len(self.match) == 3 and OXM_IN_PORT in self.match and OXM_ETH_SRC in self.match and OXM_ETH_DST in self.match:
+            return (self.table_id, self.match[OXM_IN_PORT], self.match[OXM_ETH_SRC], self.match[OXM_ETH_DST])
+        return None
+
+    def covers(self, fields):
+        # Il pacchetto (o la regola) con questi campi soddisfa la match della regola
+        for field, value in self.match.items():
+            if fields.get(field) != value:
+                return False
+        return True
+
+    def within(self, match):
+        # La regola è almeno specifica quanto match (delete e flow stats non strict)
+        for field, value in match.items():
+            if self.match.get(field) != value:
+                return False
+        return True
+
+
+class SimulatedSwitch(object):
+    # Uno switch simulato. Il traffico sintetico di ogni porta (port_rate byte/s in
+    # ingresso, attack_ports con attack_rate) alimenta i contatori delle port stats; in
+    # più packet_rate pacchetti/s vengono fatti passare dalla pipeline: quelli che
+    # colpiscono un flusso appreso aggiornano i suoi contatori, gli altri diventano
+    # packet-in. Con table_hits=False ogni pacchetto diventa un packet-in (come cbench).
+    # L'attacco parte all'istante attack_start (None: dall'avvio dello switch).
+    def __init__(self, dpid, n_ports=4, hosts_per_port=1, port_rate=1e4, packet_rate=0.0,
+                 frame_len=128, attack_ports=(), attack_rate=0.0, n_tables=2,
+                 table_hits=True, max_outstanding=None, seed=None, clock=time.time, attack_start=None):
+        self.dpid = dpid
+        self.n_ports = n_ports
+        self.port_rate = port_rate
+        self.packet_rate = packet_rate
+        self.frame_len = max(frame_len, 14 + SEQ.size)
+        self.attack_ports = set(attack_ports)
+        self.attack_rate = attack_rate
+        self.n_tables = n_tables
+        self.table_hits = table_hits
+        self.max_outstanding = max_outstanding
+        self.clock = clock
+        self.random = random.Random(seed if seed is not None else dpid)
+
+        self.started = clock()
+        self.attack_start = attack_start if attack_start is not None else self.started
+        self.hosts = [(port, b'\x02' + struct.pack('!H', dpid & 0xffff) + struct.pack('!I', i)[1:])
+                      for i, port in enumerate(p for p in range(1, n_ports + 1) for _ in range(hosts_per_port))]
+        self.generated_bytes = collections.Counter()  # porta -> byte dei pacchetti generati
+        self.miss_send_len = OFPCML_NO_BUFFER
+        self.flows = []          # regole con match generiche, per priorità decrescente
+        self.exact = {}          # (tabella, in_port, eth_src, eth_dst) -> regola
+        self._seq = 0
+        self._credit = 0.0
+        self._last_tick = None
+        self.outstanding = {}    # seq del packet-in -> istante di invio
+        self.latencies = collections.deque(maxlen=100000)
+
+        self.packet_ins = 0
+        self.packet_outs = 0
+        self.flow_mods = 0
+        self.meter_mods = 0
+        self.forwarded = 0
+        self.dropped = 0
+        self.errors = 0
+
+    # Messaggi dal controller
+
+    def handle(self, data):
+        # Un messaggio OpenFlow completo; restituisce le risposte da inviare
+        _, msg_type, length, xid = HEADER.unpack_from(data, 0)
+        buf = memoryview(data)[:length]
+        if msg_type == OFPT_HELLO:
+            return []
+        if msg_type == OFPT_ECHO_REQUEST:
+            return [message(OFPT_ECHO_REPLY, xid, bytes(buf[8:]))]
+        if msg_type == OFPT_FEATURES_REQUEST:
+            return [message(OFPT_FEATURES_REPLY, xid, FEATURES.pack(self.dpid, 0, self.n_tables, 0, 0x4f, 0))]
+        if msg_type == OFPT_SET_CONFIG:
+            self.miss_send_len = struct.unpack_from('!HH', buf, 8)[1]
+            return []
+        if msg_type == OFPT_GET_CONFIG_REQUEST:
+            return [message(OFPT_GET_CONFIG_REPLY, xid, struct.pack('!HH', 0, self.miss_send_len))]
+        if msg_type == OFPT_BARRIER_REQUEST:
+            return [message(OFPT_BARRIER_REPLY, xid)]
+        if msg_type == OFPT_ROLE_REQUEST:
+            return [message(OFPT_ROLE_REPLY, xid, bytes(buf[8:]))]
+        if msg_type == OFPT_FLOW_MOD:
+            return self._flow_mod(buf, xid)
+        if msg_type == OFPT_PACKET_OUT:
+            return self._packet_out(buf, xid)
+        if msg_type == OFPT_METER_MOD:
+            self.meter_mods += 1
+            return []
+        if msg_type == OFPT_MULTIPART_REQUEST:
+            return self._multipart(buf, xid)
+        self.errors += 1
+        if msg_type == OFPT_EXPERIMENTER:
+            return [error(xid, OFPET_BAD_REQUEST, OFPBRC_BAD_EXPERIMENTER, bytes(buf))]
+        return [error(xid, OFPET_BAD_REQUEST, OFPBRC_BAD_TYPE, bytes(buf))]
+
+    def _flow_mod(self, buf, xid):
+        self.flow_mods += 1
+        (cookie, cookie_mask, table_id, command, idle_timeout, hard_timeout, priority,
+         buffer_id, out_port, out_group, flags) = FLOW_MOD.unpack_from(buf, 8)
+        match, offset = decode_match(buf, 8 + FLOW_MOD.size)
+        now = self.clock()
+        if command in (OFPFC_DELETE, OFPFC_DELETE_STRICT):
+            strict = command == OFPFC_DELETE_STRICT
+            for entry in self._select(table_id, match, cookie, cookie_mask, priority if strict else None, strict):
+                self._remove(entry)
+            return []
+        entry = FlowEntry(table_id, priority, match, cookie, idle_timeout, hard_timeout, flags,
+                          bytes(buf[offset:]), now)
+        # Stessa tabella, priorità e match: la regola viene sostituita
+        for old in self._select(table_id, match, 0, 0, priority, True):
+            self._remove(old)
+        key = entry.exact_key()
+        if key is not None:
+            self.exact[key] = entry
+        else:
+            self.flows.append(entry)
+            self.flows.sort(key=lambda e: -e.priority)
+        if buffer_id != OFP_NO_BUFFER:
+            return [error(xid, OFPET_BAD_REQUEST, OFPBRC_BUFFER_UNKNOWN, bytes(buf))]
+        return []
+
+    def _select(self, table_id, match, cookie, cookie_mask, priority, strict):
+        if strict:
+            candidates = []
+            entry = self.exact.get((table_id,) + tuple(match.get(f) for f in (OXM_IN_PORT, OXM_ETH_SRC, OXM_ETH_DST)))
+            if entry is not None:
+                candidates.append(entry)
+            candidates.extend(e for e in self.flows if e.table_id == table_id)
+        else:
+            candidates = list(self.flows) + list(self.exact.values())
+        selected = []
+        for entry in candidates:
+            if table_id != OFPTT_ALL and entry.table_id != table_id:
+                continue
+            if (entry.cookie & cookie_mask) != (cookie & cookie_mask):
+                continue
+            if strict:
+                if entry.priority != priority or entry.match != match:
+                    continue
+            elif not entry.within(match):
+                continue
+            selected.append(entry)
+        return selected
+
+    def _remove(self, entry):
+        key = entry.exact_key()
+        if key is not None:
+            if self.exact.get(key) is entry:
+                del self.exact[key]
+        else:
+            self.flows.remove(entry)
+
+    def _packet_out(self, buf, xid):
+        self.packet_outs += 1
+        buffer_id, in_port, actions_len = PACKET_OUT.unpack_from(buf, 8)
+        if buffer_id != OFP_NO_BUFFER:
+            return [error(xid, OFPET_BAD_REQUEST, OFPBRC_BUFFER_UNKNOWN, bytes(buf))]
+        data = buf[8 + PACKET_OUT.size + actions_len:]
+        # Latenza del controller: il packet-out riporta il frame con il suo numero di sequenza
+        if len(data) >= 14 + SEQ.size:
+            seq, = SEQ.unpack_from(data, len(data) - SEQ.size)
+            sent = self.outstanding.pop(seq, None)
+            if sent is not None:
+                self.latencies.append(self.clock() - sent)
+        return []
+
+    def _multipart(self, buf, xid):
+        mp_type, _ = MULTIPART.unpack_from(buf, 8)
+        body = 8 + MULTIPART.size
+        now = self.clock()
+        if mp_type == OFPMP_PORT_DESC:
+            entries = [PORT_DESC.pack(port, b'\x02\0\0\0' + struct.pack('!H', port), ('s%d-eth%d' % (self.dpid, port)).encode()[:15],
+                                      0, 4, 0x840, 0, 0, 0, 10000000, 10000000)
+                       for port in range(1, self.n_ports + 1)]
+        elif mp_type == OFPMP_PORT_STATS:
+            port_no, = struct.unpack_from('!I', buf, body)
+            ports = range(1, self.n_ports + 1) if port_no == OFPP_ANY else [port_no]
+            entries = [self._port_stats(port, now) for port in ports if 1 <= port <= self.n_ports]
+        elif mp_type == OFPMP_FLOW:
+            table_id, out_port, out_group, cookie, cookie_mask = FLOW_STATS_REQUEST.unpack_from(buf, body)
+            match, _ = decode_match(buf, body + FLOW_STATS_REQUEST.size)
+            self.expire(now)
+            entries = [self._flow_stats(entry, now) for entry in self._select(table_id, match, cookie, cookie_mask, None, False)]
+        elif mp_type == OFPMP_DESC:
+            entries = [b''.join(s.encode().ljust(size, b'\0') for s, size in (
+                ('dp_simulator', 256), ('simulated switch', 256), ('1.0', 256), (str(self.dpid), 32), ('', 256)))]
+        else:
+            self.errors += 1
+            return [error(xid, OFPET_BAD_REQUEST, OFPBRC_BAD_MULTIPART, bytes(buf))]
+
+        replies = []
+        chunk = []
+        size = 0
+        for entry in entries:
+            if chunk and size + len(entry) > MULTIPART_CHUNK:
+                replies.append(message(OFPT_MULTIPART_REPLY, xid, MULTIPART.pack(mp_type, OFPMPF_REPLY_MORE) + b''.join(chunk)))
+                chunk = []
+                size = 0
+            chunk.append(entry)
+            size += len(entry)
+        replies.append(message(OFPT_MULTIPART_REPLY, xid, MULTIPART.pack(mp_type, 0) + b''.join(chunk)))
+        return replies
+
+    def _port_stats(self, port, now):
+        elapsed = now - self.started
+        rx_bytes = int(self.port_rate * elapsed) + self.generated_bytes[port]
+        if port in self.attack_ports and now > self.attack_start:
+            rx_bytes += int((self.attack_rate - self.port_rate) * (now - max(self.attack_start, self.started)))
+        tx_bytes = int(self.port_rate * elapsed)
+        duration = int(elapsed)
+        return PORT_STATS.pack(port, rx_bytes // self.frame_len, tx_bytes // self.frame_len, rx_bytes, tx_bytes,
+                               0, 0, 0, 0, 0, 0, 0, 0, duration, int((elapsed - duration) * 1e9))
+
+    def _flow_stats(self, entry, now):
+        match = encode_match(entry.match)
+        age = now - entry.created
+        length = FLOW_STATS.size + len(match) + len(entry.instructions)
+        return FLOW_STATS.pack(length, entry.table_id, int(age), int((age - int(age)) * 1e9), entry.priority,
+                               entry.idle_timeout, entry.hard_timeout, entry.flags, entry.cookie,
+                               entry.packets, entry.bytes) + match + entry.instructions
+
+    def expire(self, now):
+        for entry in list(self.flows) + list(self.exact.values()):
+            if ((entry.hard_timeout and now - entry.created >= entry.hard_timeout) or
+                    (entry.idle_timeout and now - entry.last_hit >= entry.idle_timeout)):
+                self._remove(entry)
+
+    # Traffico generato
+
+    def _lookup(self, table_id, fields, key):
+        entry = self.exact.get((table_id,) + key) if self.table_hits else None
+        for candidate in self.flows:
+            if entry is not None and candidate.priority <= entry.priority:
+                break
+            if candidate.table_id == table_id and candidate.covers(fields):
+                return candidate
+        return entry
+
+    def next_packet(self, now=None):
+        # Un pacchetto attraverso la pipeline: il messaggio di packet-in da inviare o None
+        now = self.clock() if now is None else now
+        in_port, src = self.hosts[self.random.randrange(len(self.hosts))]
+        _, dst = self.hosts[self.random.randrange(len(self.hosts))]
+        self._seq += 1
+        frame = dst + src + b'\x08\x00' + b'\0' * (self.frame_len - 14 - SEQ.size) + SEQ.pack(self._seq)
+        self.generated_bytes[in_port] += len(frame)
+
+        port_bytes = struct.pack('!I', in_port)
+        fields = {OXM_IN_PORT: port_bytes, OXM_ETH_SRC: src, OXM_ETH_DST: dst, OXM_ETH_TYPE: b'\x08\x00'}
+        key = (port_bytes, src, dst)
+        table_id = 0
+        packet_in = None
+        while table_id is not None:
+            entry = self._lookup(table_id, fields, key)
+            if entry is None:
+                self.dropped += 1
+                return packet_in
+            entry.packets += 1
+            entry.bytes += len(frame)
+            entry.last_hit = now
+            for port, max_len in entry.outputs:
+                if port == OFPP_CONTROLLER and packet_in is None:
+                    reason = OFPR_NO_MATCH if entry.priority == 0 and not entry.match else OFPR_ACTION
+                    packet_in = self._packet_in(frame, in_port, reason, table_id, entry.cookie, max_len, now)
+            if not entry.outputs and entry.goto is None:
+                self.dropped += 1
+            elif packet_in is None and entry.outputs:
+                self.forwarded += 1
+            table_id = entry.goto
+        return packet_in
+
+    def _packet_in(self, frame, in_port, reason, table_id, cookie, max_len, now):
+        self.packet_ins += 1
+        data = frame if max_len == OFPCML_NO_BUFFER else frame[:max_len]
+        self.outstanding[self._seq] = now
+        if len(self.outstanding) > 65536:
+            self.outstanding.pop(next(iter(self.outstanding)))
+        body = PACKET_IN.pack(OFP_NO_BUFFER, len(frame), reason, table_id, cookie)
+        return message(OFPT_PACKET_IN, 0, body + encode_match({OXM_IN_PORT: struct.pack('!I', in_port)}) + b'\0\0' + data)
+
+    def tick(self, now=None):
+        # Packet-in dovuti dall'ultimo tick in base a packet_rate; con max_outstanding
+        # (modalità latenza) non si superano i packet-in senza risposta
+        now = self.clock() if now is None else now
+        if self._last_tick is None:
+            self._last_tick = now
+        self._credit += (now - self._last_tick) * self.packet_rate
+        self._last_tick = now
+        messages = []
+        while self._credit >= 1:
+            if self.max_outstanding is not None:
+                self._expire_outstanding(now)
+                if len(self.outstanding) >= self.max_outstanding:
+                    self._credit = 0.0
+                    break
+            self._credit -= 1
+            msg = self.next_packet(now)
+            if msg is not None:
+                messages.append(msg)
+        return messages
+
+    def _expire_outstanding(self, now, timeout=1.0):
+        # Packet-in a cui il controller non ha risposto (scartati, LLDP, ...)
+        for seq in [s for s, sent in self.outstanding.items() if now - sent > timeout]:
+            del self.outstanding[seq]
+
+    def stats(self):
+        return {
+            'dpid': self.dpid,
+            'packet_ins': self.packet_ins,
+            'packet_outs': self.packet_outs,
+            'flow_mods': self.flow_mods,
+            'meter_mods': self.meter_mods,
+            'flows': len(self.flows) + len(self.exact),
+            'forwarded': self.forwarded,
+            'dropped': self.dropped,
+            'errors': self.errors,
+        }
+
+
+async def run_tcp_switch(switch, host='127.0.0.1', port=6653, tick=0.01, stop=None):
+    # Connessione di uno switch al controller: le risposte partono appena arriva la
+    # richiesta, i packet-in ogni tick secondi
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(message(OFPT_HELLO, 0))
+
+    async def receive():
+        while True:
+            header = await reader.readexactly(HEADER.size)
+            length = HEADER.unpack(header)[2]
+            body = await reader.readexactly(length - HEADER.size) if length > HEADER.size else b''
+            for reply in switch.handle(header + body):
+                writer.write(reply)
+
+    receiver = asyncio.ensure_future(receive())
+    try:
+        last_expire = time.time()
+        while (stop is None or not stop.is_set()) and not receiver.done():
+            await asyncio.sleep(tick)
+            now = time.time()
+            for msg in switch.tick(now):
+                writer.write(msg)
+            if now - last_expire >= 1:
+                switch.expire(now)
+                last_expire = now
+            await writer.drain()
+    finally:
+        receiver.cancel()
+        writer.close()
+    if receiver.done() and not receiver.cancelled() and receiver.exception() is not None:
+        raise receiver.exception()
+
+
+class InProcessDatapath(object):
+    # Sostituto di ryu.controller.controller.Datapath per guidare un'app ryu nello stesso
+    # processo: send_msg serializza il messaggio e lo passa allo switch simulato, le
+    # risposte vengono decodificate con il parser di ryu e consegnate agli handler
+    # dell'app registrati con set_ev_cls (senza code né dispatcher).
+    def __init__(self, app, switch):
+        from ryu.controller import ofp_event
+        from ryu.ofproto import ofproto_parser, ofproto_v1_3, ofproto_v1_3_parser
+
+        self._ofp_event = ofp_event
+        self._msg_parser = ofproto_parser
+        self.app = app
+        self.switch = switch
+        self.id = switch.dpid
+        self.ofproto = ofproto_v1_3
+        self.ofproto_parser = ofproto_v1_3_parser
+        self.xid = 0
+        self.is_active = True
+        self.sent = 0
+        self.handlers = collections.defaultdict(list)
+        for name in dir(app):
+            method = getattr(app, name, None)
+            for ev_cls in getattr(method, 'callers', {}):
+                self.handlers[ev_cls].append(method)
+
+    def set_xid(self, msg):
+        self.xid = (self.xid + 1) & 0xffffffff
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        msg.serialize()
+        self.sent += 1
+        for reply in self.switch.handle(bytes(msg.buf)):
+            self.deliver(reply)
+        return True
+
+    def deliver(self, buf):
+        version, msg_type, msg_len, xid = self._msg_parser.header(buf)
+        msg = self._msg_parser.msg(self, version, msg_type, msg_len, xid, buf)
+        self.dispatch(self._ofp_event.ofp_msg_to_ev(msg))
+
+    def dispatch(self, ev):
+        for handler in self.handlers.get(ev.__class__, ()):
+            handler(ev)
+
+    def connect(self):
+        # Handshake come in ryu: features, poi lo stato MAIN
+        from ryu.controller.handler import MAIN_DISPATCHER
+        for reply in self.switch.handle(message(OFPT_FEATURES_REQUEST, 0)):
+            self.deliver(reply)
+        ev = self._ofp_event.EventOFPStateChange(self)
+        ev.state = MAIN_DISPATCHER
+        self.dispatch(ev)
+
+    def packet_in(self, now=None):
+        # Un pacchetto generato dallo switch; True se è diventato un packet-in
+        msg = self.switch.next_packet(now)
+        if msg is None:
+            return False
+        self.deliver(msg)
+        return True
+
+
+def _proc_usage(pid):
+    # CPU (secondi utente + sistema) e RSS (byte) di un processo, da /proc
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open('/proc/%d/statm' % pid) as f:
+            rss_pages = int(f.read().split()[1])
+    except (IOError, OSError):
+        return None
+    ticks = 100.0
+    return (int(fields[11]) + int(fields[12])) / ticks, rss_pages * 4096
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _main(args):
+    switches = [SimulatedSwitch(dpid, args.ports, args.hosts_per_port, args.port_rate, args.packet_in_rate,
+                                args.frame_len, args.attack_ports if dpid in args.attack_switches else (),
+                                args.attack_rate, table_hits=not args.no_table_hits,
+                                max_outstanding=args.max_outstanding)
+                for dpid in range(1, args.switches + 1)]
+    stop = asyncio.Event()
+    tasks = []
+    for switch in switches:
+        tasks.append(asyncio.ensure_future(run_tcp_switch(switch, args.host, args.port, args.tick, stop)))
+        # Connessioni scaglionate: il controller non regge migliaia di handshake insieme
+        await asyncio.sleep(args.connect_interval)
+
+    started = time.time()
+    usage = _proc_usage(args.controller_pid) if args.controller_pid else None
+    last = dict(packet_ins=0, packet_outs=0)
+    while time.time() - started < args.duration:
+        await asyncio.sleep(args.report_interval)
+        packet_ins = sum(s.packet_ins for s in switches)
+        packet_outs = sum(s.packet_outs for s in switches)
+        latencies = [lat for s in switches for lat in s.latencies]
+        for s in switches:
+            s.latencies.clear()
+        line = 'switches=%d packet_in/s=%.0f packet_out/s=%.0f flows=%d p50=%s p99=%s' % (
+            sum(1 for t in tasks if not t.done()),
+            (packet_ins - last['packet_ins']) / args.report_interval,
+            (packet_outs - last['packet_outs']) / args.report_interval,
+            sum(len(s.flows) + len(s.exact) for s in switches),
+            '%.2fms' % (_percentile(latencies, 0.5) * 1000) if latencies else '-',
+            '%.2fms' % (_percentile(latencies, 0.99) * 1000) if latencies else '-')
+        if args.controller_pid:
+            current = _proc_usage(args.controller_pid)
+            if current is not None and usage is not None:
+                line += ' controller_cpu=%.0f%% rss=%.0fMB' % (
+                    100 * (current[0] - usage[0]) / args.report_interval, current[1] / 2 ** 20)
+            usage = current
+        print(line, flush=True)
+        last = dict(packet_ins=packet_ins, packet_outs=packet_outs)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulated OpenFlow 1.3 datapaths for controller scale tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6653)
+    parser.add_argument('--switches', type=int, default=16)
+    parser.add_argument('--ports', type=int, default=4)
+    parser.add_argument('--hosts-per-port', type=int, default=1)
+    parser.add_argument('--port-rate', type=float, default=1e4, help='synthetic rx bytes/s per port')
+    parser.add_argument('--packet-in-rate', type=float, default=10, help='generated packets/s per switch')
+    parser.add_argument('--frame-len', type=int, default=128)
+    parser.add_argument('--attack-switches', type=int, nargs='*', default=[])
+    parser.add_argument('--attack-ports', type=int, nargs='*', default=[1])
+    parser.add_argument('--attack-rate', type=float, default=1e6)
+    parser.add_argument('--no-table-hits', action='store_true', help='every generated packet becomes a packet-in')
+    parser.add_argument('--max-outstanding', type=int, default=None, help='latency mode: unanswered packet-ins per switch')
+    parser.add_argument('--tick', type=float, default=0.01)
+    parser.add_argument('--connect-interval', type=float, default=0.002)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--report-interval', type=float, default=1.0)
+    parser.add_argument('--controller-pid', type=int, default=None, help='report CPU and RSS of the controller process')
+    asyncio.run(_main(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import collections
+import json
+import logging
+import queue
+import threading
+import time
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+# Eventi di decisione: tipo -> (livello, formato). Il formato usa i campi dell'evento e
+# viene applicato dal logging solo se il messaggio passa il livello
+EVENTS = {
+    'threshold': (logging.WARNING, 'LA PORTA %(port)s HA SUPERATO LA SOGLIA CON RX=%(rx).0f'),
+    'monitoring_add': (logging.INFO, 'PORTA %(port)s AGGIUNTA ALLA monitoring_list (%(monitoring)d PORTE)'),
+    'monitoring_remove': (logging.INFO, 'PORTA %(port)s RIMOSSA DALLA monitoring_list (%(monitoring)d PORTE)'),
+    'transit_port': (logging.INFO, 'LA PORTA %(port)s È ATTRAVERSATA DA TRAFFICO INTERMEDIO -> NON %(action)s'),
+    'blocked_for': (logging.INFO, '%(target)s BLOCCATO PER %(duration).0f s'),
+    'port_blocked': (logging.INFO, 'PORTA %(port)s RIMOSSA DALLA monitoring_list E BLOCCATA'),
+    'port_limited': (logging.INFO, 'PORTA %(port)s RIMOSSA DALLA monitoring_list E LIMITATA A %(rate_kbps)d kbps'),
+    'port_unblocked': (logging.INFO, 'PORTA %(port)s SBLOCCATA'),
+    'mitigation_confirmed': (logging.INFO, 'REGOLA DI MITIGAZIONE PER %(target)s CONFERMATA DALLO SWITCH IN %(latency_ms).1f ms'),
+    'mitigation_failed': (logging.WARNING, 'REGOLA DI MITIGAZIONE PER %(target)s NON APPLICATA DALLO SWITCH: %(errors)s'),
+    'rate_raised': (logging.INFO, 'LIMITE DI %(target)s ALZATO A %(rate_kbps)d kbps'),
+    'flow_threshold': (logging.WARNING, 'IL FLUSSO %(flow)s HA SUPERATO LA SOGLIA CON RATE=%(rate).0f'),
+    'flow_monitoring_add': (logging.INFO, 'FLUSSO %(flow)s AGGIUNTO ALLA flow_monitoring_list (%(monitoring)d FLUSSI)'),
+    'flow_monitoring_remove': (logging.INFO, 'FLUSSO %(flow)s RIMOSSO DALLA flow_monitoring_list (%(monitoring)d FLUSSI)'),
+    'flow_blocked': (logging.INFO, 'FLUSSO %(flow)s RIMOSSO DALLA flow_monitoring_list E BLOCCATO'),
+    'flow_unblocked': (logging.INFO, 'FLUSSO %(flow)s SBLOCCATO'),
+    'top_sources_blocked': (logging.INFO, 'PORTA %(port)s: BLOCCATE LE SORGENTI DOMINANTI %(sources)s'),
+    'mitigation_escalated': (logging.WARNING, 'PORTA %(port)s: RX=%(rx).0f DI CUI SCARTATI DAI BLOCCHI DELLE SORGENTI '
+                                              '%(dropped).0f, IL RESTO SUPERA LA SOGLIA -> BLOCCO DELLA PORTA'),
+    'cardinality': (logging.WARNING, 'LA PORTA %(port)s HA %(estimate).0f SORGENTI %(kind)s DISTINTE (BASELINE %(baseline)s)'),
+    'network_cardinality': (logging.WARNING, 'SORGENTI %(kind)s DISTINTE NELLA RETE: %(estimate).0f (BASELINE %(baseline)s)'),
+    'packet_in_shed': (logging.WARNING, 'PACKET-IN DALLA PORTA %(port)s OLTRE IL LIMITE: DROP PER %(seconds)ss'),
+    'mac_moved': (logging.INFO, 'MAC %(mac)s SPOSTATO DALLA PORTA %(old_port)s ALLA PORTA %(new_port)s'),
+    'status': (logging.INFO, 'PORTE BLOCCATE: %(blocked_ports)d, FLUSSI BLOCCATI: %(blocked_flows)d, '
+                             'IN MONITORAGGIO: %(monitoring)d, PACKET-IN AMMESSI: %(admitted)d SCARTATI: %(dropped)d'),
+}
+
+
+def _json_default(value):
+    # Tuple e bytes arrivano come liste e stringhe; il resto (es. interi numpy) come testo
+    if isinstance(value, bytes):
+        return value.hex()
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def to_json(record):
+    timestamp, kind, fields = record
+    return json.dumps(dict(fields, ts=round(timestamp, 6), event=kind), default=_json_default)
+
+
+class EventWriter(object):
+    # Scrittura degli eventi in JSON-lines in un thread dedicato, come StatsWriter per
+    # port_stats.csv: submit non blocca mai, gli eventi oltre la coda vengono contati
+    def __init__(self, path='events.jsonl', queue_size=4096, flush_interval=1.0, logger=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._stop = object()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(self._stop)
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, record):
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        with open(self.path, 'a') as f:
+            while True:
+                records = [self.queue.get()]
+                deadline = time.time() + self.flush_interval
+                while records[-1] is not self._stop and time.time() < deadline:
+                    try:
+                        records.append(self.queue.get(timeout=max(0, deadline - time.time())))
+                    except queue.Empty:
+                        break
+                stop = records[-1] is self._stop
+                if stop:
+                    records.pop()
+                lines = ''.join(to_json(record) + '\n' for record in records)
+                self._blocking(self._write, f, lines)
+                self.written += len(records)
+                if stop:
+                    return
+
+    def _write(self, f, lines):
+        f.write(lines)
+        f.flush()
+
+    def _blocking(self, func, *args):
+        # Con eventlet (ryu-manager) l'I/O su disco va in un thread reale per non fermare l'hub
+        if tpool is not None and patcher.is_monkey_patched('thread'):
+            return tpool.execute(func, *args)
+        return func(*args)
+
+
+class EventLog(object):
+    # Log strutturato degli eventi di decisione. event() costa una tupla in un ring buffer
+    # (gli ultimi capacity eventi, da scaricare con dump/recent); il testo lo formatta il
+    # logging solo se il livello è abilitato. Gli eventi ripetuti con la stessa chiave
+    # (es. la stessa porta sopra soglia a ogni reply) passano al logger e al writer al più
+    # burst volte ogni interval secondi; i soppressi vengono riportati nel campo
+    # 'suppressed' del primo evento emesso dopo.
+    def __init__(self, logger, capacity=4096, burst=3, interval=10.0, writer=None, events=EVENTS, clock=time.time):
+        self.logger = logger
+        self.clock = clock
+        self.burst = burst
+        self.interval = interval
+        self.writer = writer
+        self.events = events
+        self.ring = collections.deque(maxlen=capacity)
+        self.suppressed = 0
+        self._limits = {}  # (tipo, chiave) -> [inizio della finestra, emessi, soppressi]
+
+    def event(self, kind, key=None, **fields):
+        now = self.clock()
+        self.ring.append((now, kind, fields))
+        level, fmt = self.events[kind]
+        if self.writer is None and not self.logger.isEnabledFor(level):
+            return
+
+        limit = self._limits.get((kind, key))
+        if limit is None:
+            limit = self._limits[(kind, key)] = [now, 0, 0]
+        elif now - limit[0] >= self.interval:
+            limit[0] = now
+            limit[1] = 0
+        if limit[1] >= self.burst:
+            limit[2] += 1
+            self.suppressed += 1
+            return
+        limit[1] += 1
+        if limit[2]:
+            fields['suppressed'] = limit[2]
+            fmt += ' (+%(suppressed)d SOPPRESSI)'
+            limit[2] = 0
+
+        self.logger.log(level, fmt, fields)
+        if self.writer is not None:
+            self.writer.submit((now, kind, fields))
+
+    def prune(self, now=None):
+        # Finestre scadute delle chiavi non più viste (porte sbloccate, switch scollegati);
+        # i loro soppressi restano solo nel totale self.suppressed
+        now = self.clock() if now is None else now
+        for key in [k for k, limit in self._limits.items() if now - limit[0] >= self.interval]:
+            del self._limits[key]
+
+    def recent(self, n=None, kind=None):
+        records = [r for r in list(self.ring) if kind is None or r[1] == kind]
+        return records[-n:] if n else records
+
+    def dump(self, path):
+        records = list(self.ring)
+        with open(path, 'w') as f:
+            for record in records:
+                f.write(to_json(record) + '\n')
+        return len(records)
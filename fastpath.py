@@ -0,0 +1,25 @@
+# Lettura diretta dell'header Ethernet (14 byte) dei packet-in, senza costruire
+# un ryu.lib.packet.packet.Packet che analizza tutti i livelli del pacchetto.
+
+ETH_HEADER_LEN = 14
+ETH_TYPE_LLDP = 0x88cc
+
+
+def parse_eth(data):
+    # (dst, src, ethertype) con i MAC nello stesso formato testuale di ryu ('00:00:00:00:00:01'),
+    # None se il frame è più corto di un header Ethernet
+    view = memoryview(data)
+    if len(view) < ETH_HEADER_LEN:
+        return None
+    return view[0:6].hex(':'), view[6:12].hex(':'), (view[12] << 8) | view[13]
+
+
+ETH_TYPE_IPV4 = 0x0800
+IPV4_SRC_OFFSET = ETH_HEADER_LEN + 12
+
+
+def parse_ipv4_src(data, ethertype):
+    # Indirizzo sorgente IPv4 in formato testuale, None se non è IPv4 o se il frame è troncato
+    if ethertype != ETH_TYPE_IPV4 or len(data) < IPV4_SRC_OFFSET + 4:
+        return None
+    return '%d.%d.%d.%d' % tuple(data[IPV4_SRC_OFFSET:IPV4_SRC_OFFSET + 4])
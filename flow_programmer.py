@@ -0,0 +1,220 @@
+import collections
+import logging
+import time
+
+try:
+    from ryu.lib import hub
+except ImportError:
+    # Senza ryu (bench_mitigation.py) si usano solo send/flush e le reply dello switch:
+    # niente thread di flush (start) né wait()
+    hub = None
+
+
+class FlowBatch(object):
+    # Future di un batch di messaggi verso un datapath: completato dalla barrier reply
+    def __init__(self, dpid):
+        self.dpid = dpid
+        self.messages = []
+        self.errors = []
+        self.barrier_xid = None
+        self.bundled = False
+        self.xid_keys = []  # (dpid, xid) dei messaggi inviati, per associare gli errori
+        self.sent_at = None
+        self.barrier_sent_at = None
+        self.done_at = None
+        self._callbacks = []
+        self._event = hub.Event() if hub is not None else None
+
+    def done(self):
+        return self.done_at is not None
+
+    def failed(self):
+        # Completato con errori dello switch sui messaggi o senza barrier reply (disconnessione)
+        return bool(self.errors)
+
+    @property
+    def latency(self):
+        if self.done_at is None:
+            return None
+        return self.done_at - self.sent_at
+
+    def add_done_callback(self, callback):
+        if self.done():
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def wait(self, timeout=None):
+        # Solo da thread dell'hub diversi dal loop degli eventi OpenFlow, che è quello
+        # che consegna la barrier reply: dentro un handler usare add_done_callback
+        return self._event.wait(timeout=timeout)
+
+    def _complete(self, error=None):
+        if error is not None:
+            self.errors.append(error)
+        self.done_at = time.time()
+        if self._event is not None:
+            self._event.set()
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class FlowProgrammer(object):
+    # Raggruppa flow-mod (e meter-mod) per datapath e li invia a blocchi, ognuno chiuso da
+    # una barrier request. Con use_bundles i blocchi di soli flow-mod viaggiano in un
+    # bundle ONF atomico; gli switch che rispondono con un errore tornano ai messaggi singoli.
+    # Un batch la cui barrier reply non arriva entro barrier_timeout secondi (switch
+    # connesso ma reply persa) viene completato con un errore da _expire.
+    def __init__(self, batch_size=64, flush_interval=0.005, use_bundles=False, barrier_timeout=5.0, logger=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.use_bundles = use_bundles
+        self.barrier_timeout = barrier_timeout
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.pending = {}    # dpid -> (datapath, FlowBatch in costruzione)
+        self.inflight = {}   # (dpid, xid della barrier) -> FlowBatch in attesa di conferma
+        self.xids = {}       # (dpid, xid di ogni messaggio inviato) -> FlowBatch
+        self.no_bundles = set()
+        self.latencies = collections.deque(maxlen=1024)
+        self.batches = 0
+        self.messages = 0
+        self.timeouts = 0
+        self._next_expire = 0.0
+        self._bundle_id = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = hub.spawn(self._run)
+
+    def _run(self):
+        while True:
+            hub.sleep(self.flush_interval)
+            for dpid in list(self.pending):
+                self._flush(dpid)
+            now = time.time()
+            if now >= self._next_expire:
+                self._next_expire = now + self.barrier_timeout / 4
+                self._expire(now)
+
+    def _expire(self, now):
+        for key, batch in list(self.inflight.items()):
+            if now - batch.barrier_sent_at < self.barrier_timeout:
+                continue
+            del self.inflight[key]
+            self._forget_xids(batch)
+            self.timeouts += 1
+            self.logger.warning('no barrier reply from %016x after %.1fs', batch.dpid, now - batch.barrier_sent_at)
+            batch._complete('barrier timeout')
+
+    def send(self, datapath, msg):
+        # Accoda il messaggio e restituisce il future del batch che lo conterrà
+        pending = self.pending.get(datapath.id)
+        if pending is None:
+            pending = self.pending[datapath.id] = (datapath, FlowBatch(datapath.id))
+        batch = pending[1]
+        batch.messages.append(msg)
+        if len(batch.messages) >= self.batch_size:
+            self._flush(datapath.id)
+        return batch
+
+    def flush(self, datapath):
+        # Invio immediato di quanto accodato per il datapath (es. una regola di mitigazione)
+        return self._flush(datapath.id)
+
+    def _flush(self, dpid):
+        pending = self.pending.pop(dpid, None)
+        if pending is None:
+            return None
+        datapath, batch = pending
+        batch.sent_at = time.time()
+        self._send_batch(datapath, batch)
+        self.batches += 1
+        self.messages += len(batch.messages)
+        return batch
+
+    def _send_batch(self, datapath, batch):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        if (self.use_bundles and datapath.id not in self.no_bundles and
+                all(isinstance(msg, parser.OFPFlowMod) for msg in batch.messages)):
+            self._bundle_id = (self._bundle_id + 1) & 0xffffffff
+            bundle_id = self._bundle_id
+            flags = ofproto.ONF_BF_ATOMIC
+            msgs = [parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_OPEN_REQUEST, flags, [])]
+            for msg in batch.messages:
+                add = parser.ONFBundleAddMsg(datapath, bundle_id, flags, msg, [])
+                datapath.set_xid(add)
+                msg.xid = add.xid
+                msgs.append(add)
+            msgs.append(parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_COMMIT_REQUEST, flags, []))
+            for msg in msgs:
+                if msg.xid is None:
+                    datapath.set_xid(msg)
+                batch.xid_keys.append((datapath.id, msg.xid))
+                self.xids[(datapath.id, msg.xid)] = batch
+                datapath.send_msg(msg)
+            batch.bundled = True
+        else:
+            # Ogni messaggio ha il suo xid: un errore dello switch resta legato al batch
+            for msg in batch.messages:
+                msg.xid = None
+                datapath.set_xid(msg)
+                batch.xid_keys.append((datapath.id, msg.xid))
+                self.xids[(datapath.id, msg.xid)] = batch
+                datapath.send_msg(msg)
+            batch.bundled = False
+
+        barrier = parser.OFPBarrierRequest(datapath)
+        datapath.set_xid(barrier)
+        datapath.send_msg(barrier)
+        batch.barrier_xid = barrier.xid
+        batch.barrier_sent_at = time.time()
+        self.inflight[(datapath.id, barrier.xid)] = batch
+
+    def barrier_reply(self, dpid, xid):
+        batch = self.inflight.pop((dpid, xid), None)
+        if batch is None:
+            return None
+        self._forget_xids(batch)
+        batch._complete()
+        self.latencies.append(batch.latency)
+        return batch
+
+    def error(self, datapath, xid, error):
+        batch = self.xids.get((datapath.id, xid))
+        if batch is None or batch.done():
+            return
+        if not batch.bundled:
+            # Flow-mod rifiutato: la barrier reply che segue completa il batch con l'errore
+            batch.errors.append(error)
+            return
+        # Bundle rifiutato: si rinuncia ai bundle per questo switch e si reinvia il batch
+        # con messaggi singoli e una nuova barrier (la reply della vecchia viene ignorata)
+        self._forget_xids(batch)
+        self.inflight.pop((datapath.id, batch.barrier_xid), None)
+        if datapath.id not in self.no_bundles:
+            self.logger.warning('bundles not supported by %016x (%s), falling back to plain flow-mods', datapath.id, error)
+            self.no_bundles.add(datapath.id)
+        self._send_batch(datapath, batch)
+
+    def _forget_xids(self, batch):
+        for key in batch.xid_keys:
+            self.xids.pop(key, None)
+        batch.xid_keys = []
+
+    def remove(self, dpid):
+        # Switch disconnesso: i batch in sospeso non verranno mai confermati
+        pending = self.pending.pop(dpid, None)
+        batches = [pending[1]] if pending is not None else []
+        for key in [k for k in self.inflight if k[0] == dpid]:
+            batches.append(self.inflight.pop(key))
+        for key in [k for k in self.xids if k[0] == dpid]:
+            del self.xids[key]
+        self.no_bundles.discard(dpid)
+        for batch in batches:
+            if batch.sent_at is None:
+                batch.sent_at = time.time()
+            batch._complete('datapath disconnected')
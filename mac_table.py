@@ -0,0 +1,128 @@
+import collections
+
+
+class MacTable(object):
+    # Tabella di apprendimento MAC -> porta con limite di voci per datapath.
+    # Le voci scadono dopo idle_timeout secondi senza packet-in e comunque dopo
+    # hard_timeout secondi dal primo apprendimento; a tabella piena si scarta la
+    # voce usata meno di recente. on_remove(dpid, mac, port) viene chiamata per
+    # ogni voce rimossa o spostata su un'altra porta.
+    # Finché sullo switch c'è un flusso appreso con il MAC come sorgente i packet-in di
+    # quel MAC non arrivano: la voce non invecchia (flow_added) e l'invecchiamento
+    # riparte dal FlowRemoved dell'ultimo flusso (flow_removed), come sullo switch.
+    def __init__(self, max_entries=4096, idle_timeout=300, hard_timeout=1800, on_remove=None):
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self.hard_timeout = hard_timeout
+        self.on_remove = on_remove
+        self.tables = {}  # dpid -> OrderedDict mac -> [port, last_seen, learned_at, flussi], dal meno recente
+        self.evicted = 0
+        self.expired = 0
+        self.moves = 0
+
+    def __len__(self):
+        return sum(len(table) for table in self.tables.values())
+
+    def size(self, dpid):
+        return len(self.tables.get(dpid, ()))
+
+    def learn(self, dpid, mac, port, now):
+        # Restituisce la porta precedente se il MAC si è spostato, altrimenti None
+        table = self.tables.get(dpid)
+        if table is None:
+            table = self.tables[dpid] = collections.OrderedDict()
+        entry = table.get(mac)
+        if entry is not None:
+            table.move_to_end(mac)
+            old_port = entry[0]
+            entry[1] = now
+            if old_port == port:
+                return None
+            entry[0] = port
+            entry[2] = now
+            # I flussi della vecchia porta li cancella il chiamante
+            entry[3] = set()
+            self.moves += 1
+            if self.on_remove is not None:
+                self.on_remove(dpid, mac, old_port)
+            return old_port
+
+        if len(table) >= self.max_entries:
+            self._expire(dpid, table, now)
+            if len(table) >= self.max_entries:
+                old_mac, (old_port, _, _, _) = table.popitem(last=False)
+                self.evicted += 1
+                if self.on_remove is not None:
+                    self.on_remove(dpid, old_mac, old_port)
+        table[mac] = [port, now, now, set()]
+        return None
+
+    def flow_added(self, dpid, mac, port, dst):
+        # Flusso appreso (in_port=port, eth_src=mac, eth_dst=dst) installato con OFPFF_SEND_FLOW_REM
+        entry = self.tables.get(dpid, {}).get(mac)
+        if entry is not None and entry[0] == port:
+            entry[3].add((port, dst))
+
+    def flow_removed(self, dpid, mac, port, dst, now, idle_timeout=None):
+        # idle_timeout: il flusso è scaduto per inattività, quindi il MAC non ha inviato
+        # traffico su quel flusso negli ultimi idle_timeout secondi; per le altre cause
+        # (hard timeout, cancellazione) si riparte da adesso
+        entry = self.tables.get(dpid, {}).get(mac)
+        if entry is None or (port, dst) not in entry[3]:
+            return
+        entry[3].discard((port, dst))
+        if entry[3]:
+            return
+        last_seen = now if idle_timeout is None else now - idle_timeout
+        if last_seen > entry[1]:
+            entry[1] = last_seen
+
+    def lookup(self, dpid, mac, now):
+        # La ricerca non rinfresca la voce: lo fa un packet-in con quel MAC come sorgente
+        # (o un suo flusso ancora installato)
+        table = self.tables.get(dpid)
+        if table is None:
+            return None
+        entry = table.get(mac)
+        if entry is None:
+            return None
+        if (not entry[3] and now - entry[1] > self.idle_timeout) or now - entry[2] > self.hard_timeout:
+            del table[mac]
+            self.expired += 1
+            if self.on_remove is not None:
+                self.on_remove(dpid, mac, entry[0])
+            return None
+        return entry[0]
+
+    def expire(self, now):
+        for dpid, table in self.tables.items():
+            self._expire(dpid, table, now, hard=True)
+
+    def _expire(self, dpid, table, now, hard=False):
+        # In testa ci sono le voci meno recenti: ci si ferma alla prima ancora valida
+        # per idle_timeout (quelle con flussi attivi vanno in coda). Le scadenze per
+        # hard_timeout, e le voci il cui ultimo flusso è stato rimosso mentre erano in coda,
+        # richiedono una scansione completa, fatta solo dalla pulizia periodica (expire)
+        # e non sul percorso dei packet-in
+        for _ in range(len(table)):
+            mac, entry = next(iter(table.items()))
+            if now - entry[1] <= self.idle_timeout:
+                break
+            if entry[3]:
+                table.move_to_end(mac)
+                continue
+            del table[mac]
+            self.expired += 1
+            if self.on_remove is not None:
+                self.on_remove(dpid, mac, entry[0])
+        if not hard:
+            return
+        for mac in [m for m, entry in table.items()
+                    if (not entry[3] and now - entry[1] > self.idle_timeout) or now - entry[2] > self.hard_timeout]:
+            port = table.pop(mac)[0]
+            self.expired += 1
+            if self.on_remove is not None:
+                self.on_remove(dpid, mac, port)
+
+    def forget(self, dpid):
+        self.tables.pop(dpid, None)
@@ -0,0 +1,236 @@
+import bisect
+import logging
+import math
+import threading
+
+try:
+    from ryu.lib import hub
+except ImportError:
+    # Senza ryu l'endpoint HTTP gira in un thread con wsgiref
+    hub = None
+
+# Secondi: da 10 us a 10 s
+DEFAULT_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# Valori delle metriche. Gli aggiornamenti sono semplici += senza lock: nell'hub di ryu i
+# green thread cambiano solo sull'I/O o su hub.sleep, mai a metà di inc/observe, e lo
+# scrape legge valori al più vecchi di un aggiornamento
+
+class Counter(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Gauge(object):
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+
+class Histogram(object):
+    # Conteggi per bucket non cumulativi (l'ultimo è +Inf), cumulati solo nello scrape
+    __slots__ = ('upper', 'counts', 'sum')
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.upper = list(buckets)
+        self.counts = [0] * (len(self.upper) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.upper, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+
+class Family(object):
+    # Una metrica con le sue etichette: labels(...) restituisce (e crea) il valore
+    def __init__(self, name, help, kind, labelnames, factory):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.factory = factory
+        self.children = {}
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError('%s expects labels %s' % (self.name, self.labelnames))
+            child = self.children[values] = self.factory()
+        return child
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            labels = dict(zip(self.labelnames, values))
+            if self.kind == 'histogram':
+                cumulative = 0
+                for upper, count in zip(self.upper_bounds(child), child.counts):
+                    cumulative += count
+                    yield self.name + '_bucket', dict(labels, le=upper), cumulative
+                yield self.name + '_sum', labels, child.sum
+                yield self.name + '_count', labels, cumulative
+            else:
+                yield self.name, labels, child.value
+
+    @staticmethod
+    def upper_bounds(histogram):
+        return [_format_value(u) for u in histogram.upper] + ['+Inf']
+
+
+class CallbackFamily(object):
+    # Metrica calcolata al momento dello scrape: callback() restituisce un valore, o per le
+    # metriche con etichette un iterabile di (valori delle etichette, valore). Niente costo
+    # sul percorso dei packet-in per contatori che il controller tiene già
+    def __init__(self, name, help, kind, labelnames, callback):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def samples(self):
+        result = self.callback()
+        if not self.labelnames:
+            yield self.name, {}, result
+            return
+        for values, value in result:
+            yield self.name, dict(zip(self.labelnames, values)), value
+
+
+class MetricsRegistry(object):
+    def __init__(self, prefix='', logger=None):
+        self.prefix = prefix
+        self.logger = logger or logging.getLogger(__name__)
+        self.families = {}
+
+    def _register(self, family):
+        if family.name in self.families:
+            raise ValueError('metric %s already registered' % family.name)
+        self.families[family.name] = family
+        return family
+
+    def _metric(self, name, help, kind, labelnames, factory):
+        family = self._register(Family(self.prefix + name, help, kind, labelnames, factory))
+        # Senza etichette si restituisce direttamente il valore, da aggiornare nel percorso caldo
+        return family.labels() if not labelnames else family
+
+    def counter(self, name, help, labelnames=()):
+        return self._metric(name, help, 'counter', labelnames, Counter)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._metric(name, help, 'gauge', labelnames, Gauge)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._metric(name, help, 'histogram', labelnames, lambda: Histogram(buckets))
+
+    def callback(self, name, help, callback, kind='gauge', labelnames=()):
+        return self._register(CallbackFamily(self.prefix + name, help, kind, labelnames, callback))
+
+    def expose(self):
+        # Formato di esposizione testuale di Prometheus (0.0.4)
+        lines = []
+        for name in sorted(self.families):
+            family = self.families[name]
+            try:
+                samples = list(family.samples())
+            except Exception:
+                self.logger.exception('metric %s failed', name)
+                continue
+            lines.append('# HELP %s %s' % (name, family.help.replace('\\', '\\\\').replace('\n', '\\n')))
+            lines.append('# TYPE %s %s' % (name, family.kind))
+            for sample, labels, value in samples:
+                lines.append('%s%s %s' % (sample, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                             for k, v in labels.items())
+
+
+def _format_value(value):
+    if isinstance(value, str):
+        return value
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsServer(object):
+    # GET /metrics con l'esposizione del registry, su un indirizzo locale. Altri percorsi
+    # (es. /events) si aggiungono con add_route: handler() -> (content type, testo)
+    def __init__(self, registry, host='127.0.0.1', port=9105, logger=None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.logger = logger or logging.getLogger(__name__)
+        self.thread = None
+        self.routes = {}
+
+    def add_route(self, path, handler):
+        self.routes[path] = handler
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '/')
+        if path in ('/', '/metrics'):
+            content_type, text = 'text/plain; version=0.0.4; charset=utf-8', self.registry.expose()
+        elif path in self.routes:
+            content_type, text = self.routes[path]()
+        else:
+            start_response('404 Not Found', [('Content-Type', 'text/plain')])
+            return [b'not found\n']
+        body = text.encode()
+        start_response('200 OK', [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+        return [body]
+
+    def start(self):
+        # Il bind avviene alla creazione del server: con la porta occupata (un'altra istanza,
+        # un altro servizio) si registra l'errore e si restituisce False invece di sollevarlo
+        try:
+            if hub is not None:
+                server = hub.WSGIServer((self.host, self.port), self)
+            else:
+                from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+                class QuietHandler(WSGIRequestHandler):
+                    def log_message(self, *args):
+                        pass
+
+                server = make_server(self.host, self.port, self, handler_class=QuietHandler)
+                self.port = server.server_port
+        except OSError as e:
+            self.logger.error('metrics endpoint not started on %s:%d: %s', self.host, self.port, e)
+            return False
+        if hub is not None:
+            self.thread = hub.spawn(server.serve_forever)
+        else:
+            self.thread = threading.Thread(target=server.serve_forever, daemon=True)
+            self.thread.start()
+        self.logger.info('metrics on http://%s:%d/metrics', self.host, self.port)
+        return True
@@ -0,0 +1,245 @@
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+import numpy as np
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+# Record a lunghezza fissa (56 byte), little endian, un record per porta per stats reply
+RECORD = np.dtype([
+    ('timestamp', '<f8'),
+    ('dpid', '<u8'),
+    ('port_no', '<u4'),
+    ('pad', '<u4'),
+    ('rx_bytes', '<i8'),
+    ('tx_bytes', '<i8'),
+    ('rx_throughput', '<f8'),
+    ('tx_throughput', '<f8'),
+])
+
+
+def _segment_start(timestamp, segment_seconds):
+    return int(timestamp // segment_seconds) * segment_seconds
+
+
+def _segment_path(directory, start):
+    return os.path.join(directory, '%012d' % start)
+
+
+def _series_name(dpid, port_no):
+    return '%016x-%08x.bin' % (dpid, port_no)
+
+
+def _parse_series(name):
+    dpid, port_no = name[:-4].split('-')
+    return int(dpid, 16), int(port_no, 16)
+
+
+class PortHistoryWriter(object):
+    # Storico append-only: una directory per ogni finestra di segment_seconds e dentro un
+    # file per porta, così la serie di una porta è contigua e il reader la restituisce come
+    # vista sul memmap. append() è chiamato dalla stats reply e mette solo in coda; il thread
+    # del writer bufferizza, raggruppa per porta e scrive in blocco.
+    def __init__(self, directory='port_history', segment_seconds=3600,
+                 flush_records=4096, flush_interval=5.0, max_segments=None,
+                 queue_size=1024, logger=None):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.max_segments = max_segments
+        self.logger = logger or logging.getLogger(__name__)
+        os.makedirs(directory, exist_ok=True)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.records_written = 0
+        self.errors = 0
+        self.records_lost = 0
+        self._buffer = []
+        self._buffered = 0
+        self._segment = None
+        self._stop = object()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(self._stop)
+        if self.thread is not None:
+            self.thread.join()
+
+    def append(self, timestamp, dpid, port_nos, rx_bytes, tx_bytes, rx_throughput, tx_throughput):
+        records = np.zeros(len(port_nos), dtype=RECORD)
+        records['timestamp'] = timestamp
+        records['dpid'] = dpid
+        records['port_no'] = port_nos
+        records['rx_bytes'] = rx_bytes
+        records['tx_bytes'] = tx_bytes
+        records['rx_throughput'] = rx_throughput
+        records['tx_throughput'] = tx_throughput
+        # Mai bloccante: se la coda è piena la reply non entra nello storico e viene contata
+        try:
+            self.queue.put_nowait(records)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        deadline = time.time() + self.flush_interval
+        while True:
+            try:
+                records = self.queue.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                records = None
+            if records is self._stop:
+                self._safe_flush()
+                return
+            if records is not None and len(records):
+                # Cambio di segmento: quanto già in buffer appartiene al segmento precedente
+                segment = _segment_start(float(records['timestamp'][0]), self.segment_seconds)
+                if segment != self._segment:
+                    self._safe_flush()
+                    self._segment = segment
+                    if self.max_segments:
+                        self._blocking(self._prune)
+                self._buffer.append(records)
+                self._buffered += len(records)
+            if self._buffered >= self.flush_records or time.time() >= deadline:
+                self._safe_flush()
+                deadline = time.time() + self.flush_interval
+
+    def _safe_flush(self):
+        # Come in StatsWriter un errore di I/O costa solo i record in buffer
+        if not self._buffer:
+            return
+        records = np.concatenate(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+        try:
+            self._blocking(self._write, self._segment, records)
+        except Exception:
+            self.errors += 1
+            self.records_lost += len(records)
+            self.logger.exception('port history write failed, %d records lost', len(records))
+
+    def _blocking(self, func, *args):
+        # Con eventlet (ryu-manager) l'I/O su disco va in un thread reale per non fermare l'hub
+        if tpool is not None and patcher.is_monkey_patched('thread'):
+            return tpool.execute(func, *args)
+        return func(*args)
+
+    def _write(self, segment, records):
+        # Ordinamento stabile per (dpid, port_no): un solo write per porta, in ordine di tempo
+        directory = _segment_path(self.directory, segment)
+        os.makedirs(directory, exist_ok=True)
+        dpids = records['dpid']
+        port_nos = records['port_no']
+        order = np.lexsort((port_nos, dpids))
+        records = records[order]
+        dpids = dpids[order]
+        port_nos = port_nos[order]
+        changed = (dpids[1:] != dpids[:-1]) | (port_nos[1:] != port_nos[:-1])
+        bounds = [0] + (np.flatnonzero(changed) + 1).tolist() + [len(records)]
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            with open(os.path.join(directory, _series_name(int(dpids[lo]), int(port_nos[lo]))), 'ab') as f:
+                f.write(records[lo:hi].tobytes())
+        self.records_written += len(records)
+
+    def _prune(self):
+        segments = sorted(f for f in os.listdir(self.directory) if f.isdigit())
+        for name in segments[:-self.max_segments]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+
+class PortHistoryReader(object):
+    # Lettura dello storico tramite memmap: la serie di una porta in un segmento è un file,
+    # quindi query e series per porta restituiscono viste senza copiare i record (una copia
+    # c'è solo se l'intervallo attraversa più segmenti o se si chiedono più porte insieme).
+    def __init__(self, directory='port_history'):
+        self.directory = directory
+        self._maps = {}
+
+    def segments(self, start=None, end=None):
+        result = []
+        names = sorted(f for f in os.listdir(self.directory) if f.isdigit())
+        starts = [int(name) for name in names]
+        for i, seg_start in enumerate(starts):
+            # Un segmento copre [seg_start, inizio del successivo)
+            seg_end = starts[i + 1] if i + 1 < len(starts) else None
+            if end is not None and seg_start >= end:
+                continue
+            if start is not None and seg_end is not None and seg_end <= start:
+                continue
+            result.append(os.path.join(self.directory, names[i]))
+        return result
+
+    def _map(self, path):
+        # Si rimappa solo se il file è cresciuto; un record incompleto in coda viene ignorato
+        count = os.path.getsize(path) // RECORD.itemsize
+        cached = self._maps.get(path)
+        if cached is not None and len(cached) == count:
+            return cached
+        if count == 0:
+            records = np.zeros(0, dtype=RECORD)
+        else:
+            records = np.memmap(path, dtype=RECORD, mode='r', shape=(count,))
+        self._maps[path] = records
+        return records
+
+    def range(self, start=None, end=None, dpid=None, port_no=None):
+        # Una vista zero-copy per ogni serie (segmento, porta) che interseca [start, end);
+        # il filtro per dpid/port_no è sul nome del file
+        views = {}
+        for segment in self.segments(start, end):
+            for name in sorted(os.listdir(segment)):
+                if not name.endswith('.bin'):
+                    continue
+                key = _parse_series(name)
+                if (dpid is not None and key[0] != dpid) or (port_no is not None and key[1] != port_no):
+                    continue
+                records = self._map(os.path.join(segment, name))
+                timestamps = records['timestamp']
+                lo = 0 if start is None else np.searchsorted(timestamps, start, side='left')
+                hi = len(records) if end is None else np.searchsorted(timestamps, end, side='left')
+                if hi > lo:
+                    views.setdefault(key, []).append(records[lo:hi])
+        return views
+
+    def query(self, start=None, end=None, dpid=None, port_no=None):
+        # Una sola porta in un solo segmento: la vista sul memmap. Altrimenti una copia
+        # ordinata per (timestamp, dpid, port_no), cioè reply per reply
+        views = self.range(start, end, dpid, port_no)
+        if len(views) == 1:
+            (parts,) = views.values()
+            return parts[0] if len(parts) == 1 else np.concatenate(parts)
+        if not views:
+            return np.zeros(0, dtype=RECORD)
+        records = np.concatenate([part for parts in views.values() for part in parts])
+        return records[np.lexsort((records['port_no'], records['dpid'], records['timestamp']))]
+
+    def series(self, dpid, port_no, start=None, end=None, field='rx_throughput'):
+        records = self.query(start, end, dpid, port_no)
+        return records['timestamp'], records[field]
+
+    def per_port(self, start=None, end=None, field='rx_throughput'):
+        # Tutte le serie dell'intervallo: viste sui file, concatenate solo tra segmenti
+        result = {}
+        for key, parts in self.range(start, end).items():
+            if len(parts) == 1:
+                result[key] = (parts[0]['timestamp'], parts[0][field])
+            else:
+                result[key] = (np.concatenate([p['timestamp'] for p in parts]),
+                               np.concatenate([p[field] for p in parts]))
+        return result
@@ -0,0 +1,357 @@
+import time
+
+import numpy as np
+
+# ofproto_v1_3.OFPP_MAX, senza dipendere da ryu
+OFPP_MAX = 0xffffff00
+
+# Pipeline a due tabelle: ACL/mitigazione, poi forwarding L2
+ACL_TABLE = 0
+FORWARDING_TABLE = 1
+
+# Il byte alto del cookie identifica chi ha installato il flusso
+COOKIE_MASK = 0xff << 56
+COOKIE_PROACTIVE = 0x01 << 56
+COOKIE_LEARNING = 0x02 << 56
+COOKIE_MITIGATION = 0x03 << 56
+COOKIE_MIRROR = 0x04 << 56
+
+
+class PortMonitorMixin(object):
+    # Logica di decisione sulle porte (statistiche, rilevamento, blocco e scadenza),
+    # condivisa dal controller, da replay.py e da bench_mitigation.py. Non dipende da ryu:
+    # le azioni sugli switch (_block_port, _unblock_port, _start_mirror, ...) e lo stato
+    # (port_stats, port_detector, monitoring_list, blocked_ports, mitigated_ports,
+    # block_timers, offenders, stats_poller, event_log, ...) li fornisce la classe che la usa.
+
+    def _now(self):
+        # Orologio delle decisioni; replay.py lo sostituisce con quello virtuale
+        return time.time()
+
+    def _update_port_stats(self, dpid, body):
+        port_nos = []
+        rx_bytes = []
+        tx_bytes = []
+        for stat in body:
+            # Skip special port numbers
+            if stat.port_no >= OFPP_MAX:
+                continue
+            port_nos.append(stat.port_no)
+            rx_bytes.append(stat.rx_bytes)
+            tx_bytes.append(stat.tx_bytes)
+        if not port_nos:
+            return None
+
+        # Aggiornamento in blocco di contatori e throughput
+        return self.port_stats.update(dpid, port_nos, rx_bytes, tx_bytes, self._now())
+
+    def _monitor_port(self, dpid, rows):
+        stats = self.port_stats
+        rx_throughput = stats.rx_throughput[rows]
+
+        # Aggiornamento incrementale delle porte attive (per switch e sull'intera rete)
+        stats.update_active(rows, self.lower_threshold)
+
+        # In modalità 'flow' le porte non vengono bloccate: decide _monitor_flow
+        if self.detection_mode != 'port':
+            return
+
+        # Il rilevatore aggiorna in blocco lo stato di tutte le porte della reply:
+        # si visitano solo le righe anomale
+        anomalous = self.port_detector.update(rows, rx_throughput)
+        for i in np.flatnonzero(anomalous):
+            port_no = int(stats.port_no[rows[i]])
+            if (dpid, port_no) in self.mitigated_ports:
+                # Sorgenti dominanti già bloccate: i contatori della porta contano anche il
+                # traffico scartato, si decide sul resto
+                self._check_mitigated_port(dpid, port_no, float(rx_throughput[i]))
+            elif ((dpid, port_no) not in self.monitoring_list and (dpid, port_no) not in self.blocked_ports):
+
+                self.event_log.event('threshold', (dpid, port_no), port=(dpid, port_no), rx=float(rx_throughput[i]))
+                if (dpid,port_no) in self.host_info:
+                    self.monitoring_list.append((dpid, port_no))
+                    self._start_mirror(dpid, port_no)
+                    self.event_log.event('monitoring_add', (dpid, port_no), port=(dpid, port_no),
+                                         monitoring=len(self.monitoring_list))
+                else:
+                    self.event_log.event('transit_port', (dpid, port_no), port=(dpid, port_no),
+                                         action='AGGIUNTA ALLA monitoring_list')
+            elif (dpid, port_no) in self.monitoring_list and (dpid, port_no) not in self.blocked_ports and (dpid,port_no) in self.host_info:
+                self.event_log.event('threshold', (dpid, port_no), port=(dpid, port_no), rx=float(rx_throughput[i]))
+                if self.block_top_sources and self._block_top_sources(dpid, port_no):
+                    continue
+                self._block_whole_port(dpid, port_no)
+
+        # Porte in monitoring_list di questo switch tornate normali
+        for (mon_dpid, port_no) in list(self.monitoring_list):
+            if mon_dpid != dpid:
+                continue
+            row = stats.row(dpid, port_no)
+            if row is not None and not self.port_detector.alarm[row]:
+                self.monitoring_list.remove((dpid, port_no))
+                self._stop_mirror(dpid, port_no)
+                self.event_log.event('monitoring_remove', (dpid, port_no), port=(dpid, port_no),
+                                     monitoring=len(self.monitoring_list))
+
+    def _check_mitigated_port(self, dpid, port_no, rx):
+        # Si passa al blocco della porta solo se il traffico non scartato dai drop delle
+        # sorgenti supera ancora la soglia. dropped è None finché non ci sono due letture
+        # delle statistiche dei drop
+        dropped = self.mitigated_ports[(dpid, port_no)][2]
+        if dropped is None or rx - dropped <= self.threshold:
+            return
+        self.event_log.event('mitigation_escalated', (dpid, port_no), port=(dpid, port_no), rx=rx, dropped=dropped)
+        self._block_whole_port(dpid, port_no)
+
+    def _block_whole_port(self, dpid, port_no):
+        # I blocchi delle sorgenti restano fino alla loro scadenza, ma decide il blocco della porta
+        self.mitigated_ports.pop((dpid, port_no), None)
+        self.blocked_ports[(dpid, port_no)] = self._now()
+        self.port_stats.set_blocked(dpid, port_no, True)
+        self._block_port(dpid, port_no)
+        self._schedule_unblock((dpid, port_no))
+
+    def _update_poll_intervals(self, dpid, rows):
+        stats = self.port_stats
+        rx_throughput = stats.rx_throughput[rows]
+        quiet = rx_throughput <= self.lower_threshold
+        hot = ~quiet & (rx_throughput <= self.threshold)
+        port_nos = stats.port_no[rows].tolist()
+        for i, port_no in enumerate(port_nos):
+            if (dpid, port_no) in self.monitoring_list or (dpid, port_no) in self.mitigated_ports:
+                hot[i] = True
+        self.stats_poller.update_ports(dpid, port_nos, hot, quiet)
+
+    def _schedule_unblock(self, key):
+        now = self._now()
+        duration = self.offenders.record(key, now)
+        self.block_timers.schedule(key, now + duration)
+        self.event_log.event('blocked_for', key, target=key, duration=duration)
+        return duration
+
+    def _block_expired(self, key):
+        # Chiamata da self.block_timers alla scadenza del blocco di una porta o di un flusso
+        blocked = self.blocked_ports if len(key) == 2 else self.blocked_flows
+        if key not in blocked:
+            return
+        # Con i meter il limite sale a gradini prima di essere rimosso
+        if self._raise_rate_limit(key):
+            blocked[key] = self._now()
+            self.block_timers.schedule(key, blocked[key] + self.meter_step_seconds)
+            return
+        del blocked[key]
+        if len(key) == 2:
+            self._unblock_port(*key)
+            self.port_stats.set_blocked(key[0], key[1], False)
+        else:
+            self._unblock_flow(*key)
+            # Scaduto l'ultimo blocco delle sorgenti, la porta torna al rilevamento normale
+            port = key[:2]
+            if port in self.mitigated_ports and not any(k[:2] == port and k[3] is None for k in self.blocked_flows):
+                del self.mitigated_ports[port]
+
+
+class MitigationMixin(object):
+    # Azioni di mitigazione sugli switch (drop e meter sulla tabella ACL, confermati dalla
+    # barrier reply), condivise dal controller e da bench_mitigation.py. Come
+    # PortMonitorMixin non dipende da ryu: usa solo datapath.ofproto, datapath.ofproto_parser
+    # e self.flow_programmer; lo stato (datapaths, mitigation_mode, meter_*, rate_limits,
+    # meter_ids, event_log, ...) e _stop_mirror li fornisce la classe che la usa.
+
+    def _block_port(self, dpid, port_no):
+        if (dpid, port_no) in self.monitoring_list:
+            self.monitoring_list.remove((dpid, port_no))
+            self._stop_mirror(dpid, port_no)
+
+        datapath = self.datapaths[dpid]
+        parser = datapath.ofproto_parser
+
+        # Create a match for incoming traffic on the port
+        match = parser.OFPMatch(in_port=port_no)
+
+        if self.mitigation_mode == 'meter':
+            # Il traffico della porta passa dal meter e prosegue nella tabella di forwarding
+            meter_id = self._add_meter(datapath, (dpid, port_no))
+            self._add_mitigation_flow(datapath, match, port_no, meter_id=meter_id)
+            self._confirm_mitigation(datapath, (dpid, port_no))
+            self.event_log.event('port_limited', (dpid, port_no), port=(dpid, port_no), rate_kbps=self.meter_rate_kbps)
+            return
+
+        self._add_mitigation_flow(datapath, match, port_no)
+        self._confirm_mitigation(datapath, (dpid, port_no))
+
+        self.event_log.event('port_blocked', (dpid, port_no), port=(dpid, port_no))
+
+    def _confirm_mitigation(self, datapath, key):
+        # La regola parte subito, senza aspettare il flush periodico; la barrier reply
+        # conferma l'installazione sullo switch e ne misura il tempo. Un errore dello switch
+        # sui messaggi del batch o una disconnessione prima della barrier lo fanno fallire
+        batch = self.flow_programmer.flush(datapath)
+        if batch is not None:
+            batch.add_done_callback(lambda b: self._mitigation_done(key, b))
+
+    def _mitigation_done(self, key, batch):
+        if batch.failed():
+            self.event_log.event('mitigation_failed', key, target=key, errors=batch.errors)
+        else:
+            self.event_log.event('mitigation_confirmed', key, target=key, latency_ms=batch.latency * 1000)
+
+    def _unblock_port(self, dpid, port_no):
+        self.event_log.event('port_unblocked', (dpid, port_no), port=(dpid, port_no))
+
+        # Remove the flow entry that drops packets: solo la regola di mitigazione nella
+        # tabella ACL, i flussi appresi sulla porta restano nella tabella di forwarding
+        datapath = self.datapaths[dpid]
+        parser = datapath.ofproto_parser
+        match = parser.OFPMatch(in_port=port_no)
+        self._remove_mitigation_flow(datapath, match, port_no)
+        if (dpid, port_no) in self.rate_limits:
+            self._delete_meter(datapath, (dpid, port_no))
+
+    def _flow_match(self, parser, in_port, eth_src, eth_dst):
+        # eth_dst None: tutto il traffico della sorgente (blocco delle sorgenti dominanti)
+        if eth_dst is None:
+            return parser.OFPMatch(in_port=in_port, eth_src=eth_src)
+        return parser.OFPMatch(in_port=in_port, eth_src=eth_src, eth_dst=eth_dst)
+
+    def _block_flow(self, dpid, in_port, eth_src, eth_dst):
+        if (dpid, in_port, eth_src, eth_dst) in self.flow_monitoring_list:
+            self.flow_monitoring_list.remove((dpid, in_port, eth_src, eth_dst))
+
+        datapath = self.datapaths[dpid]
+        parser = datapath.ofproto_parser
+
+        # Drop (o limite di banda) solo del traffico eth_src -> eth_dst entrante dalla porta
+        match = self._flow_match(parser, in_port, eth_src, eth_dst)
+        meter_id = None
+        if self.mitigation_mode == 'meter':
+            meter_id = self._add_meter(datapath, (dpid, in_port, eth_src, eth_dst))
+        self._add_mitigation_flow(datapath, match, in_port, meter_id=meter_id)
+        self._confirm_mitigation(datapath, (dpid, in_port, eth_src, eth_dst))
+
+        key = (dpid, in_port, eth_src, eth_dst)
+        self.event_log.event('flow_blocked', key, flow=key)
+
+    def _unblock_flow(self, dpid, in_port, eth_src, eth_dst):
+        key = (dpid, in_port, eth_src, eth_dst)
+        self.event_log.event('flow_unblocked', key, flow=key)
+
+        datapath = self.datapaths[dpid]
+        parser = datapath.ofproto_parser
+        match = self._flow_match(parser, in_port, eth_src, eth_dst)
+        self._remove_mitigation_flow(datapath, match, in_port)
+        if (dpid, in_port, eth_src, eth_dst) in self.rate_limits:
+            self._delete_meter(datapath, (dpid, in_port, eth_src, eth_dst))
+
+    def _add_mitigation_flow(self, datapath, match, port_no, meter_id=None, hard_timeout=0):
+        # Tabella ACL, priorità 2, cookie di mitigazione con il numero di porta. Senza meter
+        # è un drop; con il meter il traffico limitato prosegue verso il forwarding
+        goto = FORWARDING_TABLE if meter_id is not None else None
+        return self.add_flow(datapath, 2, match, [], meter_id=meter_id, hard_timeout=hard_timeout,
+                             table_id=ACL_TABLE, cookie=COOKIE_MITIGATION | port_no, goto=goto)
+
+    def _remove_mitigation_flow(self, datapath, match, port_no):
+        # Cancellazione strict (stessa match e priorità) e limitata al cookie di mitigazione.
+        # Va in coda prima della cancellazione del meter: cancellare un meter ancora in uso
+        # rimuoverebbe anche i flussi che lo referenziano
+        return self.remove_flow(datapath, match, priority=2, table_id=ACL_TABLE,
+                                cookie=COOKIE_MITIGATION | port_no, cookie_mask=COOKIE_MASK)
+
+    def _meter_mod(self, datapath, command, meter_id, rate_kbps=None):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        bands = []
+        if rate_kbps is not None:
+            bands = [parser.OFPMeterBandDrop(rate=rate_kbps, burst_size=max(rate_kbps // 10, 1))]
+        mod = parser.OFPMeterMod(datapath=datapath, command=command,
+                                 flags=ofproto.OFPMF_KBPS | ofproto.OFPMF_BURST,
+                                 meter_id=meter_id, bands=bands)
+        # Stessa coda dei flow-mod: l'ordine meter/flussi verso lo switch va rispettato
+        return self.flow_programmer.send(datapath, mod)
+
+    def _add_meter(self, datapath, key):
+        free, next_id = self.meter_ids.get(datapath.id, ([], 1))
+        if free:
+            meter_id = free.pop()
+        else:
+            meter_id = next_id
+            next_id += 1
+        self.meter_ids[datapath.id] = (free, next_id)
+
+        self._meter_mod(datapath, datapath.ofproto.OFPMC_ADD, meter_id, self.meter_rate_kbps)
+        self.rate_limits[key] = (meter_id, self.meter_rate_kbps)
+        return meter_id
+
+    def _delete_meter(self, datapath, key):
+        meter_id, _ = self.rate_limits.pop(key)
+        self._meter_mod(datapath, datapath.ofproto.OFPMC_DELETE, meter_id)
+        self.meter_ids[datapath.id][0].append(meter_id)
+
+    def _raise_rate_limit(self, key):
+        # True se il limite è stato alzato, False se va rimosso (o non c'è un meter)
+        if key not in self.rate_limits:
+            return False
+        meter_id, rate_kbps = self.rate_limits[key]
+        rate_kbps *= self.meter_step_factor
+        if rate_kbps >= self.meter_max_rate_kbps:
+            return False
+        datapath = self.datapaths[key[0]]
+        self._meter_mod(datapath, datapath.ofproto.OFPMC_MODIFY, meter_id, rate_kbps)
+        self.rate_limits[key] = (meter_id, rate_kbps)
+        self.event_log.event('rate_raised', key, target=key, rate_kbps=rate_kbps)
+        return True
+
+    def remove_flow(self, datapath, match, priority=None, table_id=None, cookie=0, cookie_mask=0):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        if table_id is None:
+            table_id = ofproto.OFPTT_ALL
+        if priority is None:
+            mod = parser.OFPFlowMod(
+                datapath=datapath,
+                table_id=table_id,
+                cookie=cookie,
+                cookie_mask=cookie_mask,
+                command=ofproto.OFPFC_DELETE,
+                out_port=ofproto.OFPP_ANY,
+                out_group=ofproto.OFPG_ANY,
+                match=match
+            )
+        else:
+            mod = parser.OFPFlowMod(
+                datapath=datapath,
+                table_id=table_id,
+                cookie=cookie,
+                cookie_mask=cookie_mask,
+                command=ofproto.OFPFC_DELETE_STRICT,
+                priority=priority,
+                out_port=ofproto.OFPP_ANY,
+                out_group=ofproto.OFPG_ANY,
+                match=match
+            )
+        return self.flow_programmer.send(datapath, mod)
+
+    def add_flow(self, datapath, priority, match, actions, buffer_id=None, meter_id=None, idle_timeout=0, hard_timeout=0,
+                 table_id=FORWARDING_TABLE, cookie=0, goto=None, flags=0):
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS,
+                                             actions)]
+        if meter_id is not None:
+            inst.insert(0, parser.OFPInstructionMeter(meter_id, ofproto.OFPIT_METER))
+        if goto is not None:
+            inst.append(parser.OFPInstructionGotoTable(goto))
+        if buffer_id is not None:
+            mod = parser.OFPFlowMod(datapath=datapath, buffer_id=buffer_id,
+                                    table_id=table_id, cookie=cookie,
+                                    priority=priority, match=match,
+                                    instructions=inst, idle_timeout=idle_timeout,
+                                    hard_timeout=hard_timeout, flags=flags)
+        else:
+            mod = parser.OFPFlowMod(datapath=datapath, table_id=table_id, cookie=cookie,
+                                    priority=priority, match=match, instructions=inst,
+                                    idle_timeout=idle_timeout, hard_timeout=hard_timeout, flags=flags)
+        return self.flow_programmer.send(datapath, mod)
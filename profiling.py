@@ -0,0 +1,219 @@
+import collections
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import types
+
+
+class HandlerStats(object):
+    # Tempi cumulati di un handler (o di una sezione come il loop di monitoraggio)
+    __slots__ = ('calls', 'wall', 'wall_max', 'cpu', 'wait', 'wait_max', 'over_budget')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.wall_max = 0.0
+        self.cpu = 0.0
+        self.wait = 0.0
+        self.wait_max = 0.0
+        self.over_budget = 0
+
+    def as_dict(self):
+        calls = self.calls or 1
+        return {
+            'calls': self.calls,
+            'wall_seconds': self.wall,
+            'wall_mean': self.wall / calls,
+            'wall_max': self.wall_max,
+            'cpu_seconds': self.cpu,
+            'wait_seconds': self.wait,
+            'wait_mean': self.wait / calls,
+            'wait_max': self.wait_max,
+            'over_budget': self.over_budget,
+        }
+
+
+class StackSampler(object):
+    # Campionamento dello stack del thread principale (quello dell'hub di ryu, dove girano
+    # tutti i green thread) da un thread di sistema, ogni interval secondi. Gli ultimi
+    # window secondi di campioni restano in memoria e dump() li scrive come stack
+    # collassati (flamegraph.pl, speedscope, inferno): "frame;frame;frame conteggio"
+    def __init__(self, interval=0.005, window=30, thread_id=None):
+        self.interval = interval
+        self.window = window
+        self.thread_id = thread_id if thread_id is not None else threading.main_thread().ident
+        self.samples = collections.deque(maxlen=max(1, int(window / interval)))
+        self.thread = None
+        self._stop = threading.Event()
+        self._names = {}  # code -> nome del frame
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _frame_name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = '%s:%s' % (os.path.basename(code.co_filename), code.co_name)
+        return name
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            self.samples.append((time.time(), tuple(stack)))
+
+    def collapsed(self, since=None):
+        counts = collections.Counter(stack for stamp, stack in list(self.samples) if since is None or stamp >= since)
+        lines = []
+        for stack, count in counts.most_common():
+            lines.append('%s %d' % (';'.join(self._frame_name(code) for code in reversed(stack)), count))
+        return lines
+
+
+class HandlerProfiler(object):
+    # Strumentazione opzionale di un'app ryu: tempo reale e CPU di ogni handler
+    # @set_ev_cls (e dei metodi in extra, es. il passo del loop di monitoraggio),
+    # attesa in coda e profondità della coda degli eventi, e dump del campionatore di
+    # stack su SIGUSR1 o quando un handler supera budget secondi (al più uno ogni
+    # cooldown secondi). Va installato nell'__init__ dell'app, prima che ryu registri gli
+    # handler: i metodi vengono sostituiti sull'istanza da wrapper con gli stessi callers.
+    def __init__(self, app, budget=0.05, cooldown=60, output_dir='profiles', sample_interval=0.005,
+                 sample_window=30, dump_signal=signal.SIGUSR1, logger=None):
+        self.app = app
+        self.budget = budget
+        self.cooldown = cooldown
+        self.output_dir = output_dir
+        self.dump_signal = dump_signal
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.handlers = {}  # nome -> HandlerStats
+        self.queue_depth = {}  # classe dell'evento -> [eventi, somma delle profondità, massimo]
+        self.sampler = StackSampler(interval=sample_interval, window=sample_window)
+        self.dumps = 0
+        self._last_dump = 0.0
+
+    def install(self, extra=()):
+        names = [name for name in dir(type(self.app))
+                 if hasattr(getattr(type(self.app), name, None), 'callers')]
+        for name in names + list(extra):
+            self._wrap(name)
+        self._wrap_send_event()
+        if self.dump_signal is not None:
+            signal.signal(self.dump_signal, self._on_signal)
+        self.sampler.start()
+
+    def _wrap(self, name):
+        func = getattr(self.app, name).__func__
+        stats = self.handlers.setdefault(name, HandlerStats())
+        profiler = self
+
+        def wrapper(app, *args, **kwargs):
+            started = time.perf_counter()
+            cpu = time.thread_time()
+            if args:
+                enqueued = getattr(args[0], '_profiler_enqueued', None)
+                if enqueued is not None:
+                    wait = started - enqueued
+                    stats.wait += wait
+                    if wait > stats.wait_max:
+                        stats.wait_max = wait
+            try:
+                return func(app, *args, **kwargs)
+            finally:
+                wall = time.perf_counter() - started
+                stats.calls += 1
+                stats.wall += wall
+                stats.cpu += time.thread_time() - cpu
+                if wall > stats.wall_max:
+                    stats.wall_max = wall
+                if wall > profiler.budget:
+                    stats.over_budget += 1
+                    profiler._over_budget(name, wall)
+
+        wrapper.__name__ = func.__name__
+        wrapper.__wrapped__ = func
+        if hasattr(func, 'callers'):
+            # ryu registra gli handler (e gli observer degli eventi) dai metodi con callers
+            wrapper.callers = func.callers
+        setattr(self.app, name, types.MethodType(wrapper, self.app))
+
+    def _wrap_send_event(self):
+        # Istante di accodamento sull'evento e profondità della coda dell'app
+        app = self.app
+        send_event = app._send_event
+        queue_depth = self.queue_depth
+
+        def _send_event(ev, state):
+            try:
+                ev._profiler_enqueued = time.perf_counter()
+            except AttributeError:
+                pass
+            depth = app.events.qsize()
+            entry = queue_depth.get(ev.__class__.__name__)
+            if entry is None:
+                entry = queue_depth[ev.__class__.__name__] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] += depth
+            if depth > entry[2]:
+                entry[2] = depth
+            return send_event(ev, state)
+
+        app._send_event = _send_event
+
+    def _over_budget(self, name, wall):
+        now = time.time()
+        if now - self._last_dump < self.cooldown:
+            return
+        self._last_dump = now
+        self.logger.warning('%s took %.1f ms (budget %.1f ms): dumping stack samples', name, wall * 1000, self.budget * 1000)
+        self.dump('budget-%s' % name)
+
+    def _on_signal(self, signum, frame):
+        # Il gestore gira nel thread principale tra due bytecode; il dump legge soltanto
+        self.dump('signal')
+
+    def report(self):
+        return {
+            'handlers': dict((name, stats.as_dict()) for name, stats in self.handlers.items()),
+            'queue_depth': dict((name, {'events': n, 'mean': total / n if n else 0.0, 'max': peak})
+                                for name, (n, total, peak) in self.queue_depth.items()),
+        }
+
+    def dump(self, reason):
+        # <istante>-<motivo>.folded con gli stack campionati, .json con i tempi degli handler
+        self.dumps += 1
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, '%s-%s' % (time.strftime('%Y%m%d-%H%M%S'), reason))
+        with open(base + '.folded', 'w') as f:
+            f.write('\n'.join(self.sampler.collapsed()) + '\n')
+        with open(base + '.json', 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        self.logger.info('profile written to %s.folded', base)
+        return base
+
+    def register_metrics(self, metrics):
+        def handler_values(field):
+            return lambda: [((name,), getattr(stats, field)) for name, stats in self.handlers.items()]
+
+        metrics.callback('handler_calls_total', 'Calls per event handler', handler_values('calls'),
+                         kind='counter', labelnames=('handler',))
+        metrics.callback('handler_wall_seconds_total', 'Wall time per event handler', handler_values('wall'),
+                         kind='counter', labelnames=('handler',))
+        metrics.callback('handler_cpu_seconds_total', 'CPU time per event handler', handler_values('cpu'),
+                         kind='counter', labelnames=('handler',))
+        metrics.callback('handler_wait_seconds_total', 'Event queue wait before each handler', handler_values('wait'),
+                         kind='counter', labelnames=('handler',))
+        metrics.callback('event_queue_depth_max', 'Deepest event queue seen when an event was enqueued',
+                         lambda: [((name,), peak) for name, (_, _, peak) in self.queue_depth.items()],
+                         labelnames=('event',))
@@ -0,0 +1,344 @@
+# Replay delle statistiche registrate (port_stats.csv, anche ruotati .gz, o la directory
+# dello storico binario di port_history) attraverso la stessa logica di decisione del
+# controller (PortMonitorMixin), con un orologio virtuale e senza ryu né switch.
+#
+#   python replay.py port_stats.csv --attack 1:1:120:300 --grid threshold=200000,300000,400000 \
+#       --grid block_duration=15,30,60 --workers 4 --output sweep.json
+#
+# Per ogni insieme di parametri riporta il ritardo di rilevamento di ogni attacco, i
+# blocchi di porte non sotto attacco e i secondi di blocco (totali e fuori dagli attacchi).
+# Nota: i contatori registrati sono quelli del run originale; i blocchi simulati non
+# cambiano il traffico riprodotto (i contatori rx delle porte contano anche i pacchetti
+# scartati dai flussi di drop, quindi la differenza è piccola).
+
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from detectors import make_detector
+from event_log import EventLog
+from port_history import PortHistoryReader
+from port_monitor import PortMonitorMixin
+from stats_store import PortStatsStore
+from timers import ExpiryTimers, OffenderHistory
+
+# Stessi attributi usati da _update_port_stats sulle OFPPortStats
+PortStat = namedtuple('PortStat', 'port_no rx_bytes tx_bytes')
+
+DEFAULTS = {
+    'threshold': 300000,
+    'lower_threshold': None,  # None: 2% di threshold, come nel controller
+    'block_duration': 30,
+    'offender_factor': 2,
+    'max_block_duration': 3600,
+    'offender_half_life': 3600,
+    'detector': 'threshold',
+}
+
+
+def _open(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', newline='')
+    return open(path, newline='')
+
+
+def load_csv(paths):
+    # Le righe di una stats reply sono contigue nel CSV: una reply nuova inizia quando
+    # cambiano timestamp o dpid, o quando una porta si ripete. L'istante viene dalla
+    # colonna epoch; i CSV più vecchi hanno solo il timestamp al secondo, e lì un secondo
+    # campione della stessa porta nello stesso secondo viene scartato (darebbe rate 0)
+    replies = []
+    parsed = {}
+    last_seen = {}  # (dpid, port_no) -> istante dell'ultimo campione tenuto
+    current = None
+    for path in paths:
+        with _open(path) as f:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
+            epoch = header.index('epoch') if 'epoch' in header else None
+            for row in reader:
+                dpid, port_no = int(row[1]), int(row[2])
+                if epoch is not None:
+                    timestamp = float(row[epoch])
+                else:
+                    timestamp = parsed.get(row[0])
+                    if timestamp is None:
+                        timestamp = parsed[row[0]] = time.mktime(time.strptime(row[0], '%Y-%m-%d %H:%M:%S'))
+                if current is None or current[0] != timestamp or current[1] != dpid or port_no in current[3]:
+                    current = (timestamp, dpid, [], set())
+                    replies.append(current)
+                current[3].add(port_no)
+                if last_seen.get((dpid, port_no)) == timestamp:
+                    continue
+                last_seen[(dpid, port_no)] = timestamp
+                current[2].append(PortStat(port_no, int(row[3]), int(row[4])))
+    return [(timestamp, dpid, body) for timestamp, dpid, body, _ in replies if body]
+
+
+def load_history(directory, start=None, end=None):
+    records = PortHistoryReader(directory).query(start, end)
+    if not len(records):
+        return []
+    timestamps = records['timestamp']
+    dpids = records['dpid']
+    # Un record per porta per reply: stesso timestamp e stesso dpid
+    bounds = np.flatnonzero((timestamps[1:] != timestamps[:-1]) | (dpids[1:] != dpids[:-1])) + 1
+    bounds = [0] + bounds.tolist() + [len(records)]
+    port_nos = records['port_no'].tolist()
+    rx_bytes = records['rx_bytes'].tolist()
+    tx_bytes = records['tx_bytes'].tolist()
+    replies = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        body = [PortStat(port_nos[i], rx_bytes[i], tx_bytes[i]) for i in range(lo, hi)]
+        replies.append((float(timestamps[lo]), int(dpids[lo]), body))
+    return replies
+
+
+def load(sources):
+    if len(sources) == 1 and os.path.isdir(sources[0]):
+        return load_history(sources[0])
+    return load_csv(sources)
+
+
+def load_host_info(path):
+    with open(path) as f:
+        return {tuple(int(x) for x in key.strip('()').split(',')): value for key, value in json.load(f).items()}
+
+
+class ReplayMonitor(PortMonitorMixin):
+    # Stato minimo del controller per la modalità 'port' e azioni sugli switch che si
+    # limitano a registrare gli eventi (tempo virtuale, 'block'/'unblock', chiave)
+    def __init__(self, params, host_info, logger=None):
+        params = dict(DEFAULTS, **params)
+        self.logger = logger or logging.getLogger('replay')
+        self.clock = 0.0
+        self.events = []
+
+        self.threshold = params['threshold']
+        self.lower_threshold = params['lower_threshold']
+        if self.lower_threshold is None:
+            self.lower_threshold = 0.02 * self.threshold
+        detector_params = dict((k.split('.', 1)[1], v) for k, v in params.items() if k.startswith('detector.'))
+        if params['detector'] == 'threshold':
+            self.port_detector = make_detector('threshold', threshold=self.threshold, **detector_params)
+        else:
+            self.port_detector = make_detector(params['detector'], floor=self.lower_threshold, **detector_params)
+
+        self.port_stats = PortStatsStore()
+        self.host_info = host_info
+        self.detection_mode = 'port'
+        self.monitoring_list = []
+        self.blocked_ports = {}
+        self.blocked_flows = {}
+        self.mitigated_ports = {}
+        self.block_top_sources = False
+        self.meter_step_seconds = params['block_duration']
+        self.offenders = OffenderHistory(base_duration=params['block_duration'], factor=params['offender_factor'],
+                                         max_duration=params['max_block_duration'],
+                                         half_life=params['offender_half_life'])
+        self.block_timers = ExpiryTimers(self._block_expired, logger=self.logger)
+        self.event_log = EventLog(self.logger, clock=self._now)
+
+    def _now(self):
+        return self.clock
+
+    def _block_port(self, dpid, port_no):
+        if (dpid, port_no) in self.monitoring_list:
+            self.monitoring_list.remove((dpid, port_no))
+        self.events.append((self.clock, 'block', (dpid, port_no)))
+
+    def _unblock_port(self, dpid, port_no):
+        self.events.append((self.clock, 'unblock', (dpid, port_no)))
+
+    def _raise_rate_limit(self, key):
+        return False
+
+    def _start_mirror(self, dpid, port_no):
+        pass
+
+    def _stop_mirror(self, dpid, port_no):
+        pass
+
+    def run(self, replies):
+        for timestamp, dpid, body in replies:
+            # Prima gli sblocchi scaduti, in ordine, poi la reply
+            for deadline in iter(self.block_timers.next_deadline, None):
+                if deadline > timestamp:
+                    break
+                self.clock = deadline
+                for key in self.block_timers.pop_expired(deadline):
+                    self._block_expired(key)
+            self.clock = timestamp
+            rows = self._update_port_stats(dpid, body)
+            if rows is not None:
+                self._monitor_port(dpid, rows)
+        return self.events
+
+
+def block_intervals(events, end):
+    # (chiave, inizio, fine) dei blocchi; quelli ancora aperti si chiudono a fine replay
+    opened = {}
+    intervals = []
+    for timestamp, kind, key in events:
+        if kind == 'block':
+            opened[key] = timestamp
+        elif key in opened:
+            intervals.append((key, opened.pop(key), timestamp))
+    intervals.extend((key, start, end) for key, start in opened.items())
+    return intervals
+
+
+def evaluate(events, attacks, end):
+    intervals = block_intervals(events, end)
+    by_port = {}
+    for attack in attacks:
+        by_port.setdefault(attack['port'], []).append((attack['start'], attack.get('end') or end))
+
+    delays = []
+    for attack in attacks:
+        start, stop = attack['start'], attack.get('end') or end
+        blocks = [s for key, s, _ in intervals if key == attack['port'] and start <= s < stop]
+        delays.append(min(blocks) - start if blocks else None)
+
+    false_blocks = 0
+    blocked_seconds = 0.0
+    false_blocked_seconds = 0.0
+    for key, start, stop in intervals:
+        windows = by_port.get(key, [])
+        if not any(a <= start < b for a, b in windows):
+            false_blocks += 1
+        blocked_seconds += stop - start
+        overlap = sum(max(0.0, min(stop, b) - max(start, a)) for a, b in windows)
+        false_blocked_seconds += stop - start - overlap
+
+    detected = [d for d in delays if d is not None]
+    return {
+        'detection_delays': delays,
+        'missed': len(delays) - len(detected),
+        'mean_detection_delay': sum(detected) / len(detected) if detected else None,
+        'blocks': len(intervals),
+        'false_blocks': false_blocks,
+        'blocked_seconds': blocked_seconds,
+        'false_blocked_seconds': false_blocked_seconds,
+    }
+
+
+def replay(replies, params, host_info, attacks):
+    started = time.perf_counter()
+    monitor = ReplayMonitor(params, host_info)
+    events = monitor.run(replies)
+    wall = time.perf_counter() - started
+    end = replies[-1][0] if replies else 0.0
+    result = {'params': params, 'replies': len(replies), 'wall_seconds': wall}
+    if replies:
+        result['speedup'] = (end - replies[0][0]) / wall if wall else None
+    result.update(evaluate(events, attacks, end))
+    return result
+
+
+# Stato dei processi del pool: le reply si caricano una volta per processo
+_worker = {}
+
+
+def _init_worker(sources, topology, attacks):
+    logging.getLogger('replay').setLevel(logging.CRITICAL)
+    replies = load(sources)
+    _worker.update(replies=replies, host_info=load_host_info(topology),
+                   attacks=_resolve_attacks(attacks, replies))
+
+
+def _run_worker(params):
+    return replay(_worker['replies'], params, _worker['host_info'], _worker['attacks'])
+
+
+def sweep(sources, topology, attacks, grid, fixed=None, workers=None):
+    names = sorted(grid)
+    combos = [dict(fixed or {}, **dict(zip(names, values))) for values in itertools.product(*(grid[n] for n in names))]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(sources, topology, attacks)) as pool:
+        return list(pool.map(_run_worker, combos))
+
+
+def _parse_attack(text):
+    # dpid:porta:inizio[:fine], tempi in secondi dall'inizio della registrazione
+    # (o assoluti se maggiori di 1e9)
+    fields = text.split(':')
+    attack = {'port': (int(fields[0]), int(fields[1])), 'start': float(fields[2])}
+    if len(fields) > 3 and fields[3]:
+        attack['end'] = float(fields[3])
+    return attack
+
+
+def _resolve_attacks(attacks, replies):
+    origin = replies[0][0] if replies else 0.0
+    resolved = []
+    for attack in attacks:
+        attack = dict(attack)
+        for field in ('start', 'end'):
+            if field in attack and attack[field] < 1e9:
+                attack[field] += origin
+        resolved.append(attack)
+    return resolved
+
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _parse_assignments(items, multi):
+    result = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        if multi:
+            result[name] = [_parse_value(v) for v in values.split(',')]
+        else:
+            result[name] = _parse_value(values)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay of recorded port stats through the detection logic')
+    parser.add_argument('sources', nargs='+', help='port_stats CSV files (in order) or a port_history directory')
+    parser.add_argument('--topology', default='topology.json')
+    parser.add_argument('--attack', action='append', default=[], type=_parse_attack,
+                        help='dpid:port:start[:end] in seconds from the start of the recording')
+    parser.add_argument('--set', action='append', default=[], help='fixed parameter, e.g. lower_threshold=5000')
+    parser.add_argument('--grid', action='append', default=[], help='swept parameter, e.g. threshold=2e5,3e5')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    fixed = _parse_assignments(args.set, False)
+    grid = _parse_assignments(args.grid, True)
+    if grid:
+        results = sweep(args.sources, args.topology, args.attack, grid, fixed, args.workers)
+    else:
+        _init_worker(args.sources, args.topology, args.attack)
+        results = [_run_worker(fixed)]
+
+    for result in results:
+        print('%-60s delay=%-8s missed=%d false_blocks=%d blocked_s=%.0f false_blocked_s=%.0f speedup=%s' % (
+            json.dumps(result['params'], sort_keys=True),
+            '%.1f' % result['mean_detection_delay'] if result['mean_detection_delay'] is not None else '-',
+            result['missed'], result['false_blocks'], result['blocked_seconds'],
+            result['false_blocked_seconds'],
+            '%.0fx' % result['speedup'] if result.get('speedup') else '-'))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
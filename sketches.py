@@ -0,0 +1,242 @@
+import heapq
+import random
+
+import numpy as np
+
+
+class CountMinSketch(object):
+    # depth righe da width contatori: ogni chiave incrementa una cella per riga, la stima
+    # è il minimo delle sue celle (mai sotto il valore vero). Memoria fissa, qualunque sia
+    # il numero di chiavi distinte. Le righe usano il doppio hashing di hash(key).
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width))
+        self._depths = np.arange(depth, dtype=np.uint64)[:, None]
+
+    def _columns(self, keys):
+        hashes = np.array([hash(key) & 0xffffffffffffffff for key in keys], dtype=np.uint64)
+        h1 = hashes & np.uint64(0xffffffff)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        return ((h1 + self._depths * h2) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, keys, weights):
+        columns = self._columns(keys)
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), (self.depth, len(keys)))
+        np.add.at(self.table, (np.arange(self.depth)[:, None], columns), weights)
+
+    def estimate(self, keys):
+        if not len(keys):
+            return np.zeros(0)
+        columns = self._columns(keys)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def decay(self, factor):
+        self.table *= factor
+
+    def clear(self):
+        self.table[:] = 0
+
+
+class HeavyHitters(object):
+    # Sorgenti più pesanti (in byte) per porta: i packet-in campionati (sampled(), con
+    # probabilità sample_rate) si accumulano in un buffer e vengono aggiunti al count-min
+    # sketch in blocco; per ogni porta e tipo restano candidate le k sorgenti con la stima
+    # più alta (un insieme per porta: una porta sotto attacco non scalza le sorgenti delle
+    # altre). Ogni window secondi sketch, candidati e totali per porta vengono moltiplicati per decay.
+    # Chiavi dello sketch: (dpid, in_port, kind, sorgente) con kind 'eth_src' o 'ipv4_src'.
+    def __init__(self, width=2048, depth=4, k=16, window=10.0, decay=0.5,
+                 sample_rate=0.1, max_pending=1024):
+        self.sketch = CountMinSketch(width, depth)
+        self.k = k
+        self.window = window
+        self.decay_factor = decay
+        self.sample_rate = sample_rate
+        self.max_pending = max_pending
+
+        self.candidates = {}  # (dpid, in_port, kind) -> {sorgente: stima}
+        self.totals = {}      # (dpid, in_port) -> byte stimati
+        self.samples = 0
+        self._keys = []
+        self._weights = []
+        self._window_start = None
+
+    def sampled(self):
+        return random.random() < self.sample_rate
+
+    def add(self, dpid, in_port, weight, eth_src, ipv4_src=None):
+        # Un pacchetto campionato; weight: byte che rappresenta (lunghezza / sample_rate
+        # per il campionamento del controller, la lunghezza per i pacchetti del mirror)
+        self._keys.append((dpid, in_port, 'eth_src', eth_src))
+        self._weights.append(weight)
+        if ipv4_src is not None:
+            self._keys.append((dpid, in_port, 'ipv4_src', ipv4_src))
+            self._weights.append(weight)
+        self.totals[(dpid, in_port)] = self.totals.get((dpid, in_port), 0) + weight
+        self.samples += 1
+        if len(self._keys) >= self.max_pending:
+            self.flush()
+
+    def flush(self):
+        if not self._keys:
+            return
+        keys, weights = self._keys, self._weights
+        self._keys, self._weights = [], []
+        self.sketch.add(keys, weights)
+
+        unique = list(set(keys))
+        touched = set()
+        for key, estimate in zip(unique, self.sketch.estimate(unique).tolist()):
+            port = key[:3]
+            candidates = self.candidates.get(port)
+            if candidates is None:
+                candidates = self.candidates[port] = {}
+            candidates[key[3]] = estimate
+            touched.add(port)
+        for port in touched:
+            candidates = self.candidates[port]
+            if len(candidates) > self.k:
+                self.candidates[port] = dict(heapq.nlargest(self.k, candidates.items(), key=lambda item: item[1]))
+
+    def tick(self, now):
+        # Da chiamare periodicamente: svuota il buffer e applica il decadimento della finestra
+        self.flush()
+        if self._window_start is None:
+            self._window_start = now
+        while now - self._window_start >= self.window:
+            self._window_start += self.window
+            self.sketch.decay(self.decay_factor)
+            for candidates in self.candidates.values():
+                for source in candidates:
+                    candidates[source] *= self.decay_factor
+            for key in self.totals:
+                self.totals[key] *= self.decay_factor
+
+    def top(self, dpid, in_port, kind='eth_src', n=1, min_share=0.0):
+        # Le n sorgenti più pesanti della porta con la loro quota del traffico campionato
+        self.flush()
+        total = self.totals.get((dpid, in_port), 0)
+        if not total:
+            return []
+        candidates = self.candidates.get((dpid, in_port, kind), {})
+        hitters = heapq.nlargest(n, candidates.items(), key=lambda item: item[1])
+        return [(source, value / total) for source, value in hitters if value / total >= min_share]
+
+    def forget(self, dpid):
+        # Lo sketch non si può ripulire per chiave: le celle dello switch decadono da sole
+        self.flush()
+        for key in [k for k in self.candidates if k[0] == dpid]:
+            del self.candidates[key]
+        for key in [k for k in self.totals if k[0] == dpid]:
+            del self.totals[key]
+
+
+class HyperLogLog(object):
+    # 2 ** precision registri da un byte (un bytearray, visto da numpy senza copie per
+    # stima e merge). L'aggiornamento di un elemento costa un hash e un confronto.
+    def __init__(self, precision=10):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self._alpha = 0.7213 / (1 + 1.079 / self.m)
+
+    def add(self, item):
+        h = hash(item) & 0xffffffffffffffff
+        index = h >> self._shift
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum(registers, np.frombuffer(other.registers, dtype=np.uint8), out=registers)
+
+    def count(self):
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        estimate = self._alpha * self.m * self.m / np.ldexp(1.0, -registers.astype(np.int64)).sum()
+        zeros = self.m - np.count_nonzero(registers)
+        # Pochi elementi: linear counting sui registri vuoti
+        if estimate <= 2.5 * self.m and zeros:
+            return float(self.m * np.log(self.m / zeros))
+        return float(estimate)
+
+
+class CardinalityMonitor(object):
+    # Sorgenti distinte (eth_src, ipv4_src) per (dpid, porta) in finestre di window secondi,
+    # con un HyperLogLog per porta e tipo; a fine finestra gli HLL di tutti gli switch si
+    # uniscono nella stima dell'intera rete (dpid e porta None). Una stima è anomala se
+    # supera min_distinct e jump_factor volte la baseline (media mobile delle finestre
+    # normali), oppure se supera max_distinct.
+    KINDS = ('eth_src', 'ipv4_src')
+
+    def __init__(self, precision=10, window=10.0, jump_factor=4.0, min_distinct=64,
+                 max_distinct=1024, alpha=0.3):
+        self.precision = precision
+        self.window = window
+        self.jump_factor = jump_factor
+        self.min_distinct = min_distinct
+        self.max_distinct = max_distinct
+        self.alpha = alpha
+
+        self.current = {}    # (dpid, in_port, kind) -> HyperLogLog della finestra in corso
+        self.baseline = {}   # (dpid, in_port, kind) -> sorgenti distinte attese per finestra
+        self.estimates = {}  # (dpid, in_port, kind) -> stima dell'ultima finestra chiusa
+        self._window_start = None
+
+    def add(self, dpid, in_port, eth_src, ipv4_src=None):
+        hll = self.current.get((dpid, in_port, 'eth_src'))
+        if hll is None:
+            hll = self.current[(dpid, in_port, 'eth_src')] = HyperLogLog(self.precision)
+        hll.add(eth_src)
+        if ipv4_src is not None:
+            hll = self.current.get((dpid, in_port, 'ipv4_src'))
+            if hll is None:
+                hll = self.current[(dpid, in_port, 'ipv4_src')] = HyperLogLog(self.precision)
+            hll.add(ipv4_src)
+
+    def tick(self, now):
+        # Da chiamare periodicamente: a fine finestra restituisce gli allarmi
+        # [(dpid, in_port, kind, stima, baseline)], altrimenti una lista vuota
+        if self._window_start is None:
+            self._window_start = now
+        if now - self._window_start < self.window:
+            return []
+        self._window_start = now
+        current, self.current = self.current, {}
+
+        network = {}
+        for (dpid, in_port, kind), hll in current.items():
+            merged = network.get(kind)
+            if merged is None:
+                merged = network[kind] = HyperLogLog(self.precision)
+            merged.merge(hll)
+        estimates = dict((key, hll.count()) for key, hll in current.items())
+        for kind, hll in network.items():
+            estimates[(None, None, kind)] = hll.count()
+        # Porte senza packet-in nella finestra: zero sorgenti
+        for key in self.baseline:
+            estimates.setdefault(key, 0.0)
+        self.estimates = estimates
+
+        alarms = []
+        for key, estimate in estimates.items():
+            baseline = self.baseline.get(key)
+            if self._anomalous(estimate, baseline):
+                alarms.append(key + (estimate, baseline))
+            else:
+                self.baseline[key] = estimate if baseline is None else (1 - self.alpha) * baseline + self.alpha * estimate
+        return alarms
+
+    def _anomalous(self, estimate, baseline):
+        if estimate > self.max_distinct:
+            return True
+        if baseline is None or estimate < self.min_distinct:
+            return False
+        return estimate > self.jump_factor * max(baseline, 1.0)
+
+    def forget(self, dpid):
+        for table in (self.current, self.baseline, self.estimates):
+            for key in [k for k in table if k[0] == dpid]:
+                del table[key]
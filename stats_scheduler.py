@@ -0,0 +1,191 @@
+import heapq
+import logging
+import random
+import time
+
+try:
+    from ryu.lib import hub
+except ImportError:
+    # Senza ryu (bench_mitigation.py) i poll scaduti si eseguono a mano con poll_due
+    hub = None
+
+# Chiave del poll completo (OFPP_ANY) di un datapath
+ALL_PORTS = None
+
+
+class StatsPollScheduler(object):
+    # Polling delle statistiche dentro l'hub di Ryu. Ogni porta ha il suo intervallo:
+    # min_interval quando è vicina alla soglia, interval quando è attiva, raddoppiato
+    # fino a max_interval quando è a riposo. Oltre alle porte, ogni datapath ha un poll
+    # completo (OFPP_ANY) ogni max_interval per scoprire le porte nuove.
+    # Le scadenze sono sfasate con jitter; un datapath con richieste ancora in sospeso
+    # non viene interrogato di nuovo finché non risponde (o finché non scade il timeout):
+    # le porte sparite dallo switch (assenti da una reply completa, o cancellate con un
+    # port status) escono dal polling, e un errore dello switch libera la richiesta.
+    def __init__(self, send_request, interval=2.0, min_interval=0.5, max_interval=8.0,
+                 jitter=0.1, any_ratio=0.5, timeout=None, logger=None, clock=time.time):
+        self.send_request = send_request  # callable(datapath, port_no) -> xid della richiesta
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.any_ratio = any_ratio  # oltre questa frazione di porte scadute si usa OFPP_ANY
+        self.timeout = timeout or 3 * interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.clock = clock
+
+        self.datapaths = {}
+        self.ports = {}        # dpid -> {port_no: intervallo corrente}
+        self.due = {}          # (dpid, port_no) -> prossima scadenza valida
+        self.outstanding = {}  # dpid -> {xid: istante di invio}
+        self.full_replies = {}  # (dpid, xid) delle richieste OFPP_ANY -> porte viste nelle parti arrivate
+        self.rtt = {}          # dpid -> ultimo round-trip time della reply
+        self.rtt_avg = {}      # dpid -> media mobile esponenziale del round-trip time
+        self.requests = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self._heap = []
+        self._sleep_until = 0
+        self._wakeup = hub.Event() if hub is not None else None
+        self.thread = None
+
+    def start(self):
+        self.thread = hub.spawn(self._run)
+
+    def add(self, datapath):
+        self.datapaths[datapath.id] = datapath
+        self.ports.setdefault(datapath.id, {})
+        # Primo poll completo in un punto casuale dell'intervallo
+        self._schedule(datapath.id, ALL_PORTS, self.clock() + random.uniform(0, self.interval))
+
+    def remove(self, dpid):
+        # Le voci nell'heap dei datapath rimossi vengono scartate quando scadono
+        self.datapaths.pop(dpid, None)
+        for xid in self.outstanding.pop(dpid, {}):
+            self.full_replies.pop((dpid, xid), None)
+        for port_no in self.ports.pop(dpid, {}):
+            self.due.pop((dpid, port_no), None)
+        self.due.pop((dpid, ALL_PORTS), None)
+
+    def remove_port(self, dpid, port_no):
+        self.ports.get(dpid, {}).pop(port_no, None)
+        self.due.pop((dpid, port_no), None)
+
+    def port_interval(self, dpid, port_no):
+        return self.ports.get(dpid, {}).get(port_no, self.interval)
+
+    def _schedule(self, dpid, port_no, due):
+        self.due[(dpid, port_no)] = due
+        heapq.heappush(self._heap, (due, dpid, port_no if port_no is not None else -1))
+        if due < self._sleep_until and self._wakeup is not None:
+            self._wakeup.set()
+
+    def _jittered(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def next_due(self):
+        while self._heap:
+            due, dpid, port_no = self._heap[0]
+            if self.due.get((dpid, port_no if port_no >= 0 else ALL_PORTS)) == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def poll_due(self, now):
+        due_ports = {}
+        while self._heap and self._heap[0][0] <= now:
+            due, dpid, port_no = heapq.heappop(self._heap)
+            port_no = port_no if port_no >= 0 else ALL_PORTS
+            if self.due.get((dpid, port_no)) != due:
+                continue
+            due_ports.setdefault(dpid, set()).add(port_no)
+        for dpid, ports in due_ports.items():
+            self._poll(dpid, ports, now)
+
+    def _run(self):
+        while True:
+            self.poll_due(self.clock())
+
+            wait = self._heap[0][0] - self.clock() if self._heap else self.interval
+            self._sleep_until = self.clock() + wait
+            self._wakeup.clear()
+            self._wakeup.wait(timeout=max(wait, 0.001))
+
+    def _poll(self, dpid, ports, now):
+        pending = self.outstanding.setdefault(dpid, {})
+        expired = [xid for xid, sent in pending.items() if now - sent >= self.timeout]
+        for xid in expired:
+            self.timeouts += 1
+            self.full_replies.pop((dpid, xid), None)
+            self.logger.warning('stats request %d to %016x timed out after %.2fs', xid, dpid, now - pending.pop(xid))
+        if pending:
+            # Switch lento: si riprova appena possibile, senza accodare altre richieste
+            self.skipped += 1
+            for port_no in ports:
+                self._schedule(dpid, port_no, now + self.min_interval)
+            return
+
+        datapath = self.datapaths[dpid]
+        if ALL_PORTS in ports or len(ports) > self.any_ratio * len(self.ports[dpid]):
+            xid = self.send_request(datapath, ALL_PORTS)
+            pending[xid] = now
+            self.full_replies[(dpid, xid)] = set()
+            self.requests += 1
+            self._schedule(dpid, ALL_PORTS, now + self._jittered(self.max_interval))
+            ports = self.ports[dpid]
+        else:
+            for port_no in ports:
+                pending[self.send_request(datapath, port_no)] = now
+                self.requests += 1
+        # Scadenza di riserva se la reply non arriva; la reply la sostituisce con quella vera
+        for port_no in ports:
+            self._schedule(dpid, port_no, now + self.timeout)
+
+    def reply(self, dpid, xid, more=False, port_nos=None):
+        # Da chiamare per ogni reply: restituisce l'RTT quando la risposta è completa.
+        # port_nos (anche un generatore: si consuma solo per le reply OFPP_ANY) sono le
+        # porte della parte ricevuta; quelle che mancano da tutta la reply escono dal polling.
+        # Senza port_nos non si toglie nessuna porta
+        pending = self.outstanding.get(dpid)
+        if pending is None or xid not in pending:
+            return None
+        if port_nos is None:
+            self.full_replies.pop((dpid, xid), None)
+        seen = self.full_replies.get((dpid, xid))
+        if seen is not None:
+            seen.update(port_nos)
+        if more:
+            return None
+        if seen is not None:
+            del self.full_replies[(dpid, xid)]
+            for port_no in [p for p in self.ports.get(dpid, {}) if p not in seen]:
+                self.remove_port(dpid, port_no)
+        rtt = self.clock() - pending.pop(xid)
+        self.rtt[dpid] = rtt
+        avg = self.rtt_avg.get(dpid)
+        self.rtt_avg[dpid] = rtt if avg is None else 0.8 * avg + 0.2 * rtt
+        return rtt
+
+    def error(self, dpid, xid):
+        # Errore dello switch su una richiesta: non arriverà nessuna reply
+        pending = self.outstanding.get(dpid)
+        if pending is None or pending.pop(xid, None) is None:
+            return False
+        self.full_replies.pop((dpid, xid), None)
+        return True
+
+    def update_ports(self, dpid, port_nos, hot, quiet):
+        # hot: porte vicine alla soglia, quiet: porte a riposo (array booleani paralleli a port_nos)
+        if dpid not in self.datapaths:
+            return
+        now = self.clock()
+        intervals = self.ports[dpid]
+        for port_no, is_hot, is_quiet in zip(port_nos, hot, quiet):
+            if is_hot:
+                interval = self.min_interval
+            elif is_quiet:
+                interval = min(2 * intervals.get(port_no, self.interval), self.max_interval)
+            else:
+                interval = self.interval
+            intervals[port_no] = interval
+            self._schedule(dpid, port_no, now + self._jittered(interval))
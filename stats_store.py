@@ -0,0 +1,262 @@
+import numpy as np
+
+
+class _ColumnStore(object):
+    # Colonne numpy dichiarate in FIELDS, riallocate raddoppiando la capacità
+    FIELDS = ()
+
+    def __init__(self, capacity):
+        self.size = 0
+        self.capacity = 0
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, capacity):
+        for name, dtype in self.FIELDS:
+            new = np.zeros(capacity, dtype=dtype)
+            old = getattr(self, name, None)
+            if old is not None:
+                new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+
+class PortStatsStore(_ColumnStore):
+    # Statistiche delle porte in array densi: una riga per ogni (dpid, port_no).
+    # self.index mappa (dpid, port_no) -> riga, self.dp_rows dpid -> righe dello switch.
+    FIELDS = (
+        ('dpid', np.uint64),
+        ('port_no', np.uint32),
+        ('rx_bytes', np.int64),
+        ('tx_bytes', np.int64),
+        ('timestamp', np.float64),
+        ('rx_throughput', np.float64),
+        ('tx_throughput', np.float64),
+        ('active', np.bool_),
+        ('blocked', np.bool_),
+    )
+
+    def __init__(self, capacity=256):
+        self.index = {}
+        self.dp_rows = {}
+        self._layout = {}  # dpid -> (port_nos, righe) dell'ultima reply
+        # Conteggio incrementale delle porte attive (sopra lower_threshold e non bloccate)
+        self.active_count = {}
+        self.total_active = 0
+        super(PortStatsStore, self).__init__(capacity)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def _add(self, dpid, port_no):
+        if self.size == self.capacity:
+            self._grow(2 * self.capacity)
+        row = self.size
+        self.size += 1
+        self.dpid[row] = dpid
+        self.port_no[row] = port_no
+        self.index[(dpid, port_no)] = row
+        self.dp_rows.setdefault(dpid, []).append(row)
+        return row
+
+    def rows(self, dpid, port_nos):
+        # Le reply di uno switch elencano quasi sempre le stesse porte nello stesso
+        # ordine: in quel caso si riusa l'array di righe senza lookup per porta
+        port_nos = tuple(port_nos)
+        layout = self._layout.get(dpid)
+        if layout is not None and layout[0] == port_nos:
+            return layout[1], []
+
+        rows = np.empty(len(port_nos), dtype=np.intp)
+        new = []
+        for i, port_no in enumerate(port_nos):
+            row = self.index.get((dpid, port_no))
+            if row is None:
+                row = self._add(dpid, port_no)
+                new.append(i)
+            rows[i] = row
+        # Le richieste per singola porta non sostituiscono il layout della reply completa
+        if len(port_nos) > 1:
+            self._layout[dpid] = (port_nos, rows)
+        return rows, new
+
+    def row(self, dpid, port_no):
+        return self.index.get((dpid, port_no))
+
+    def update(self, dpid, port_nos, rx_bytes, tx_bytes, now):
+        # Aggiorna in blocco contatori e throughput di tutte le porte di una reply
+        rows, new = self.rows(dpid, port_nos)
+        rx_bytes = np.asarray(rx_bytes, dtype=np.int64)
+        tx_bytes = np.asarray(tx_bytes, dtype=np.int64)
+
+        time_diff = now - self.timestamp[rows]
+        valid = time_diff > 0
+        rx_throughput = np.divide(rx_bytes - self.rx_bytes[rows], time_diff,
+                                  out=np.zeros(len(rows)), where=valid)
+        tx_throughput = np.divide(tx_bytes - self.tx_bytes[rows], time_diff,
+                                  out=np.zeros(len(rows)), where=valid)
+        # Porte nuove: nessun campione precedente
+        if new:
+            rx_throughput[new] = 0
+            tx_throughput[new] = 0
+
+        self.rx_bytes[rows] = rx_bytes
+        self.tx_bytes[rows] = tx_bytes
+        self.timestamp[rows] = now
+        self.rx_throughput[rows] = rx_throughput
+        self.tx_throughput[rows] = tx_throughput
+        return rows
+
+    def update_active(self, rows, lower_threshold):
+        # Solo le righe che attraversano lower_threshold toccano i contatori
+        now_active = (self.rx_throughput[rows] > lower_threshold) & ~self.blocked[rows]
+        changed = rows[now_active != self.active[rows]]
+        for row in changed:
+            self._set_active(row, not self.active[row])
+
+    def set_blocked(self, dpid, port_no, blocked):
+        row = self.index.get((dpid, port_no))
+        if row is None:
+            return
+        self.blocked[row] = blocked
+        if blocked and self.active[row]:
+            self._set_active(row, False)
+
+    def forget_switch(self, dpid):
+        # Switch disconnesso: le sue righe restano (e tornano valide alla riconnessione)
+        # ma non contano più tra le attive e non sono più bloccate
+        rows = self.switch_rows(dpid)
+        for row in rows[self.active[rows]]:
+            self._set_active(row, False)
+        self.blocked[rows] = False
+        self.active_count.pop(dpid, None)
+
+    def _set_active(self, row, active):
+        delta = 1 if active else -1
+        dpid = int(self.dpid[row])
+        self.active[row] = active
+        self.active_count[dpid] = self.active_count.get(dpid, 0) + delta
+        self.total_active += delta
+
+    def num_active_ports(self, dpid=None):
+        if dpid is None:
+            return self.total_active
+        return self.active_count.get(dpid, 0)
+
+    def active_ports(self, dpid=None):
+        if dpid is None:
+            rows = np.flatnonzero(self.active[:self.size])
+            return list(zip(self.dpid[rows].tolist(), self.port_no[rows].tolist()))
+        dp_rows = self.switch_rows(dpid)
+        return self.port_no[dp_rows[self.active[dp_rows]]].tolist()
+
+    def switch_rows(self, dpid):
+        return np.asarray(self.dp_rows.get(dpid, ()), dtype=np.intp)
+
+
+class FlowStatsStore(_ColumnStore):
+    # Statistiche dei flussi L2 installati dal learning switch: una riga per ogni
+    # (dpid, in_port, eth_src, eth_dst). Le righe dei flussi spariti dallo switch
+    # (idle timeout, cancellazioni) vengono liberate e riusate.
+    FIELDS = (
+        ('dpid', np.uint64),
+        ('in_port', np.uint32),
+        ('byte_count', np.int64),
+        ('packet_count', np.int64),
+        ('duration', np.float64),
+        ('timestamp', np.float64),
+        ('byte_rate', np.float64),
+        ('packet_rate', np.float64),
+        ('generation', np.uint32),
+        ('valid', np.bool_),
+    )
+
+    def __init__(self, capacity=1024):
+        self.index = {}
+        self.keys = []
+        self.dp_rows = {}
+        self._free = []
+        self._generation = {}  # dpid -> generazione della reply in corso
+        self._reply_done = {}
+        super(FlowStatsStore, self).__init__(capacity)
+
+    def _add(self, key):
+        if self._free:
+            row = self._free.pop()
+            self.keys[row] = key
+        else:
+            if self.size == self.capacity:
+                self._grow(2 * self.capacity)
+            row = self.size
+            self.size += 1
+            self.keys.append(key)
+        self.dpid[row] = key[0]
+        self.in_port[row] = key[1]
+        self.byte_count[row] = 0
+        self.packet_count[row] = 0
+        self.duration[row] = 0
+        self.byte_rate[row] = 0
+        self.packet_rate[row] = 0
+        self.valid[row] = True
+        self.index[key] = row
+        self.dp_rows.setdefault(key[0], set()).add(row)
+        return row
+
+    def _release(self, row):
+        key = self.keys[row]
+        del self.index[key]
+        self.dp_rows[key[0]].discard(row)
+        self.keys[row] = None
+        self.valid[row] = False
+        self._free.append(row)
+
+    def update(self, dpid, keys, byte_counts, packet_counts, durations, now, final=True):
+        # Una reply (o una parte di reply multipart) in blocco; il rate usa la durata
+        # misurata dallo switch, più precisa dell'istante di arrivo della reply
+        if self._reply_done.get(dpid, True):
+            self._generation[dpid] = self._generation.get(dpid, 0) + 1
+        generation = self._generation[dpid]
+        self._reply_done[dpid] = final
+
+        rows = np.empty(len(keys), dtype=np.intp)
+        new = []
+        for i, key in enumerate(keys):
+            row = self.index.get(key)
+            if row is None:
+                row = self._add(key)
+                new.append(i)
+            rows[i] = row
+
+        byte_counts = np.asarray(byte_counts, dtype=np.int64)
+        packet_counts = np.asarray(packet_counts, dtype=np.int64)
+        durations = np.asarray(durations, dtype=np.float64)
+        time_diff = durations - self.duration[rows]
+        # Durata che torna indietro: il flusso è stato reinstallato, niente rate
+        valid = time_diff > 0
+        valid[new] = False
+        byte_rate = np.divide(byte_counts - self.byte_count[rows], time_diff,
+                              out=np.zeros(len(rows)), where=valid)
+        packet_rate = np.divide(packet_counts - self.packet_count[rows], time_diff,
+                                out=np.zeros(len(rows)), where=valid)
+
+        self.byte_count[rows] = byte_counts
+        self.packet_count[rows] = packet_counts
+        self.duration[rows] = durations
+        self.timestamp[rows] = now
+        self.byte_rate[rows] = byte_rate
+        self.packet_rate[rows] = packet_rate
+        self.generation[rows] = generation
+
+        if final:
+            for row in [r for r in self.dp_rows.get(dpid, ()) if self.generation[r] != generation]:
+                self._release(row)
+        return rows
+
+    def remove_switch(self, dpid):
+        for row in list(self.dp_rows.get(dpid, ())):
+            self._release(row)
+        self.dp_rows.pop(dpid, None)
+        self._generation.pop(dpid, None)
+        self._reply_done.pop(dpid, None)
@@ -0,0 +1,167 @@
+import csv
+import gzip
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+
+class StatsWriter(object):
+    # Stadio di scrittura di port_stats.csv: il thread di monitoring mette in coda
+    # un batch per ogni stats reply, il thread del writer formatta, scrive e ruota i file.
+    # timestamp è leggibile ma al secondo; epoch è l'istante esatto della reply (replay.py
+    # lo usa per i rate: con il polling adattivo due reply possono cadere nello stesso secondo)
+    FIELDNAMES = ['timestamp', 'dpid', 'port_no', 'rx_bytes', 'tx_bytes', 'rx_throughput', 'tx_throughput', 'num_active_ports', 'active_ports', 'blocked_ports', 'epoch']
+
+    def __init__(self, path='port_stats.csv', queue_size=1024, batch_size=512,
+                 flush_interval=1.0, max_bytes=64 * 1024 * 1024, max_age=3600,
+                 compression=None, truncate=True, logger=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.logger = logger or logging.getLogger(__name__)
+        if compression == 'zstd' and zstandard is None:
+            self.logger.warning('zstandard non installato: i segmenti ruotati saranno compressi con gzip')
+            compression = 'gzip'
+        self.compression = compression
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.rows_written = 0
+        self.errors = 0
+        self.rows_lost = 0
+        self._truncate = truncate
+        self._file = None
+        self._writer = None
+        self._opened_at = 0
+        self._stop = object()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(self._stop)
+        if self.thread is not None:
+            self.thread.join()
+
+    def submit(self, batch):
+        # Mai bloccante: se la coda è piena il batch viene scartato e contato
+        try:
+            self.queue.put_nowait(batch)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        deadline = time.time() + self.flush_interval
+        rows = []
+        while True:
+            try:
+                batch = self.queue.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                batch = None
+            if batch is self._stop:
+                self._safe_write(rows)
+                self._blocking(self._close)
+                return
+            if batch is not None:
+                rows.extend(self._format(batch))
+            if len(rows) >= self.batch_size or time.time() >= deadline:
+                if rows:
+                    self._safe_write(rows)
+                    rows = []
+                deadline = time.time() + self.flush_interval
+
+    def _safe_write(self, rows):
+        # Un errore di I/O (disco pieno, permessi sulla rotazione) costa solo questo batch:
+        # il file viene chiuso e riaperto in append alla scrittura successiva
+        try:
+            self._blocking(self._write, rows)
+        except Exception:
+            self.errors += 1
+            self.rows_lost += len(rows)
+            self.logger.exception('port stats write failed, %d rows lost', len(rows))
+            try:
+                self._blocking(self._close)
+            except Exception:
+                self._file = None
+
+    def _blocking(self, func, *args):
+        # Con eventlet (ryu-manager) l'I/O su disco va in un thread reale per non fermare l'hub
+        if tpool is not None and patcher.is_monkey_patched('thread'):
+            return tpool.execute(func, *args)
+        return func(*args)
+
+    def _format(self, batch):
+        timestamp, dpid, port_nos, rx_bytes, tx_bytes, rx_throughput, tx_throughput, num_active_ports, active_ports, blocked_ports = batch
+        human_readable_timestamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+        epoch = '%.6f' % timestamp
+        return [
+            (human_readable_timestamp, dpid, port_no, rx, tx, rx_tp, tx_tp, num_active_ports, active_ports, blocked_ports, epoch)
+            for port_no, rx, tx, rx_tp, tx_tp in zip(port_nos, rx_bytes, tx_bytes, rx_throughput, tx_throughput)
+        ]
+
+    def _open(self):
+        mode = 'w' if self._truncate else 'a'
+        self._truncate = False
+        self._file = open(self.path, mode, newline='')
+        self._writer = csv.writer(self._file)
+        if self._file.tell() == 0:
+            self._writer.writerow(self.FIELDNAMES)
+        self._opened_at = time.time()
+
+    def _close(self):
+        if self._file is not None:
+            f, self._file = self._file, None
+            f.close()
+
+    def _write(self, rows):
+        if self._file is None:
+            self._open()
+        if rows:
+            self._writer.writerows(rows)
+            self._file.flush()
+            self.rows_written += len(rows)
+        if (self._file.tell() >= self.max_bytes or
+                (self.max_age and time.time() - self._opened_at >= self.max_age)):
+            self._rotate()
+
+    def _rotate(self):
+        self._close()
+        base, ext = os.path.splitext(self.path)
+        rotated = '%s-%s%s' % (base, time.strftime('%Y%m%d-%H%M%S'), ext)
+        n = 1
+        while os.path.exists(rotated) or os.path.exists(rotated + '.gz') or os.path.exists(rotated + '.zst'):
+            rotated = '%s-%s-%d%s' % (base, time.strftime('%Y%m%d-%H%M%S'), n, ext)
+            n += 1
+        os.rename(self.path, rotated)
+        if self.compression is not None:
+            self._compress(rotated)
+        self._open()
+
+    def _compress(self, path):
+        if self.compression == 'zstd':
+            with open(path, 'rb') as src, open(path + '.zst', 'wb') as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+        else:
+            with open(path, 'rb') as src, gzip.open(path + '.gz', 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+        os.remove(path)
@@ -0,0 +1,106 @@
+import heapq
+import logging
+import math
+import time
+
+try:
+    from ryu.lib import hub
+except ImportError:
+    # Senza ryu (replay.py) le scadenze si consumano a mano con pop_expired
+    hub = None
+
+
+class ExpiryTimers(object):
+    # Scadenze in un min-heap: ogni chiave ha al più un timer valido (self.deadlines),
+    # le voci sostituite o cancellate restano nell'heap e vengono scartate quando escono.
+    # Il thread dorme fino alla prossima scadenza e chiama callback(key) in orario.
+    def __init__(self, callback, logger=None):
+        self.callback = callback
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.deadlines = {}  # key -> scadenza valida
+        self.fired = 0
+        self._heap = []
+        self._seq = 0
+        self._sleep_until = 0
+        self._wakeup = hub.Event() if hub is not None else None
+        self.thread = None
+
+    def __len__(self):
+        return len(self.deadlines)
+
+    def __contains__(self, key):
+        return key in self.deadlines
+
+    def start(self):
+        self.thread = hub.spawn(self._run)
+
+    def schedule(self, key, deadline):
+        # Un nuovo schedule della stessa chiave sostituisce il precedente
+        self.deadlines[key] = deadline
+        self._seq += 1
+        heapq.heappush(self._heap, (deadline, self._seq, key))
+        if deadline < self._sleep_until and self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        return self.deadlines.pop(key, None)
+
+    def next_deadline(self):
+        while self._heap and self.deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now):
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            if self.deadlines.get(key) != deadline:
+                continue
+            del self.deadlines[key]
+            expired.append(key)
+        return expired
+
+    def _run(self):
+        while True:
+            for key in self.pop_expired(time.time()):
+                self.fired += 1
+                try:
+                    self.callback(key)
+                except Exception:
+                    self.logger.exception('expiry callback failed for %s', key)
+
+            deadline = self.next_deadline()
+            wait = deadline - time.time() if deadline is not None else 60
+            self._sleep_until = time.time() + wait
+            self._wakeup.clear()
+            self._wakeup.wait(timeout=max(wait, 0.001))
+
+
+class OffenderHistory(object):
+    # Durata dei blocchi per i recidivi: ogni blocco aggiunge 1 al punteggio della chiave,
+    # il punteggio si dimezza ogni half_life secondi. La durata è
+    # base_duration * factor ** punteggio (prima del blocco corrente), fino a max_duration.
+    def __init__(self, base_duration=30, factor=2, max_duration=3600, half_life=3600):
+        self.base_duration = base_duration
+        self.factor = factor
+        self.max_duration = max_duration
+        self.half_life = half_life
+        self.scores = {}  # key -> (punteggio, istante dell'ultimo aggiornamento)
+
+    def score(self, key, now):
+        entry = self.scores.get(key)
+        if entry is None:
+            return 0.0
+        score, updated = entry
+        return score * math.pow(0.5, (now - updated) / self.half_life)
+
+    def record(self, key, now):
+        # Registra un nuovo blocco e restituisce la sua durata
+        score = self.score(key, now)
+        self.scores[key] = (score + 1, now)
+        return min(self.base_duration * math.pow(self.factor, score), self.max_duration)
+
+    def prune(self, now, min_score=0.05):
+        for key in [k for k in self.scores if self.score(k, now) < min_score]:
+            del self.scores[key]